@@ -0,0 +1,196 @@
+# load_test.py
+# --------------------------------------------------------------------
+# 🔹 LOAD-TEST DRIVER
+# --------------------------------------------------------------------
+# Fires requests at a running backend at fixed concurrency levels and
+# reports throughput and latency percentiles per scenario. Run it against
+# the offline mock so no real quota is spent:
+#
+#   python mock_gemini.py --latency lognormal:800,0.5 --rate-429 0.05 &
+#   GEMINI_API_ENDPOINT=http://localhost:8765 GEMINI_API_KEY=mock uvicorn main:app --port 8000 &
+#   python load_test.py --base-url http://localhost:8000 --concurrency 1,4,16 --requests 50
+import argparse
+import itertools
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from test_samples import samples
+
+# Real-language samples (the torture-chamber entries are deliberately ambiguous)
+_SAMPLES = [(lang, code) for lang, code in samples.items() if "_" not in lang and lang != "unknown"]
+_COMMENT = {"python": "#", "ruby": "#", "perl": "#", "r": "#", "elixir": "#", "matlab": "%", "sql": "--", "html": None, "css": None}
+
+
+class _Counter:
+    def __init__(self):
+        self._it = itertools.count()
+        self._lock = threading.Lock()
+
+    def next(self) -> int:
+        with self._lock:
+            return next(self._it)
+
+
+_counter = _Counter()
+
+
+def _unique(language: str, code: str, n: int) -> str:
+    """Appends a harmless comment so every request misses the response cache and near-duplicate reuse."""
+    marker = _COMMENT.get(language, "//")
+    if language == "css":
+        return f"{code}\n/* load {n} */"
+    if language == "html" or marker is None:
+        return f"{code}\n<!-- load {n} -->"
+    return f"{code}\n{marker} load {n}"
+
+
+def _post(base_url: str, path: str, payload: dict, timeout: float):
+    data = json.dumps(payload).encode("utf-8")
+    request = urllib.request.Request(base_url + path, data=data, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.status, response.read()
+
+
+def _get(base_url: str, path: str, timeout: float):
+    with urllib.request.urlopen(base_url + path, timeout=timeout) as response:
+        return response.status, response.read()
+
+
+# --------------------------------------------------------------------
+# 🔹 SCENARIOS  (each returns True when the request succeeded)
+# --------------------------------------------------------------------
+def scenario_explain(base_url: str, timeout: float, unique: bool) -> bool:
+    n = _counter.next()
+    language, code = _SAMPLES[n % len(_SAMPLES)]
+    if unique:
+        code = _unique(language, code, n)
+    status, body = _post(base_url, "/explain", {"code": code, "language": language}, timeout)
+    return status == 200 and json.loads(body).get("status") in ("error", "success", "language_mismatch")
+
+
+def scenario_assistant(base_url: str, timeout: float, unique: bool) -> bool:
+    n = _counter.next()
+    message = f"How do I reverse a list in Python? (#{n})" if unique else "How do I reverse a list in Python?"
+    status, body = _post(base_url, "/assistant", {"message": message}, timeout)
+    return status == 200 and json.loads(body).get("status") == "success"
+
+
+def scenario_persistence(base_url: str, timeout: float, unique: bool) -> bool:
+    n = _counter.next()
+    language, code = _SAMPLES[n % len(_SAMPLES)]
+    steps = [
+        _post(base_url, "/save-code", {"code": code, "language": language}, timeout),
+        _get(base_url, "/load-last-code", timeout),
+        _post(base_url, "/save-project", {"projectName": f"load-{n}", "code": code, "language": language}, timeout),
+        _get(base_url, "/projects", timeout),
+    ]
+    return all(status == 200 for status, _ in steps)
+
+
+SCENARIOS = {
+    "explain": scenario_explain,
+    "assistant": scenario_assistant,
+    "persistence": scenario_persistence,
+}
+
+
+# --------------------------------------------------------------------
+# 🔹 RUNNER + REPORT
+# --------------------------------------------------------------------
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def run_level(name: str, concurrency: int, total: int, base_url: str, timeout: float, unique: bool):
+    scenario = SCENARIOS[name]
+    latencies = []
+    errors = {}
+    lock = threading.Lock()
+
+    def one(_):
+        started = time.perf_counter()
+        try:
+            ok = scenario(base_url, timeout, unique)
+            reason = None if ok else "bad_response"
+        except urllib.error.HTTPError as e:
+            ok, reason = False, f"http_{e.code}"
+        except Exception as e:
+            ok, reason = False, type(e).__name__
+        elapsed = (time.perf_counter() - started) * 1000
+        with lock:
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors[reason] = errors.get(reason, 0) + 1
+
+    wall_started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    wall = time.perf_counter() - wall_started
+
+    latencies.sort()
+    return {
+        "scenario": name,
+        "concurrency": concurrency,
+        "requests": total,
+        "ok": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p90_ms": round(percentile(latencies, 90), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        "max_ms": round(latencies[-1], 1) if latencies else 0.0,
+    }
+
+
+def print_report(rows):
+    header = f"{'scenario':<12} {'conc':>5} {'ok':>6} {'err':>5} {'rps':>8} {'p50':>9} {'p90':>9} {'p95':>9} {'p99':>9} {'max':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        print(
+            f"{r['scenario']:<12} {r['concurrency']:>5} {r['ok']:>6} {sum(r['errors'].values()):>5} "
+            f"{r['throughput_rps']:>8} {r['p50_ms']:>9} {r['p90_ms']:>9} {r['p95_ms']:>9} {r['p99_ms']:>9} {r['max_ms']:>9}"
+        )
+        if r["errors"]:
+            print(f"{'':<12} errors: {r['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for the CodePercept backend")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--scenarios", default="explain,assistant,persistence")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma separated levels")
+    parser.add_argument("--requests", type=int, default=50, help="requests per scenario and level")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--cached", action="store_true", help="repeat identical inputs (measure the cache path)")
+    parser.add_argument("--json", dest="json_out", help="also write the results to this file")
+    args = parser.parse_args()
+
+    base_url = args.base_url.rstrip("/")
+    rows = []
+    for name in [s.strip() for s in args.scenarios.split(",") if s.strip()]:
+        if name not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario '{name}'. Choose from: {', '.join(SCENARIOS)}")
+        for level in [int(c) for c in args.concurrency.split(",") if c.strip()]:
+            print(f"🚦 {name} @ concurrency {level} ({args.requests} requests)...")
+            rows.append(run_level(name, level, args.requests, base_url, args.timeout, not args.cached))
+
+    print()
+    print_report(rows)
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+        print(f"\n💾 Results written to {args.json_out}")
+
+
+if __name__ == "__main__":
+    main()
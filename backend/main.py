@@ -586,13 +586,18 @@ import sqlite3
 import json
 import re  # 🔹 for JSON fence cleanup like in Node.js
 import ast # 🔹 for advanced Python dictionary parsing
-from contextlib import asynccontextmanager  # 🔹 Required for lifespan
+from contextlib import asynccontextmanager, contextmanager  # 🔹 Required for lifespan
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import FileResponse, JSONResponse, RedirectResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, RedirectResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from pathlib import Path
 import traceback
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
 
 # 🔹 FIX: Load .env file explicitly so os.getenv finds the key
 try:
@@ -602,10 +607,38 @@ except ImportError:
     pass
 
 # 🔹 UPDATED IMPORT: Using Supreme Verification
-from language_detector import verify_submission, friendly_name
+from language_detector import verify_submission, friendly_name, normalize_selected_language
 from utils.line_numbers import add_line_numbers
+from utils.chunker import split_into_chunks, merge_chunk_results
+from utils.incremental import ReanalysisPlan, AnalysisSnapshots, merge_incremental
+from utils.batch import language_for_path, files_from_zip
+from utils.job_queue import JobQueue, JobWorkers
+from utils.static_analyzers import run_static_analysis, StaticResult
+from utils.minhash import NearDuplicateIndex
+from utils.normalize import canonicalize
+from utils.scheduler import PriorityScheduler, current_lane, normalize_lane, BULK
 from utils.json_extract import extract_json_from_text
-from utils.prompt_loader import PromptLoader
+from utils.prompt_loader import PromptLoader, StagePrompt
+from utils.rate_limiter import RateLimiter, TokenBucket, is_quota_error, retry_after_from_error
+from utils.deadline import Deadline, DeadlineExceeded
+from utils.circuit_breaker import CircuitBreaker
+from utils.conversation import ConversationMemory
+from utils.token_estimator import estimate_tokens, expected_output_tokens, route, PromptTooLarge
+from utils.key_pool import KeyPool
+from utils.client_registry import ModelClientRegistry
+from utils.context_cache import (
+    ContextCache, supports_system_instruction, mark_no_system_instruction,
+    is_system_instruction_error, is_cache_error,
+)
+from utils.response_cache import ResponseCache, make_cache_key
+from utils.single_flight import SingleFlight
+from utils.json_stream import AnalysisStreamParser
+from utils.json_repair import repair_json
+from utils.metrics import REGISTRY, Counter, Histogram, CallbackMetric, COUNT_BUCKETS
+from utils.response_schema import (
+    ANALYSIS_RESPONSE_SCHEMA, FULL_FIX_RESPONSE_SCHEMA, validate, supports_structured_output, mark_unsupported,
+    is_unsupported_error, strip_json_directives, UNSUPPORTED_RETRY_SECONDS,
+)
 import test_samples
 import run_tests
 
@@ -724,89 +757,458 @@ def brute_force_json_parser(raw_text: str):
         raise ValueError(f"Brute-force extraction failed. The AI output is structurally ruined. Final Error: {str(e)}")
 
 
+# --------------------------------------------------------------------
+# 🔹 QUOTA-AWARE RATE LIMITER
+# --------------------------------------------------------------------
+# Requests are reserved against per-model / per-key buckets BEFORE they are
+# sent. A model that would need a longer wait than this is skipped instead.
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "2.0"))
+
+rate_limiter = RateLimiter()
+
+# 🔹 Request deadlines (seconds). Clients may override per request with `deadlineMs`.
+EXPLAIN_DEADLINE = float(os.getenv("EXPLAIN_DEADLINE", "90"))
+ASSISTANT_DEADLINE = float(os.getenv("ASSISTANT_DEADLINE", "45"))
+MAX_DEADLINE = float(os.getenv("MAX_DEADLINE", "300"))
+DEADLINE_GRACE = 1.5
+
+
+def request_deadline(override_ms: int, default_seconds: float) -> Deadline:
+    seconds = default_seconds if not override_ms or override_ms <= 0 else override_ms / 1000
+    return Deadline(min(seconds, MAX_DEADLINE))
+
+# 🔹 Share of every model's rate budget that bulk traffic (batches, bulk jobs)
+# must leave untouched, so interactive requests still find quota.
+BULK_RATE_RESERVE = float(os.getenv("BULK_RATE_RESERVE", "0.25"))
+
+# 🔹 Schema-constrained JSON mode for analysis responses (0 disables it)
+STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "1") != "0"
+
+# 🔹 All configured keys (GEMINI_API_KEYS=k1,k2,... plus the single-key vars).
+# Each key has its own quota buckets and its own SDK client.
+key_pool = KeyPool.from_env(rate_limiter)
+
+# 🔹 One bound model per (key, model, preamble), built once and shared by all requests
+model_registry = ModelClientRegistry(max_entries=int(os.getenv("MODEL_REGISTRY_SIZE", "256")))
+
+# 🔹 The static prompt preamble (the validation protocol) goes out as a system
+# instruction, registered as a provider-side cached context where the model and
+# key allow it, so per call only the numbered code is sent.
+SYSTEM_PREAMBLE = os.getenv("SYSTEM_PREAMBLE", "1") == "1"
+CONTEXT_CACHE = os.getenv("CONTEXT_CACHE", "1") == "1"
+context_cache = ContextCache(
+    ttl_seconds=float(os.getenv("CONTEXT_CACHE_TTL", "3600")),
+    retry_after=float(os.getenv("CONTEXT_CACHE_RETRY_AFTER", "3600")),
+    on_retire=model_registry.drop_cached_content,
+)
+
+
+def prompt_tokens(prompt: str, system: str = None) -> int:
+    return estimate_tokens(prompt) + (estimate_tokens(system) if system else 0)
+
+
+class ModelRateLimited(Exception):
+    """Raised when a model has no quota left and the request is rerouted."""
+
+
+# --------------------------------------------------------------------
+# 🔹 LLM METRICS (scraped from /metrics)
+# --------------------------------------------------------------------
+LLM_ATTEMPT_SECONDS = Histogram(
+    "codepercept_llm_attempt_seconds", "Duration of one model attempt (call + parse), by model and stage.",
+    ["model", "stage"],
+)
+LLM_ATTEMPT_FAILURES = Counter(
+    "codepercept_llm_attempt_failures_total", "Failed model attempts by failure class.", ["model", "stage", "reason"],
+)
+LLM_ATTEMPTS_PER_REQUEST = Histogram(
+    "codepercept_llm_attempts_per_request", "Model attempts one failover chain needed.", ["mode"], buckets=COUNT_BUCKETS,
+)
+LLM_REQUESTS = Counter("codepercept_llm_requests_total", "Failover chains by mode and outcome.", ["mode", "outcome"])
+LLM_STAGE2_ENTRIES = Counter("codepercept_llm_stage2_entries_total", "JSON chains that fell through to stage 2.")
+LLM_INPUT_TOKENS = Counter("codepercept_llm_input_tokens_total", "Prompt tokens sent, by model.", ["model"])
+LLM_CACHED_TOKENS = Counter("codepercept_llm_cached_input_tokens_total", "Prompt tokens served from a cached context.", ["model"])
+LLM_OUTPUT_TOKENS = Counter("codepercept_llm_output_tokens_total", "Tokens generated, by model.", ["model"])
+LLM_QUOTA_WAIT_SECONDS = Histogram("codepercept_llm_quota_wait_seconds", "Time spent waiting for rate-limit budget.", ["model"])
+LLM_STREAM_FIRST_CHUNK_SECONDS = Histogram(
+    "codepercept_llm_stream_first_chunk_seconds", "Time from a streaming attempt's start to its first text.", ["model"],
+)
+LLM_FALLBACKS = Counter(
+    "codepercept_llm_fallbacks_total", "Calls retried without JSON mode / system instruction / cached context.", ["model", "kind"],
+)
+
+
+# --------------------------------------------------------------------
+# 🔹 CIRCUIT BREAKER + DEGRADED MODE
+# --------------------------------------------------------------------
+# After a run of chains that failed REMOTELY (5xx, quota, connection) the
+# remote models are not called at all for a cooldown. Client deadlines, parse
+# failures and bulk-lane traffic never count against it. Meanwhile (and whenever quota or the deadline leave no realistic
+# chance) explain-mode requests get the local static findings, marked degraded.
+DEGRADED_FALLBACK = os.getenv("DEGRADED_FALLBACK", "1") == "1"
+DEGRADED_MIN_BUDGET = float(os.getenv("DEGRADED_MIN_BUDGET", "2"))
+breaker = CircuitBreaker(
+    failure_threshold=int(os.getenv("BREAKER_FAILURES", "3")),
+    cooldown=float(os.getenv("BREAKER_COOLDOWN", "30")),
+)
+degraded_stats = {"served": 0, "refused_calls": 0}
+
+
+class RemoteUnavailable(RuntimeError):
+    """Raised before any network call when remote success is unlikely; `reason` says why."""
+
+    def __init__(self, reason: str):
+        super().__init__(f"Remote models unavailable ({reason}).")
+        self.reason = reason
+
+
+def remote_unlikely(models, tokens: int, deadline: Deadline = None):
+    """Why a remote chain should not even start ("deadline", "quota_exhausted", "breaker_open"), or None."""
+    if deadline is not None and deadline.remaining() < DEGRADED_MIN_BUDGET:
+        return "deadline"
+    horizon = RATE_LIMIT_MAX_WAIT if deadline is None else min(RATE_LIMIT_MAX_WAIT, deadline.remaining())
+    if not any(rate_limiter.headroom(key.id, model_name, tokens)[0] <= horizon for model_name in models for key in key_pool.keys):
+        return "quota_exhausted"
+    # Bulk work waits for interactive traffic to close the breaker and never takes the probe
+    if current_lane.get() == BULK:
+        return None if breaker.state == "closed" else "breaker_open"
+    # Only a look: the half-open probe is taken by _breaker_admission when the call really starts
+    if not breaker.ready():
+        return "breaker_open"
+    return None
+
+
+@contextmanager
+def _breaker_admission():
+    """
+    Held around the code that actually goes upstream (never by a request that
+    joined an in-flight call or was answered from a cache). Raises
+    RemoteUnavailable when refused; the ticket is released on every exit.
+    """
+    ticket = None if current_lane.get() == BULK and breaker.state != "closed" else breaker.acquire()
+    if ticket is None:
+        degraded_stats["refused_calls"] += 1
+        raise RemoteUnavailable("breaker_open")
+    try:
+        yield
+    finally:
+        breaker.release(ticket)
+
+
+def is_remote_failure(exc: Exception) -> bool:
+    """Quota / 429, 5xx and connection failures: the errors that say the remote side is unwell."""
+    if isinstance(exc, ModelRateLimited) or is_quota_error(exc):
+        return True
+    if failure_class(exc) == "timeout":
+        return False            # attempt timeouts come from the caller's deadline
+    code = getattr(exc, "code", None)
+    code = getattr(code, "value", code)
+    if isinstance(code, int) and code >= 500:
+        return True
+    text = str(exc).lower()
+    return isinstance(exc, ConnectionError) or bool(re.match(r"5\d\d\b", text)) or "connection" in text or "unavailable" in text
+
+
+def counts_against_breaker(exc: Exception, attempts) -> bool:
+    """A failed chain opens the breaker only when it ran interactively and every attempt failed remotely."""
+    if isinstance(exc, DeadlineExceeded) or current_lane.get() == BULK:
+        return False
+    errors = [error for _, error in attempts if error is not None]
+    return bool(errors) and all(is_remote_failure(error) for error in errors)
+
+
+def failure_class(exc: Exception) -> str:
+    """quota | timeout | parse | unsupported | error, for the failure counters."""
+    if isinstance(exc, ModelRateLimited) or is_quota_error(exc):
+        return "quota"
+    text = str(exc).lower()
+    if isinstance(exc, (DeadlineExceeded, TimeoutError)) or "deadline" in text or "timed out" in text or "timeout" in text:
+        return "timeout"
+    if isinstance(exc, ValueError):
+        return "parse"          # JSON decode, repair and schema failures
+    if is_unsupported_error(exc):
+        return "unsupported"
+    return "error"
+
+
+def _observe_attempt(attempts: list, model_name: str, stage: str, started: float, error: Exception = None):
+    attempts.append((stage, error))
+    LLM_ATTEMPT_SECONDS.observe(time.perf_counter() - started, model=model_name, stage=stage)
+    if error is not None:
+        LLM_ATTEMPT_FAILURES.inc(model=model_name, stage=stage, reason=failure_class(error))
+
+
+def _record_tokens(model_name: str, usage, estimated_input: int, output_text: str = ""):
+    """Token counters from the response's usage metadata (local estimates when it has none)."""
+    LLM_INPUT_TOKENS.inc(getattr(usage, "prompt_token_count", 0) or estimated_input, model=model_name)
+    LLM_OUTPUT_TOKENS.inc(getattr(usage, "candidates_token_count", 0) or (estimate_tokens(output_text) if output_text else 0), model=model_name)
+    cached = getattr(usage, "cached_content_token_count", 0) or 0
+    if cached:
+        LLM_CACHED_TOKENS.inc(cached, model=model_name)
+
+
+def _response_text(response) -> str:
+    if hasattr(response, "text") and response.text:
+        return response.text
+    parts = []
+    for cand in getattr(response, "candidates", []) or []:
+        content = getattr(cand, "content", None)
+        if not content: continue
+        for part in getattr(content, "parts", []) or []:
+            text = getattr(part, "text", "")
+            if text: parts.append(text)
+    return "\n".join(parts) if parts else str(response)
+
+
+def _call_model(model_name: str, prompt: str, stream: bool = False, response_schema: dict = None,
+                timeout: float = None, system: str = None):
+    """
+    Sends ONE request to ONE model, respecting its rate budget.
+    With stream=True the open streaming response is returned instead of text.
+    With a response_schema, models that support JSON mode get the schema and
+    the JSON MIME type (and a shorter prompt); the others get the plain prompt.
+    A `system` preamble is sent as the model's cached context or system
+    instruction; models without system instructions get it inline.
+    Keys are tried in order of remaining budget for this model; a key that
+    answers 429 is blocked for its Retry-After and the next key is used.
+    Raises ModelRateLimited (without touching the network) when no key has
+    quota left for the model. `timeout` bounds both the quota wait and the call.
+    """
+    generation_config = None
+    full_prompt, full_system = prompt, system
+    if response_schema is not None and supports_structured_output(model_name):
+        generation_config = {"response_mime_type": "application/json", "response_schema": response_schema}
+        if system:
+            system = strip_json_directives(system)
+        else:
+            prompt = strip_json_directives(prompt)
+    if system and not supports_system_instruction(model_name):
+        prompt, system = StagePrompt(system, prompt).inline(), None
+
+    estimated = prompt_tokens(prompt, system)
+    last_error = None
+
+    max_wait = RATE_LIMIT_MAX_WAIT if timeout is None else min(RATE_LIMIT_MAX_WAIT, timeout / 2)
+    keep = BULK_RATE_RESERVE if current_lane.get() == BULK else 0.0
+
+    for key in key_pool.ranked(model_name, estimated):
+        wait = rate_limiter.reserve(key.id, model_name, estimated, max_wait, keep)
+        if wait is None:
+            continue
+        LLM_QUOTA_WAIT_SECONDS.observe(wait, model=model_name)
+        if wait > 0:
+            time.sleep(wait)
+
+        request_options = None
+        if timeout is not None:
+            request_options = {"timeout": max(1.0, timeout - wait)}
+
+        cached_content = context_cache.lookup(key, model_name, system) if system and CONTEXT_CACHE else None
+        try:
+            model = model_registry.get(key, model_name, system_instruction=system, cached_content=cached_content)
+            response = model.generate_content(
+                prompt, stream=stream, generation_config=generation_config, request_options=request_options
+            )
+        except Exception as e:
+            # Each fallback re-sends this request in another form and reserves
+            # again, so this key's reservation is given back first
+            if cached_content and is_cache_error(e):
+                rate_limiter.release(key.id, model_name, estimated)
+                context_cache.invalidate(key, model_name, system)
+                LLM_FALLBACKS.inc(model=model_name, kind="context_cache")
+                print(f"🗃️ {model_name} rejected its cached context on {key.id}. Retrying with the system instruction.")
+                return _call_model(model_name, full_prompt, stream, response_schema, timeout, system=full_system)
+            if system and is_system_instruction_error(e):
+                rate_limiter.release(key.id, model_name, estimated)
+                mark_no_system_instruction(model_name)
+                LLM_FALLBACKS.inc(model=model_name, kind="system_instruction")
+                print(f"🧾 {model_name} rejected the system instruction. Sending the preamble inline.")
+                return _call_model(model_name, full_prompt, stream, response_schema, timeout, system=full_system)
+            if generation_config is not None and is_unsupported_error(e):
+                # Graceful fallback: remember the model can't do JSON mode and retry it plainly
+                rate_limiter.release(key.id, model_name, estimated)
+                mark_unsupported(model_name)
+                LLM_FALLBACKS.inc(model=model_name, kind="json_mode")
+                print(f"🧾 {model_name} rejected JSON mode. Falling back to plain prompt for {UNSUPPORTED_RETRY_SECONDS}s.")
+                return _call_model(model_name, full_prompt, stream=stream, timeout=timeout, system=full_system)
+            if not is_quota_error(e):
+                raise
+            retry_after = retry_after_from_error(e)
+            rate_limiter.penalize(key.id, model_name, retry_after)
+            print(f"⏳ {model_name} hit quota on {key.id}. Blocked for {retry_after or 'default'}s.")
+            last_error = e
+            continue
+
+        if stream:
+            return response
+
+        usage = getattr(response, "usage_metadata", None)
+        rate_limiter.record_usage(key.id, model_name, estimated, getattr(usage, "prompt_token_count", 0) or 0)
+        text = _response_text(response)
+        _record_tokens(model_name, usage, estimated, text)
+        return text
+
+    if last_error is not None:
+        raise last_error
+    raise ModelRateLimited(f"{model_name} is out of quota on every key, rerouting.")
+
+
 # --------------------------------------------------------------------
 # 🔹 GENERATION ENGINE (STAGE 1 & STAGE 2)
 # --------------------------------------------------------------------
-def generate_with_rotation(prompt: str, require_json: bool = False):
+def _check_schema(parsed, response_schema: dict = None):
+    """Raises ValueError when a parsed answer does not match the requested schema."""
+    if response_schema is not None:
+        errors = validate(parsed, response_schema)
+        if errors:
+            raise ValueError(f"Schema validation failed: {'; '.join(errors[:3])}")
+    return parsed
+
+
+def _best_partial(raw_outputs, response_schema: dict = None):
+    """Best-effort answer from kept outputs when the deadline stops the failover."""
+    for raw_text in sorted(raw_outputs, key=len, reverse=True):
+        try:
+            return _check_schema(repair_json(raw_text), response_schema)
+        except ValueError:
+            continue
+    return None
+
+
+def _attempt_timeout(deadline: Deadline, attempts_left: int, raw_outputs=()):
+    """Timeout for the next attempt; stops the failover once the budget is spent."""
+    if deadline is None:
+        return None
+    if deadline.expired():
+        print("⌛ DEADLINE EXHAUSTED. Stopping failover.")
+        raise DeadlineExceeded("Request deadline exceeded during model failover.", partial=_best_partial(raw_outputs))
+    return deadline.attempt_timeout(attempts_left)
+
+
+def routable_models(prompt: str, output_tokens: int = None, system: str = None):
+    """MODELS_POOL minus the models whose context window can't hold the prompt + answer."""
+    output_tokens = output_tokens or expected_output_tokens()
+    models = route(MODELS_POOL, prompt_tokens(prompt, system), output_tokens)
+    if len(models) < len(MODELS_POOL):
+        print(f"📏 ROUTING: {len(MODELS_POOL) - len(models)} models skipped (context too small)")
+    return models
+
+
+def generate_with_rotation(prompt: str, require_json: bool = False, response_schema: dict = None,
+                           deadline: Deadline = None, output_tokens: int = None, models=None, system: str = None):
     """
     Tries to generate content using models in a sequential loop.
     ALWAYS starts from the beginning of MODELS_POOL.
     Added Stage 1 (Native JSON) and Stage 2 (Threat Prompt + Brute Force).
+    Models without remaining quota are skipped before any request is sent.
+    Broken stage-1 JSON is repaired locally before Stage 2 goes back to the network.
+    With a response_schema, JSON mode is requested and every answer is validated.
+    With a deadline, each attempt gets a share of the remaining budget and the
+    failover stops (DeadlineExceeded, carrying any salvageable partial) once it is spent.
+    Only models whose context window fits the prompt are tried (PromptTooLarge if none).
+    `system` is the static preamble, kept apart from the per-call prompt.
+    Every attempt is timed and classified for /metrics.
     """
-    if not API_KEY and not os.getenv("GOOGLE_API_KEY"):
-         raise RuntimeError("Missing GEMINI_API_KEY or GOOGLE_API_KEY")
+    if not len(key_pool):
+         raise RuntimeError("Missing GEMINI_API_KEY, GEMINI_API_KEYS or GOOGLE_API_KEY")
 
     if not GENAI_AVAILABLE:
         raise RuntimeError("google-generativeai package not installed")
 
-    # Configure API once
-    genai.configure(api_key=os.getenv("GOOGLE_API_KEY") or API_KEY)
-
+    models = models or routable_models(prompt, output_tokens, system)
+
+    mode = "json" if require_json else "text"
+    attempts = []
+    with _breaker_admission():
+        try:
+            result = _rotate(prompt, models, require_json, response_schema, deadline, system, attempts)
+        except Exception as e:
+            LLM_REQUESTS.inc(mode=mode, outcome="timeout" if isinstance(e, DeadlineExceeded) else "exhausted")
+            if counts_against_breaker(e, attempts):
+                breaker.record_failure()
+            raise
+        finally:
+            LLM_ATTEMPTS_PER_REQUEST.observe(len(attempts), mode=mode)
+        LLM_REQUESTS.inc(mode=mode, outcome="ok")
+        breaker.record_success()
+    return result
+
+
+def _rotate(prompt: str, models, require_json: bool, response_schema: dict, deadline: Deadline, system: str, attempts: list):
+    """The failover loop behind generate_with_rotation; `attempts` collects one entry per model attempt."""
     if require_json:
         # ==========================================
         # STAGE 1: NATIVE JSON EXTRACTION
         # ==========================================
-        for model_name in MODELS_POOL:
+        stage_1_outputs = []
+        for i, model_name in enumerate(models):
+            timeout = _attempt_timeout(deadline, len(models) - i, stage_1_outputs)
+            raw_text = None
+            started = time.perf_counter()
             try:
                 print(f"🤖 STAGE 1 - Trying Model: {model_name}")
-                model = genai.GenerativeModel(model_name)
-                response = model.generate_content(prompt)
-
-                raw_text = ""
-                if hasattr(response, "text") and response.text:
-                    raw_text = response.text
-                else:
-                    parts = []
-                    for cand in getattr(response, "candidates", []) or []:
-                        content = getattr(cand, "content", None)
-                        if not content: continue
-                        for part in getattr(content, "parts", []) or []:
-                            text = getattr(part, "text", "")
-                            if text: parts.append(text)
-                    raw_text = "\n".join(parts) if parts else str(response)
+                raw_text = _call_model(model_name, prompt, response_schema=response_schema, timeout=timeout, system=system)
 
                 cleaned = re.sub(r"```json|```", "", raw_text).strip()
-                parsed_json = json.loads(cleaned)
+                parsed_json = _check_schema(json.loads(cleaned), response_schema)
                 print(f"✅ STAGE 1 SUCCESS: {model_name}")
+                _observe_attempt(attempts, model_name, "stage1", started)
                 return parsed_json 
                 
             except Exception as e:
+                if raw_text:
+                    # The model DID answer: a lossless local repair beats another network call
+                    try:
+                        parsed_json = _check_schema(repair_json(raw_text, allow_truncated=False), response_schema)
+                        print(f"🩹 STAGE 1 REPAIRED LOCALLY: {model_name}")
+                        _observe_attempt(attempts, model_name, "stage1", started)
+                        return parsed_json
+                    except ValueError:
+                        stage_1_outputs.append(raw_text)
                 print(f"⚠️ STAGE 1 FAILED ({model_name}). REASON: {repr(e)}")
+                _observe_attempt(attempts, model_name, "stage1", started, e)
+                continue
+
+        # ==========================================
+        # LOCAL REPAIR: TRUNCATION RECOVERY ON KEPT OUTPUTS
+        # ==========================================
+        for raw_text in sorted(stage_1_outputs, key=len, reverse=True):
+            try:
+                parsed_json = _check_schema(repair_json(raw_text), response_schema)
+                print("🩹 LOCAL REPAIR SUCCESS (truncation recovery, partial)" if parsed_json.get("partial")
+                      else "🩹 LOCAL REPAIR SUCCESS (truncation recovery)")
+                return parsed_json
+            except ValueError:
                 continue
         
         print("❌ ALL MODELS FAILED STAGE 1. INITIATING STAGE 2 (THREAT PROMPT + BRUTE FORCE) ❌")
+        LLM_STAGE2_ENTRIES.inc()
 
         # ==========================================
         # STAGE 2: THREAT PROMPT + BRUTE FORCE
         # ==========================================
         stage_2_prompt = prompt + "\n\n[CRITICAL SYSTEM DIRECTIVE]: Your previous output failed JSON validation due to structural errors. You MUST return 100% strictly valid JSON. Escape all inner double quotes (\\\") and newlines (\\n). Check your commas."
 
-        for model_name in MODELS_POOL:
+        for i, model_name in enumerate(models):
+            timeout = _attempt_timeout(deadline, len(models) - i)
+            started = time.perf_counter()
             try:
                 print(f"🛡️ STAGE 2 - Trying Model: {model_name}")
-                model = genai.GenerativeModel(model_name)
-                response = model.generate_content(stage_2_prompt)
-
-                raw_text = ""
-                if hasattr(response, "text") and response.text:
-                    raw_text = response.text
-                else:
-                    parts = []
-                    for cand in getattr(response, "candidates", []) or []:
-                        content = getattr(cand, "content", None)
-                        if not content: continue
-                        for part in getattr(content, "parts", []) or []:
-                            text = getattr(part, "text", "")
-                            if text: parts.append(text)
-                    raw_text = "\n".join(parts) if parts else str(response)
-
-                # Send it to the 5-Layer Brute Force Gauntlet
-                parsed_json = brute_force_json_parser(raw_text)
+                raw_text = _call_model(model_name, stage_2_prompt, response_schema=response_schema, timeout=timeout, system=system)
+
+                # Send it to the 5-Layer Brute Force Gauntlet, then the repair engine
+                try:
+                    parsed_json = brute_force_json_parser(raw_text)
+                except ValueError:
+                    parsed_json = repair_json(raw_text)
+                parsed_json = _check_schema(parsed_json, response_schema)
                 print(f"✅ STAGE 2 SUCCESS (Brute Force): {model_name}")
+                _observe_attempt(attempts, model_name, "stage2", started)
                 return parsed_json
 
             except Exception as e:
                 print(f"⚠️ STAGE 2 FAILED ({model_name}). REASON: {repr(e)}")
+                _observe_attempt(attempts, model_name, "stage2", started, e)
                 continue
         
         raise RuntimeError("All models exhausted in BOTH Stage 1 and Stage 2.")
@@ -816,40 +1218,175 @@ def generate_with_rotation(prompt: str, require_json: bool = False):
         # PLAIN TEXT MODE (For /assistant)
         # ==========================================
         last_error = None
-        for model_name in MODELS_POOL:
+        for i, model_name in enumerate(models):
+            timeout = _attempt_timeout(deadline, len(models) - i)
+            started = time.perf_counter()
             try:
                 print(f"🤖 Using Model (Text Mode): {model_name}")
-                model = genai.GenerativeModel(model_name)
-                response = model.generate_content(prompt)
-
-                if hasattr(response, "text") and response.text:
-                    return response.text
-                
-                parts = []
-                for cand in getattr(response, "candidates", []) or []:
-                    content = getattr(cand, "content", None)
-                    if not content: continue
-                    for part in getattr(content, "parts", []) or []:
-                        text = getattr(part, "text", "")
-                        if text: parts.append(text)
-                
-                if parts:
-                    return "\n".join(parts)
-                
-                return str(response)
+                text = _call_model(model_name, prompt, timeout=timeout, system=system)
+                _observe_attempt(attempts, model_name, "text", started)
+                return text
 
             except Exception as e:
                 print(f"⚠️ Error with {model_name}. REASON: {repr(e)}")
+                _observe_attempt(attempts, model_name, "text", started, e)
                 last_error = e
                 continue
 
         raise RuntimeError(f"All models exhausted. Last error: {last_error}")
 
 
+def stream_with_rotation(prompt: str, response_schema: dict = None, deadline: Deadline = None,
+                         output_tokens: int = None, system: str = None):
+    """
+    Streaming variant of the failover loop: yields text chunks as they arrive.
+    Fails over to the next model only while nothing has been yielded yet;
+    once output has started, a broken stream is raised to the caller.
+    Attempts, time to first text and tokens are recorded for /metrics.
+    """
+    if not len(key_pool):
+         raise RuntimeError("Missing GEMINI_API_KEY, GEMINI_API_KEYS or GOOGLE_API_KEY")
+
+    if not GENAI_AVAILABLE:
+        raise RuntimeError("google-generativeai package not installed")
+
+    models = routable_models(prompt, output_tokens, system)
+
+    last_error = None
+    attempts = []
+    failure = None
+    outcome = "cancelled"       # the consumer stopped reading
+    with _breaker_admission():
+        try:
+            for i, model_name in enumerate(models):
+                timeout = _attempt_timeout(deadline, len(models) - i)
+                started = time.perf_counter()
+                try:
+                    print(f"📡 STREAM - Trying Model: {model_name}")
+                    response = _call_model(model_name, prompt, stream=True, response_schema=response_schema, timeout=timeout, system=system)
+                except Exception as e:
+                    print(f"⚠️ STREAM FAILED ({model_name}). REASON: {repr(e)}")
+                    _observe_attempt(attempts, model_name, "stream", started, e)
+                    last_error = e
+                    continue
+
+                usage = None
+                output = []
+                try:
+                    for chunk in response:
+                        usage = getattr(chunk, "usage_metadata", None) or usage
+                        try:
+                            text = chunk.text
+                        except Exception:
+                            text = ""
+                        if text:
+                            if not output:
+                                LLM_STREAM_FIRST_CHUNK_SECONDS.observe(time.perf_counter() - started, model=model_name)
+                            output.append(text)
+                            yield text
+                except Exception as e:
+                    _observe_attempt(attempts, model_name, "stream", started, e)
+                    if not output:
+                        # Nothing reached the client yet: the next model can still take over
+                        print(f"⚠️ STREAM FAILED BEFORE ANY TEXT ({model_name}). REASON: {repr(e)}")
+                        last_error = e
+                        continue
+                    outcome, failure = "broken", e
+                    raise
+                _observe_attempt(attempts, model_name, "stream", started)
+                _record_tokens(model_name, usage, prompt_tokens(prompt, system), "".join(output))
+                outcome = "ok"
+                return
+
+            outcome, failure = "exhausted", last_error
+            raise RuntimeError(f"All models exhausted. Last error: {last_error}")
+        except DeadlineExceeded:
+            outcome = "timeout"
+            raise
+        finally:
+            LLM_REQUESTS.inc(mode="stream", outcome=outcome)
+            LLM_ATTEMPTS_PER_REQUEST.observe(len(attempts), mode="stream")
+            if outcome == "ok":
+                breaker.record_success()
+            elif failure is not None and counts_against_breaker(failure, attempts):
+                breaker.record_failure()
+
+
+# --------------------------------------------------------------------
+# 🔹 IN-FLIGHT COALESCING (SINGLE-FLIGHT)
+# --------------------------------------------------------------------
+# Concurrent requests with the same prompt share ONE upstream failover chain.
+inflight = SingleFlight()
+
+# --------------------------------------------------------------------
+# 🔹 PRIORITY SCHEDULER (interactive vs bulk lanes)
+# --------------------------------------------------------------------
+# Every upstream chain takes a slot; free slots go to the lanes by weighted
+# fair sharing, and queued bulk work waits whenever interactive traffic spikes.
+scheduler = PriorityScheduler(
+    slots=int(os.getenv("LLM_CONCURRENCY", "8")),
+    weights={"interactive": int(os.getenv("INTERACTIVE_WEIGHT", "4")), "bulk": int(os.getenv("BULK_WEIGHT", "1"))},
+    bulk_max_running=int(os.getenv("BULK_MAX_RUNNING", "4")),
+    spike_depth=int(os.getenv("INTERACTIVE_SPIKE_DEPTH", "2")),
+)
+
+
+SCHEDULER_WAIT_SECONDS = Histogram(
+    "codepercept_scheduler_wait_seconds", "Time a failover chain queued for an upstream slot, by lane.", ["lane"],
+)
+
+
+async def _scheduled(start_call):
+    queued = time.perf_counter()
+    async with scheduler.slot():
+        SCHEDULER_WAIT_SECONDS.observe(time.perf_counter() - queued, lane=current_lane.get())
+        return await start_call()
+
+
+async def generate_coalesced(prompt: str, require_json: bool = False, response_schema: dict = None,
+                             deadline: Deadline = None, output_tokens: int = None, system: str = None):
+    """
+    Shared upstream call for identical prompts in the same lane. The call runs under the
+    deadline of whichever request started it; every waiter still stops
+    waiting at its OWN deadline. A prompt no model can hold raises
+    PromptTooLarge here, and RemoteUnavailable when the breaker, quota or
+    deadline rule a remote answer out, before it takes a scheduler slot.
+    """
+    models = routable_models(prompt, output_tokens, system)
+    reason = remote_unlikely(models, prompt_tokens(prompt, system), deadline)
+    if reason is not None:
+        degraded_stats["refused_calls"] += 1
+        raise RemoteUnavailable(reason)
+    # The lane is part of the key: an interactive request never waits on a bulk
+    # call (e.g. a speculative prefetch) that runs, and queues, at bulk priority
+    fingerprint = hashlib.sha256(
+        f"{current_lane.get()}\x1f{require_json}\x1f{response_schema is not None}\x1f{system or ''}\x1f{prompt}".encode("utf-8")
+    ).hexdigest()
+    call = inflight.do(
+        fingerprint,
+        lambda: _scheduled(lambda: asyncio.to_thread(
+            generate_with_rotation, prompt, require_json=require_json, response_schema=response_schema,
+            deadline=deadline, models=models, system=system,
+        )),
+    )
+    if deadline is None:
+        return await call
+    try:
+        # A short grace lets the worker stop on its own and hand back its partial result
+        return await asyncio.wait_for(call, timeout=deadline.remaining() + DEADLINE_GRACE)
+    except DeadlineExceeded:
+        raise
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded("Request deadline exceeded while waiting for the model.")
+
+
 # --- Prompt loader ---
 BASE_DIR = Path(__file__).parent
 prompts_dir = BASE_DIR / "prompts"
-prompt_loader = PromptLoader(prompts_dir)
+# Templates are compiled once (every supported language pre-rendered) and
+# reloaded automatically when a file changes (0 disables the watcher).
+prompt_loader = PromptLoader(prompts_dir, languages=[k for k in friendly_name if k != "unknown"])
+PROMPT_WATCH_INTERVAL = float(os.getenv("PROMPT_WATCH_INTERVAL", "2"))
 
 # --------------------------------------------------------------------
 # 🔹 SQLITE DATABASE — FIXED FOR RENDER
@@ -881,8 +1418,65 @@ CREATE TABLE IF NOT EXISTS projects (
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP
 );
 """)
+# Assistant turns belong to a conversation (NULL for one-shot messages and older rows)
+if "conversation_id" not in {row[1] for row in cursor.execute("PRAGMA table_info(ai_chat)")}:
+    cursor.execute("ALTER TABLE ai_chat ADD COLUMN conversation_id TEXT")
+cursor.execute("CREATE INDEX IF NOT EXISTS idx_ai_chat_conversation ON ai_chat (conversation_id, id)")
 conn.commit()
 
+# --------------------------------------------------------------------
+# 🔹 LLM RESPONSE CACHE (same SQLite file, own connection)
+# --------------------------------------------------------------------
+response_cache = ResponseCache(
+    DB_PATH,
+    ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL", "86400")),
+    max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2000")),
+)
+
+# 🔹 Cache keys hash the canonical code (layout-insensitive, optionally without
+# comments); stored results use canonical line numbers and are mapped back per hit.
+CACHE_STRIP_COMMENTS = os.getenv("CACHE_STRIP_COMMENTS", "0") == "1"
+
+
+def cache_entry(language: str, code: str, mode: str, first_line: int = 1):
+    """(cache key, Canonical) for a submission; `first_line` numbers a chunk's lines."""
+    canon = canonicalize(code, normalize_selected_language(language), CACHE_STRIP_COMMENTS, first_line)
+    return make_cache_key(prompt_loader.version, language, canon.text, mode), canon
+
+
+# 🔹 Language detection per canonical code, so formatting-only edits skip the detector
+DETECTION_CACHE_SIZE = int(os.getenv("DETECTION_CACHE_SIZE", "1024"))
+_detections = OrderedDict()
+_detections_lock = threading.Lock()      # reached from worker threads too
+
+
+def check_submission(code: str, language: str):
+    """verify_submission() on the submitted code, behind a small LRU keyed by the canonical hash."""
+    key = (hashlib.sha256(canonicalize(code).text.encode("utf-8")).hexdigest(), normalize_selected_language(language))
+    with _detections_lock:
+        verdict = _detections.get(key)
+        if verdict is not None:
+            _detections.move_to_end(key)
+            return verdict
+    # The detector runs outside the lock; a concurrent miss just computes it twice
+    verdict = verify_submission(code, language)
+    with _detections_lock:
+        _detections[key] = verdict
+        _detections.move_to_end(key)
+        while len(_detections) > DETECTION_CACHE_SIZE:
+            _detections.popitem(last=False)
+    return verdict
+
+
+# 🔹 Last analysis per editor session, for diff-aware re-analysis
+analysis_snapshots = AnalysisSnapshots(DB_PATH, ttl_seconds=float(os.getenv("SNAPSHOT_TTL", "86400")))
+
+# 🔹 Persistent background job queue (long full fixes run outside the request)
+job_queue = JobQueue(DB_PATH, lease_seconds=float(os.getenv("JOB_LEASE_SECONDS", "60")))
+
+# 🔹 MinHash/LSH index of past explain-mode analyses, for near-duplicate submissions
+near_duplicates = NearDuplicateIndex(DB_PATH, max_entries=int(os.getenv("NEAR_DUPLICATE_MAX_ENTRIES", "2000")))
+
 
 # --------------------------------------------------------------------
 # 🔹 LIFESPAN EVENT HANDLER
@@ -895,6 +1489,12 @@ async def lifespan(app: FastAPI):
         print("📄 Prompts loaded.")
     except Exception as e:
         print("⚠ Failed loading prompts:", e)
+    prompt_loader.watch(PROMPT_WATCH_INTERVAL)
+
+    requeued = job_queue.reset_running()
+    if requeued:
+        print(f"🧵 Re-queued {requeued} jobs whose lease expired.")
+    job_workers.start()
 
     port = os.getenv("PORT", "3001")
     print(f"\n{'-'*50}")
@@ -905,6 +1505,8 @@ async def lifespan(app: FastAPI):
     yield
 
     print("🛑 Shutting down server...")
+    await job_workers.stop()
+    prompt_loader.stop()
 
 
 # --- FastAPI app ---
@@ -921,6 +1523,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --------------------------------------------------------------------
+# 🔹 REQUEST TIMING (per route template, so ids in paths don't explode the labels)
+# --------------------------------------------------------------------
+HTTP_REQUEST_SECONDS = Histogram(
+    "codepercept_http_request_seconds", "Time until the response starts, by method, route and status.",
+    ["method", "route", "status"],
+)
+
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    HTTP_REQUEST_SECONDS.observe(
+        time.perf_counter() - started, method=request.method, route=route, status=response.status_code
+    )
+    return response
+
 MAIN_DIR = BASE_DIR / "main"
 PUBLIC_DIR = BASE_DIR / "public"
 
@@ -971,6 +1592,61 @@ async def reload_prompts():
         return JSONResponse({"status": "error", "error": str(e)}, status_code=500)
 
 
+@app.get("/rate-limits")
+async def rate_limits():
+    return {"status": "success", "buckets": rate_limiter.snapshot(), "scheduler": scheduler.stats()}
+
+
+@app.get("/cache-stats")
+async def cache_stats():
+    return {
+        "status": "success",
+        "cache": response_cache.stats(),
+        "inflight": inflight.stats(),
+        "speculative": dict(speculative_stats, enabled=SPECULATIVE_FULL_FIX, pending=len(_speculative_tasks)),
+        "static": dict(static_stats, enabled=STATIC_ANALYSIS),
+        "near_duplicates": dict(near_duplicates.stats(), **near_duplicate_stats, enabled=NEAR_DUPLICATE),
+        "context_cache": dict(context_cache.stats(), enabled=CONTEXT_CACHE, system_preamble=SYSTEM_PREAMBLE),
+        "degraded": dict(degraded_stats, enabled=DEGRADED_FALLBACK, breaker=breaker.stats()),
+        "chat_memory": dict(chat_memory.stats(), **chat_memory_stats, pending=len(_summary_tasks)),
+    }
+
+
+# --------------------------------------------------------------------
+# 🔹 /metrics  (Prometheus text format)
+# --------------------------------------------------------------------
+CallbackMetric(
+    "codepercept_response_cache_lookups_total", "Response cache lookups by result.",
+    lambda: {("hit",): response_cache.hits, ("miss",): response_cache.misses}, ["result"], kind="counter",
+)
+CallbackMetric(
+    "codepercept_breaker_open", "1 while the circuit breaker keeps remote calls paused (or probing).",
+    lambda: 0 if breaker.state == "closed" else 1,
+)
+CallbackMetric(
+    "codepercept_degraded_answers_total", "Explain answers served from local checks only.",
+    lambda: degraded_stats["served"], kind="counter",
+)
+CallbackMetric("codepercept_inflight_chains", "Upstream failover chains running now.", lambda: inflight.stats()["in_flight"])
+CallbackMetric(
+    "codepercept_inflight_shared_total", "Requests that joined an identical in-flight chain.",
+    lambda: inflight.stats()["shared"], kind="counter",
+)
+CallbackMetric(
+    "codepercept_scheduler_lane_requests", "Scheduler requests by lane and state.",
+    lambda: {
+        (lane, state): values[state]
+        for lane, values in scheduler.stats()["lanes"].items() for state in ("queued", "running")
+    },
+    ["lane", "state"],
+)
+
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 # --------------------------------------------------------------------
 # 🔹 /explain
 # --------------------------------------------------------------------
@@ -979,6 +1655,287 @@ class ExplainPayload(BaseModel):
     language: str
     mode: str = None
     wantCorrected: bool = False
+    deadlineMs: int = None
+    sessionId: str = None
+    lane: str = None
+
+
+# 🔹 Large files are analysed as function/class-level chunks in parallel (explain mode only)
+CHUNK_THRESHOLD_LINES = int(os.getenv("CHUNK_THRESHOLD_LINES", "300"))
+CHUNK_MAX_LINES = int(os.getenv("CHUNK_MAX_LINES", "150"))
+CHUNK_OVERLAP_LINES = int(os.getenv("CHUNK_OVERLAP_LINES", "5"))
+CHUNK_CONCURRENCY = int(os.getenv("CHUNK_CONCURRENCY", "4"))
+
+# 🔹 Re-analysis of an edited file only sends the changed hunks (+ context lines),
+# unless more than this share of the file changed.
+DIFF_CONTEXT_LINES = int(os.getenv("DIFF_CONTEXT_LINES", "5"))
+DIFF_MAX_CHANGED_RATIO = float(os.getenv("DIFF_MAX_CHANGED_RATIO", "0.5"))
+
+# 🔹 Local static pre-analysis (compiler/parser checks) before any model call.
+# Certain errors are answered locally in explain mode (STATIC_SHORT_CIRCUIT);
+# otherwise the findings ride along in the prompt (STATIC_PROMPT_HINTS).
+STATIC_ANALYSIS = os.getenv("STATIC_ANALYSIS", "1") == "1"
+STATIC_SHORT_CIRCUIT = os.getenv("STATIC_SHORT_CIRCUIT", "1") == "1"
+STATIC_PROMPT_HINTS = os.getenv("STATIC_PROMPT_HINTS", "1") == "1"
+static_stats = {"checked": 0, "short_circuited": 0, "hinted_prompts": 0}
+
+# 🔹 Near-duplicate reuse: a submission this similar to an analysed one (names,
+# comments and layout ignored) reuses its analysis when every line aligns;
+# above the seed threshold the old findings are only given to the model.
+NEAR_DUPLICATE = os.getenv("NEAR_DUPLICATE", "1") == "1"
+NEAR_DUPLICATE_REUSE = float(os.getenv("NEAR_DUPLICATE_REUSE", "0.9"))
+NEAR_DUPLICATE_SEED = float(os.getenv("NEAR_DUPLICATE_SEED", "0.6"))
+near_duplicate_stats = {"reused": 0, "seeded": 0}
+
+
+def _stage_prompt(stage: str, language: str, numbered_code: str, include_corrected: bool,
+                  static: StaticResult = None, hints: str = "") -> StagePrompt:
+    """
+    Renders the compiled "analysis" / "fullfix" template (hints appended),
+    split into the static system preamble and the per-call code message.
+    """
+    if static is not None and static.findings and STATIC_PROMPT_HINTS:
+        static_stats["hinted_prompts"] += 1
+        hints = static.prompt_hints() + hints
+    if not SYSTEM_PREAMBLE:
+        return StagePrompt("", prompt_loader.render(stage, language, numbered_code, include_corrected, hints))
+    return prompt_loader.render_split(stage, language, numbered_code, include_corrected, hints)
+
+
+def static_precheck(code: str, language: str) -> StaticResult:
+    """Local compiler/parser findings for the submission (empty when disabled or unsupported)."""
+    if not STATIC_ANALYSIS:
+        return StaticResult([])
+    static_stats["checked"] += 1
+    return run_static_analysis(normalize_selected_language(language), code)
+
+
+def static_short_circuit(static: StaticResult):
+    """The explain-mode answer for code with certain syntax errors, or None to ask the model."""
+    if not STATIC_SHORT_CIRCUIT or not static.conclusive:
+        return None
+    static_stats["short_circuited"] += 1
+    print(f"🧱 STATIC SHORT-CIRCUIT: {len(static.findings)} local findings, stage 1 skipped")
+    return {"status": "error", "analysis": static.analysis(), "source": "static"}
+
+
+def _near_duplicate_namespace(language: str) -> str:
+    return f"{prompt_loader.version}:{normalize_selected_language(language)}"
+
+
+async def near_duplicate_lookup(code: str, language: str, include_corrected: bool = False):
+    """
+    (reused result or None, prompt hints) from the closest past submission.
+    Only explain mode reuses, and only a provable match (NearMatch.reusable);
+    any other neighbour just seeds the prompt. A full fix's corrected code is
+    specific to the text.
+    """
+    if not NEAR_DUPLICATE or len(code.splitlines()) > CHUNK_THRESHOLD_LINES:
+        return None, ""
+    exact_key, canon = cache_entry(language, code, "fullfix:explain")
+    if await asyncio.to_thread(response_cache.contains, exact_key):
+        return None, ""
+
+    match = await asyncio.to_thread(
+        near_duplicates.query, _near_duplicate_namespace(language), code, normalize_selected_language(language), NEAR_DUPLICATE_SEED
+    )
+    if match is None:
+        return None, ""
+
+    if not include_corrected and match.similarity >= NEAR_DUPLICATE_REUSE and match.reusable(code):
+        result = match.remapped(code)
+        result["near_duplicate"] = {"similarity": round(match.similarity, 3)}
+        near_duplicate_stats["reused"] += 1
+        print(f"👯 NEAR-DUPLICATE REUSE (similarity {match.similarity:.2f})")
+        await asyncio.to_thread(response_cache.put, exact_key, canon.to_canonical(result))
+        return result, ""
+
+    hints = match.prompt_hints(code)
+    if hints:
+        near_duplicate_stats["seeded"] += 1
+        print(f"👯 NEAR-DUPLICATE SEED (similarity {match.similarity:.2f})")
+    return None, hints
+
+
+def remember_near_duplicate(code: str, language: str, result: dict):
+    """Indexes a complete explain-mode result from the model for later near-duplicates."""
+    if not NEAR_DUPLICATE or not isinstance(result, dict) or result.get("partial") or result.get("near_duplicate"):
+        return
+    if result.get("status") in ("error", "success"):
+        near_duplicates.add(_near_duplicate_namespace(language), code, normalize_selected_language(language), result)
+
+
+def _analysis_schema(full_fix: bool = False):
+    if not STRUCTURED_OUTPUT:
+        return None
+    return FULL_FIX_RESPONSE_SCHEMA if full_fix else ANALYSIS_RESPONSE_SCHEMA
+
+
+def _timeout_response(e: DeadlineExceeded, message: str, fallback=None):
+    """Best partial result when there is one, otherwise a clean 504."""
+    partial = e.partial or fallback
+    if partial:
+        return JSONResponse({**partial, "partial": True})
+    return JSONResponse({"status": "error", "message": message, "detail": str(e), "timeout": True}, status_code=504)
+
+
+def _degraded_reason(e: Exception) -> str:
+    if isinstance(e, RemoteUnavailable):
+        return e.reason
+    return "deadline" if isinstance(e, DeadlineExceeded) else "models_failed"
+
+
+def degraded_result(code: str, language: str, static: StaticResult = None, reason: str = "models_failed"):
+    """
+    The local-only explain answer: static findings plus what the detector saw.
+    Never cached; with no findings the status is "degraded", not "success",
+    because nothing beyond the parser has looked at the code.
+    """
+    if static is None:
+        static = run_static_analysis(normalize_selected_language(language), code) if STATIC_ANALYSIS else StaticResult([])
+    _, detected_key = check_submission(code, language)
+    findings = static.analysis()
+    degraded_stats["served"] += 1
+    print(f"🪫 DEGRADED ANSWER ({reason}): {len(findings)} local findings")
+    return {
+        "status": "error" if findings else "degraded",
+        "analysis": findings,
+        "degraded": True,
+        "reason": reason,
+        "source": "static",
+        "detected": friendly_name.get(detected_key, "Unknown/Ambiguous"),
+        "selected": friendly_name.get(language, language),
+        "message": "AI models are unavailable right now; showing local checks only.",
+    }
+
+
+def _failure_response(e: Exception, message: str, code: str, language: str, static: StaticResult = None,
+                      include_corrected: bool = False, fallback=None):
+    """
+    A failed remote chain as a response: the partial result when there is
+    one, else the degraded local answer (explain mode), else a 503/504/500.
+    """
+    if isinstance(e, DeadlineExceeded) and (e.partial or fallback):
+        return _timeout_response(e, message, fallback)
+    if DEGRADED_FALLBACK and not include_corrected:
+        return JSONResponse(degraded_result(code, language, static, _degraded_reason(e)))
+    if isinstance(e, DeadlineExceeded):
+        return _timeout_response(e, message)
+    if isinstance(e, RemoteUnavailable):
+        return JSONResponse({"status": "error", "message": message, "detail": str(e), "unavailable": True}, status_code=503)
+    return JSONResponse({"status": "error", "message": message, "detail": str(e)}, status_code=500)
+
+
+def whole_file_fits(code: str, language: str, numbered_code: str, include_corrected: bool) -> bool:
+    """Can at least one model take this file in one prompt (both stages, with the expected answer)?"""
+    output_tokens = expected_output_tokens(code, include_corrected)
+    try:
+        for stage in ("analysis", "fullfix"):
+            prompt = _stage_prompt(stage, language, numbered_code, include_corrected)
+            route(MODELS_POOL, prompt_tokens(prompt.user, prompt.system), output_tokens)
+    except PromptTooLarge as e:
+        print(f"📏 {e}")
+        return False
+    return True
+
+
+def _too_large_response(message: str = "Code is too large for a full fix in one piece."):
+    return JSONResponse({"status": "error", "message": message, "too_large": True}, status_code=413)
+
+
+async def generate_json_cached(prompt: StagePrompt, stage: str, language: str, code: str, include_corrected: bool,
+                               deadline: Deadline = None, first_line: int = 1):
+    """
+    JSON generation behind the response cache.
+    Identical submissions (same template version, language, canonical code
+    and mode) are answered from SQLite without any model call. The fullfix
+    stage of a full fix must come back with corrected_code.
+    """
+    mode = f"{stage}:{'full_fix' if include_corrected else 'explain'}"
+    cache_key, canon = cache_entry(language, code, mode, first_line)
+
+    cached = await asyncio.to_thread(response_cache.get, cache_key)
+    if cached is not None:
+        print(f"⚡ CACHE HIT ({mode})")
+        return canon.to_original(cached)
+
+    result = await generate_coalesced(
+        prompt.user, require_json=True, response_schema=_analysis_schema(full_fix=include_corrected and stage == "fullfix"),
+        deadline=deadline,
+        output_tokens=expected_output_tokens(code, include_corrected), system=prompt.system or None,
+    )
+    if result.get("partial"):
+        # A repaired truncated answer is shown once, never served from the cache
+        return result
+    await asyncio.to_thread(response_cache.put, cache_key, canon.to_canonical(result))
+    if mode == "fullfix:explain":
+        await asyncio.to_thread(remember_near_duplicate, code, language, result)
+    return result
+
+
+async def analyse_chunks(chunks, language: str, deadline: Deadline = None):
+    """
+    Explain-mode analysis of code chunks: each chunk keeps its ORIGINAL line
+    numbers in the prompt, chunks run concurrently (at most CHUNK_CONCURRENCY
+    at once) and are merged into one response. Failed chunks leave a partial result.
+    """
+    semaphore = asyncio.Semaphore(CHUNK_CONCURRENCY)
+
+    async def analyse(chunk):
+        prompt = _stage_prompt("fullfix", language, add_line_numbers(chunk.text, start=chunk.start), False)
+        async with semaphore:
+            return await generate_json_cached(prompt, f"fullfix@{chunk.start}", language, chunk.text, False, deadline, chunk.start)
+
+    results = await asyncio.gather(*(analyse(chunk) for chunk in chunks), return_exceptions=True)
+    failed = [r for r in results if isinstance(r, BaseException)]
+    if len(failed) == len(results):
+        raise failed[0]
+    for error in failed:
+        print(f"⚠️ CHUNK FAILED. REASON: {repr(error)}")
+
+    merged = merge_chunk_results(chunks, results)
+    if failed:
+        merged["partial"] = True
+    return merged
+
+
+async def explain_chunked(code: str, language: str, deadline: Deadline = None):
+    """Explain mode for large files: function/class-level chunks analysed in parallel."""
+    chunks = split_into_chunks(code, normalize_selected_language(language), CHUNK_MAX_LINES, CHUNK_OVERLAP_LINES)
+    print(f"🧩 CHUNKED ANALYSIS: {len(chunks)} chunks")
+    return await analyse_chunks(chunks, language, deadline)
+
+
+def remember_analysis(session_id: str, language: str, code: str, result: dict):
+    """Keeps a complete explain-mode result as the session's diff baseline."""
+    if session_id and isinstance(result, dict) and not result.get("partial") and result.get("status") in ("error", "success"):
+        analysis_snapshots.put(session_id, language, code, result)
+
+
+async def explain_incremental(session_id: str, code: str, language: str, deadline: Deadline = None):
+    """
+    Diff-aware re-analysis for an editor session: only the changed hunks go to
+    the model, and the previous findings for untouched lines are shifted and
+    merged back. Returns None when a full analysis is needed instead.
+    """
+    snapshot = await asyncio.to_thread(analysis_snapshots.get, session_id)
+    if snapshot is None or snapshot["language"] != language:
+        return None
+
+    plan = ReanalysisPlan(snapshot["code"], code, DIFF_CONTEXT_LINES)
+    if plan.changed_lines > DIFF_MAX_CHANGED_RATIO * max(1, len(plan.new_lines)):
+        return None
+    if not plan.regions:
+        print("♻️ INCREMENTAL: code unchanged since the last analysis")
+        return snapshot["result"]
+
+    print(f"♻️ INCREMENTAL: re-analysing {len(plan.regions)} hunks ({plan.changed_lines} of {len(plan.new_lines)} lines)")
+    fresh = await analyse_chunks(plan.chunks(), language, deadline)
+    result = merge_incremental(plan.carry_over(snapshot["result"].get("analysis")), fresh, snapshot["result"])
+    if fresh.get("partial"):
+        result["partial"] = True
+    await asyncio.to_thread(remember_analysis, session_id, language, code, result)
+    return result
 
 
 @app.post("/explain")
@@ -986,8 +1943,9 @@ async def explain(payload: ExplainPayload):
     code = payload.code or ""
     language = payload.language or ""
     include_corrected = (payload.mode == "full_fix") or payload.wantCorrected
+    deadline = request_deadline(payload.deadlineMs, EXPLAIN_DEADLINE)
 
-    is_valid, detected_key = verify_submission(code, language)
+    is_valid, detected_key = check_submission(code, language)
 
     if not is_valid:
         detected_display = friendly_name.get(detected_key, "Unknown/Ambiguous")
@@ -1000,42 +1958,529 @@ async def explain(payload: ExplainPayload):
             "message": f"❌ LANGUAGE MISMATCH: You selected '{selected_display}', but detected '{detected_display}'."
         }
 
-    numbered_code = add_line_numbers(code)
+    static = static_precheck(code, language)
+    local_result = static_short_circuit(static)
+    if not include_corrected and local_result is not None:
+        prefetch_full_fix(code, language, local_result)
+        return JSONResponse(local_result)
+
+    if not include_corrected and payload.sessionId:
+        try:
+            incremental = await explain_incremental(payload.sessionId, code, language, deadline)
+        except (DeadlineExceeded, RemoteUnavailable) as e:
+            return _failure_response(e, "AI analysis timed out.", code, language, static)
+        except Exception:
+            traceback.print_exc()
+            incremental = None
+        if incremental is not None:
+            prefetch_full_fix(code, language, incremental)
+            return JSONResponse(incremental)
 
-    analysis_prompt = prompt_loader.analysis_prompt
-    analysis_prompt = analysis_prompt.replace("{{LANGUAGE}}", language).replace("{{NUMBERED_CODE}}", numbered_code)
-    if include_corrected:
-        analysis_prompt = analysis_prompt.replace("{{INCLUDE_CORRECTED}}", ', "corrected_code": "<PROVIDE_CODE>"')
-    else:
-        analysis_prompt = analysis_prompt.replace("{{INCLUDE_CORRECTED}}", "")
+    numbered_code = add_line_numbers(code)
+    oversized = len(code.splitlines()) > CHUNK_THRESHOLD_LINES
+    if (include_corrected or not oversized) and not whole_file_fits(code, language, numbered_code, include_corrected):
+        if include_corrected:
+            return _too_large_response()
+        oversized = True    # no model holds the whole file: analyse it in chunks
+
+    if not include_corrected and oversized:
+        try:
+            result = await explain_chunked(code, language, deadline)
+            await asyncio.to_thread(remember_analysis, payload.sessionId, language, code, result)
+            return JSONResponse(result)
+        except DeadlineExceeded as e:
+            return _failure_response(e, "AI analysis timed out.", code, language, static)
+        except RemoteUnavailable as e:
+            return _failure_response(e, "AI analysis failed.", code, language, static)
+        except Exception as e:
+            traceback.print_exc()
+            return _failure_response(e, "AI analysis failed.", code, language, static)
+
+    reused, hints = await near_duplicate_lookup(code, language, include_corrected)
+    if reused is not None:
+        await asyncio.to_thread(remember_analysis, payload.sessionId, language, code, reused)
+        prefetch_full_fix(code, language, reused)
+        return JSONResponse(reused)
 
     try:
-        # 🔹 USE ROTATION FUNCTION (Automatically returns the Dictionary now!)
-        analysis_result = generate_with_rotation(analysis_prompt, require_json=True)
-
+        # 🔹 Code that doesn't compile needs no stage-1 call to know a fix is allowed
+        if local_result is not None:
+            analysis_result = local_result
+        else:
+            analysis_prompt = _stage_prompt("analysis", language, numbered_code, include_corrected, static, hints)
+            # 🔹 USE ROTATION FUNCTION (Automatically returns the Dictionary now!)
+            analysis_result = await generate_json_cached(analysis_prompt, "analysis", language, code, include_corrected, deadline)
+
+    except DeadlineExceeded as e:
+        return _failure_response(e, "AI analysis timed out.", code, language, static, include_corrected)
+    except RemoteUnavailable as e:
+        return _failure_response(e, "AI analysis failed.", code, language, static, include_corrected)
     except Exception as e:
         traceback.print_exc()
-        return JSONResponse({"status": "error", "message": "AI analysis failed.", "detail": str(e)}, status_code=500)
+        return _failure_response(e, "AI analysis failed.", code, language, static, include_corrected)
 
     if include_corrected and analysis_result.get("status") == "success":
         return {"status": "full_fix_not_allowed"}
 
-    fullfix_prompt = prompt_loader.fullfix_prompt
-    fullfix_prompt = fullfix_prompt.replace("{{LANGUAGE}}", language).replace("{{NUMBERED_CODE}}", numbered_code)
-    if include_corrected:
-        fullfix_prompt = fullfix_prompt.replace("{{INCLUDE_CORRECTED}}", ', "corrected_code": "<PROVIDE_CODE>"')
-    else:
-        fullfix_prompt = fullfix_prompt.replace("{{INCLUDE_CORRECTED}}", "")
+    fullfix_prompt = _stage_prompt("fullfix", language, numbered_code, include_corrected, static, hints)
 
     try:
         # 🔹 USE ROTATION FUNCTION (Automatically returns the Dictionary now!)
-        json_full = generate_with_rotation(fullfix_prompt, require_json=True)
+        json_full = await generate_json_cached(fullfix_prompt, "fullfix", language, code, include_corrected, deadline)
+        if not include_corrected:
+            await asyncio.to_thread(remember_analysis, payload.sessionId, language, code, json_full)
+            prefetch_full_fix(code, language, json_full)
 
         return JSONResponse(json_full)
 
+    except DeadlineExceeded as e:
+        # The completed stage-1 analysis of the same code is the best partial we have
+        return _timeout_response(e, "AI full fix timed out.", fallback=analysis_result)
+    except RemoteUnavailable as e:
+        return _failure_response(e, "AI full fix failed.", code, language, static, include_corrected)
     except Exception as e:
         traceback.print_exc()
-        return JSONResponse({"status": "error", "message": "AI full fix failed.", "detail": str(e)}, status_code=500)
+        return _failure_response(e, "AI full fix failed.", code, language, static, include_corrected)
+
+
+# --------------------------------------------------------------------
+# 🔹 /explain/stream  (Server-Sent Events)
+# --------------------------------------------------------------------
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _replay_events(result: dict):
+    """A finished result (cache hit / incremental re-analysis) as the same SSE sequence."""
+    yield _sse("status", {"status": result.get("status")})
+    for item in result.get("analysis") or []:
+        yield _sse("finding", item)
+    yield _sse("done", result)
+
+
+def _parse_streamed_json(raw_text: str):
+    try:
+        return json.loads(re.sub(r"```json|```", "", raw_text).strip())
+    except json.JSONDecodeError:
+        return repair_json(raw_text)
+
+
+@app.post("/explain/stream")
+async def explain_stream(payload: ExplainPayload):
+    """
+    Same analysis as /explain (explain mode), streamed as SSE:
+      event: status   -> {"status": ...} as soon as the model commits to one
+      event: finding  -> one entry of the `analysis` array, as soon as it closes
+      event: done     -> the complete parsed JSON
+      event: mismatch / error
+    """
+    code = payload.code or ""
+    language = payload.language or ""
+
+    is_valid, detected_key = check_submission(code, language)
+    if not is_valid:
+        detected_display = friendly_name.get(detected_key, "Unknown/Ambiguous")
+        selected_display = friendly_name.get(language, language)
+        mismatch = {
+            "status": "language_mismatch",
+            "detected": detected_display,
+            "selected": selected_display,
+            "message": f"❌ LANGUAGE MISMATCH: You selected '{selected_display}', but detected '{detected_display}'."
+        }
+        return StreamingResponse(iter([_sse("mismatch", mismatch)]), media_type="text/event-stream")
+
+    sse_headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    static = static_precheck(code, language)
+    local_result = static_short_circuit(static)
+    if local_result is not None:
+        prefetch_full_fix(code, language, local_result)
+        return StreamingResponse(_replay_events(local_result), media_type="text/event-stream", headers=sse_headers)
+
+    deadline = request_deadline(payload.deadlineMs, EXPLAIN_DEADLINE)
+    cache_key, canon = cache_entry(language, code, "fullfix:explain")
+
+    if payload.sessionId:
+        try:
+            incremental = await explain_incremental(payload.sessionId, code, language, deadline)
+        except Exception:
+            traceback.print_exc()
+            incremental = None
+        if incremental is not None:
+            prefetch_full_fix(code, language, incremental)
+            return StreamingResponse(_replay_events(incremental), media_type="text/event-stream", headers=sse_headers)
+
+    reused, hints = await near_duplicate_lookup(code, language)
+    if reused is not None:
+        await asyncio.to_thread(remember_analysis, payload.sessionId, language, code, reused)
+        prefetch_full_fix(code, language, reused)
+        return StreamingResponse(_replay_events(reused), media_type="text/event-stream", headers=sse_headers)
+
+    numbered_code = add_line_numbers(code)
+    if not whole_file_fits(code, language, numbered_code, False):
+        # Too big for every model in one prompt: chunk it and replay the merged result
+        try:
+            result = await explain_chunked(code, language, deadline)
+        except Exception as e:
+            traceback.print_exc()
+            if DEGRADED_FALLBACK and not getattr(e, "partial", None):
+                degraded = degraded_result(code, language, static, _degraded_reason(e))
+                return StreamingResponse(_replay_events(degraded), media_type="text/event-stream", headers=sse_headers)
+            error = {"status": "error", "message": "AI analysis failed.", "detail": str(e)}
+            return StreamingResponse(iter([_sse("error", error)]), media_type="text/event-stream", headers=sse_headers)
+        await asyncio.to_thread(remember_analysis, payload.sessionId, language, code, result)
+        return StreamingResponse(_replay_events(result), media_type="text/event-stream", headers=sse_headers)
+
+    fullfix_prompt = _stage_prompt("fullfix", language, numbered_code, False, static, hints)
+
+    # events() runs in a worker thread; the prefetch has to be started on the loop
+    loop = asyncio.get_running_loop()
+
+    def events():
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            cached = canon.to_original(cached)
+            print("⚡ CACHE HIT (stream)")
+            remember_analysis(payload.sessionId, language, code, cached)
+            loop.call_soon_threadsafe(prefetch_full_fix, code, language, cached)
+            yield from _replay_events(cached)
+            return
+
+        reason = remote_unlikely(routable_models(fullfix_prompt.user, None, fullfix_prompt.system or None),
+                                 prompt_tokens(fullfix_prompt.user, fullfix_prompt.system), deadline)
+        if reason is not None:
+            degraded_stats["refused_calls"] += 1
+            if DEGRADED_FALLBACK:
+                yield from _replay_events(degraded_result(code, language, static, reason))
+            else:
+                yield _sse("error", {"status": "error", "message": "AI analysis failed.", "detail": str(RemoteUnavailable(reason))})
+            return
+
+        parser = AnalysisStreamParser()
+        status_sent = False
+        try:
+            for chunk in stream_with_rotation(
+                fullfix_prompt.user, response_schema=_analysis_schema(), deadline=deadline, system=fullfix_prompt.system or None
+            ):
+                findings = parser.feed(chunk)
+                if parser.status and not status_sent:
+                    status_sent = True
+                    yield _sse("status", {"status": parser.status})
+                for item in findings:
+                    yield _sse("finding", item)
+
+            result = _parse_streamed_json(parser.text)
+            if not result.get("partial"):
+                response_cache.put(cache_key, canon.to_canonical(result))
+            remember_near_duplicate(code, language, result)
+            remember_analysis(payload.sessionId, language, code, result)
+            loop.call_soon_threadsafe(prefetch_full_fix, code, language, result)
+            yield _sse("done", result)
+        except Exception as e:
+            traceback.print_exc()
+            if DEGRADED_FALLBACK and not parser.text:
+                # Nothing reached the client yet: the local answer can still be sent whole
+                yield from _replay_events(degraded_result(code, language, static, _degraded_reason(e)))
+                return
+            yield _sse("error", {"status": "error", "message": "AI analysis failed.", "detail": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=sse_headers)
+
+
+# --------------------------------------------------------------------
+# 🔹 /explain/batch  (NDJSON, one line per file as it completes)
+# --------------------------------------------------------------------
+# One cap shared by ALL batches, so a big upload can't starve the process;
+# per-model quotas are still enforced by the rate limiter underneath.
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "500"))
+BATCH_MAX_FILE_BYTES = int(os.getenv("BATCH_MAX_FILE_BYTES", "200000"))
+batch_semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+
+class BatchFile(BaseModel):
+    path: str = ""
+    code: str
+    language: str = None
+
+
+class BatchPayload(BaseModel):
+    files: list[BatchFile]
+    language: str = None
+
+
+async def _batch_input(request: Request):
+    """
+    (path, code, language) triples from either a JSON body
+    ({"files": [{"path", "code", "language"?}], "language"?}) or a multipart
+    upload of source files and/or zip archives (field "files", optional "language").
+    """
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        form = await request.form()
+        default_language = form.get("language") or None
+        files = []
+        for upload in form.getlist("files"):
+            if isinstance(upload, str):
+                continue
+            data = await upload.read()
+            name = upload.filename or ""
+            if name.lower().endswith(".zip"):
+                files += files_from_zip(data, BATCH_MAX_FILES, BATCH_MAX_FILE_BYTES)
+            elif len(data) <= BATCH_MAX_FILE_BYTES:
+                files.append((name, data.decode("utf-8", errors="replace")))
+        return [(path, code, default_language or language_for_path(path)) for path, code in files[:BATCH_MAX_FILES]]
+
+    payload = BatchPayload(**(await request.json()))
+    return [
+        (f.path, f.code, f.language or payload.language or language_for_path(f.path))
+        for f in payload.files[:BATCH_MAX_FILES]
+    ]
+
+
+async def explain_batch_file(index: int, path: str, code: str, language: str):
+    """Language check + explain-mode analysis of ONE batch file. Never raises."""
+    current_lane.set(BULK)
+    head = {"index": index, "path": path, "language": language}
+    if not language:
+        return {**head, "status": "error", "message": "Unknown language: pass one or use a known file extension."}
+
+    is_valid, detected_key = check_submission(code, language)
+    if not is_valid:
+        return {
+            **head,
+            "status": "language_mismatch",
+            "detected": friendly_name.get(detected_key, "Unknown/Ambiguous"),
+            "selected": friendly_name.get(language, language),
+        }
+
+    static = static_precheck(code, language)
+    local_result = static_short_circuit(static)
+    if local_result is not None:
+        return {**head, **local_result}
+
+    async with batch_semaphore:
+        deadline = Deadline(EXPLAIN_DEADLINE)
+        try:
+            reused, hints = await near_duplicate_lookup(code, language)
+            if reused is not None:
+                result = reused
+            elif len(code.splitlines()) > CHUNK_THRESHOLD_LINES \
+                    or not whole_file_fits(code, language, add_line_numbers(code), False):
+                result = await explain_chunked(code, language, deadline)
+            else:
+                prompt = _stage_prompt("fullfix", language, add_line_numbers(code), False, static, hints)
+                result = await generate_json_cached(prompt, "fullfix", language, code, False, deadline)
+        except DeadlineExceeded as e:
+            if e.partial:
+                return {**head, **e.partial, "partial": True}
+            if DEGRADED_FALLBACK:
+                return {**head, **degraded_result(code, language, static, "deadline")}
+            return {**head, "status": "error", "message": "AI analysis timed out.", "timeout": True}
+        except Exception as e:
+            traceback.print_exc()
+            if DEGRADED_FALLBACK:
+                return {**head, **degraded_result(code, language, static, _degraded_reason(e))}
+            return {**head, "status": "error", "message": "AI analysis failed.", "detail": str(e)}
+    return {**head, **result}
+
+
+@app.post("/explain/batch")
+async def explain_batch(request: Request):
+    """
+    Analyses many files concurrently (explain mode, same cache as /explain)
+    and streams one NDJSON line per file in completion order, then a summary line.
+    """
+    try:
+        files = await _batch_input(request)
+    except Exception as e:
+        return JSONResponse({"status": "error", "message": "Invalid batch input.", "detail": str(e)}, status_code=400)
+    if not files:
+        return JSONResponse({"status": "error", "message": "No analysable files in the batch."}, status_code=400)
+
+    print(f"📦 BATCH: {len(files)} files")
+
+    async def lines():
+        started = time.monotonic()
+        tasks = [
+            asyncio.create_task(explain_batch_file(i, path, code, language))
+            for i, (path, code, language) in enumerate(files)
+        ]
+        counts = {}
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                counts[result["status"]] = counts.get(result["status"], 0) + 1
+                yield json.dumps(result) + "\n"
+            yield json.dumps({
+                "status": "batch_complete",
+                "files": len(files),
+                "counts": counts,
+                "elapsed_ms": int((time.monotonic() - started) * 1000),
+            }) + "\n"
+        finally:
+            # Client went away: stop the files that haven't run yet
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"Cache-Control": "no-cache"})
+
+
+# --------------------------------------------------------------------
+# 🔹 BACKGROUND JOBS  (/jobs)
+# --------------------------------------------------------------------
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BACKOFF = float(os.getenv("JOB_RETRY_BACKOFF", "5"))
+JOB_RETENTION = float(os.getenv("JOB_RETENTION", "86400"))
+JOB_DEADLINE = min(float(os.getenv("JOB_DEADLINE", "240")), MAX_DEADLINE)
+
+
+async def run_explain_job(kind: str, payload: dict):
+    """Job handler: the same two-stage flow as /explain, without an open HTTP request."""
+    code = payload["code"]
+    language = payload["language"]
+    include_corrected = kind == "full_fix"
+    deadline = Deadline(JOB_DEADLINE)
+    current_lane.set(normalize_lane(payload.get("lane")))
+    numbered_code = add_line_numbers(code)
+    static = static_precheck(code, language)
+    local_result = static_short_circuit(static)
+    if not include_corrected and local_result is not None:
+        return local_result
+    if not whole_file_fits(code, language, numbered_code, include_corrected):
+        if include_corrected:
+            return {"status": "error", "message": "Code is too large for a full fix in one piece.", "too_large": True}
+        return await explain_chunked(code, language, deadline)
+    reused, hints = await near_duplicate_lookup(code, language, include_corrected)
+    if reused is not None:
+        return reused
+
+    if local_result is None:
+        analysis_prompt = _stage_prompt("analysis", language, numbered_code, include_corrected, static, hints)
+        analysis_result = await generate_json_cached(analysis_prompt, "analysis", language, code, include_corrected, deadline)
+        if include_corrected and analysis_result.get("status") == "success":
+            return {"status": "full_fix_not_allowed"}
+
+    fullfix_prompt = _stage_prompt("fullfix", language, numbered_code, include_corrected, static, hints)
+    return await generate_json_cached(fullfix_prompt, "fullfix", language, code, include_corrected, deadline)
+
+
+job_workers = JobWorkers(
+    job_queue,
+    run_explain_job,
+    size=JOB_WORKERS,
+    backoff_seconds=JOB_RETRY_BACKOFF,
+    retention_seconds=JOB_RETENTION,
+)
+
+
+@app.post("/jobs")
+async def submit_job(payload: ExplainPayload):
+    """
+    Queues an /explain request (usually a full fix) and returns its job ID at once.
+    `lane: "bulk"` runs it behind interactive traffic.
+    """
+    code = payload.code or ""
+    language = payload.language or ""
+
+    is_valid, detected_key = check_submission(code, language)
+    if not is_valid:
+        detected_display = friendly_name.get(detected_key, "Unknown/Ambiguous")
+        selected_display = friendly_name.get(language, language)
+        return {
+            "status": "language_mismatch",
+            "detected": detected_display,
+            "selected": selected_display,
+            "message": f"❌ LANGUAGE MISMATCH: You selected '{selected_display}', but detected '{detected_display}'."
+        }
+
+    kind = "full_fix" if (payload.mode == "full_fix" or payload.wantCorrected) else "explain"
+    job_id = await asyncio.to_thread(
+        job_queue.submit, kind, {"code": code, "language": language, "lane": normalize_lane(payload.lane)}, JOB_MAX_ATTEMPTS
+    )
+    job_workers.notify()
+    return JSONResponse({"status": "queued", "jobId": job_id}, status_code=202)
+
+
+@app.get("/jobs")
+async def job_stats():
+    return {"status": "success", "jobs": await asyncio.to_thread(job_queue.stats), "workers": JOB_WORKERS}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    if job is None:
+        return JSONResponse({"status": "error", "message": "Job not found."}, status_code=404)
+    return {"status": "success", "job": job}
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """SSE subscription: a `status` event on every state change, then `done` with the finished job."""
+    async def events():
+        last_state = None
+        while True:
+            job = await asyncio.to_thread(job_queue.get, job_id)
+            if job is None:
+                yield _sse("error", {"status": "error", "message": "Job not found."})
+                return
+            if job["status"] != last_state:
+                last_state = job["status"]
+                yield _sse("status", {"status": last_state, "attempts": job["attempts"]})
+            if job["status"] in ("done", "failed"):
+                yield _sse("done", job)
+                return
+            await asyncio.sleep(1.0)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+# --------------------------------------------------------------------
+# 🔹 SPECULATIVE FULL-FIX PREFETCH
+# --------------------------------------------------------------------
+# When an explain-mode analysis finds errors, the full fix the user is likely
+# to ask for next is generated in the background (bulk lane) and lands in the
+# response cache, so the Full Fix click is usually a cache hit.
+SPECULATIVE_FULL_FIX = os.getenv("SPECULATIVE_FULL_FIX", "0") == "1"
+SPECULATIVE_PER_MINUTE = float(os.getenv("SPECULATIVE_PER_MINUTE", "6"))
+
+speculative_budget = TokenBucket(SPECULATIVE_PER_MINUTE)
+speculative_stats = {"started": 0, "completed": 0, "failed": 0, "skipped_cached": 0, "skipped_budget": 0}
+_speculative_tasks = {}
+
+
+def prefetch_full_fix(code: str, language: str, result: dict):
+    """Starts a background full fix for an analysis that found errors (if enabled and within budget)."""
+    if not SPECULATIVE_FULL_FIX or not isinstance(result, dict):
+        return
+    if result.get("status") != "error" or result.get("partial") or len(code.splitlines()) > CHUNK_THRESHOLD_LINES:
+        return
+
+    cache_key, _ = cache_entry(language, code, "fullfix:full_fix")
+    if cache_key in _speculative_tasks:
+        return
+    if response_cache.contains(cache_key):
+        speculative_stats["skipped_cached"] += 1
+        return
+    if speculative_budget.wait_time(1, time.monotonic()) > 0:
+        speculative_stats["skipped_budget"] += 1
+        print("💸 SPECULATIVE FULL FIX skipped (per-minute budget spent)")
+        return
+    speculative_budget.take(1)
+    speculative_stats["started"] += 1
+    print("🔮 SPECULATIVE FULL FIX started")
+
+    async def run():
+        try:
+            await run_explain_job("full_fix", {"code": code, "language": language, "lane": BULK})
+            speculative_stats["completed"] += 1
+        except Exception as e:
+            speculative_stats["failed"] += 1
+            print(f"⚠️ SPECULATIVE FULL FIX FAILED. REASON: {repr(e)}")
+        finally:
+            _speculative_tasks.pop(cache_key, None)
+
+    _speculative_tasks[cache_key] = asyncio.create_task(run())
 
 
 # --------------------------------------------------------------------
@@ -1043,23 +2488,78 @@ async def explain(payload: ExplainPayload):
 # --------------------------------------------------------------------
 class AssistantPayload(BaseModel):
     message: str
+    deadlineMs: int = None
+    conversationId: str = None
+
+
+# 🔹 Conversation mode (with a conversationId): recent turns verbatim within a
+# token budget, older ones as a rolling summary cached in SQLite and refreshed
+# in the background (bulk lane) after a reply, never on the request path.
+chat_memory = ConversationMemory(
+    DB_PATH,
+    turn_budget=int(os.getenv("ASSISTANT_HISTORY_TOKENS", "3000")),
+    summary_budget=int(os.getenv("ASSISTANT_SUMMARY_TOKENS", "600")),
+    max_turn_tokens=int(os.getenv("ASSISTANT_TURN_TOKENS", "1000")),
+)
+chat_memory_stats = {"summaries_built": 0, "summary_failures": 0}
+_summary_tasks = {}
+
+
+def refresh_chat_summary(conversation_id: str):
+    """Folds overflowing turns into the conversation's summary in the background (one task per conversation)."""
+    if conversation_id in _summary_tasks:
+        return
+
+    async def run():
+        current_lane.set(BULK)
+        try:
+            plan = await asyncio.to_thread(chat_memory.fold_plan, conversation_id)
+            if plan is None:
+                return
+            summary = await generate_coalesced(plan.prompt(), deadline=Deadline(ASSISTANT_DEADLINE))
+            await asyncio.to_thread(chat_memory.store_summary, conversation_id, plan.upto_id, summary)
+            chat_memory_stats["summaries_built"] += 1
+            print(f"🧠 CHAT SUMMARY updated ({len(plan.turns)} turns folded)")
+        except Exception as e:
+            chat_memory_stats["summary_failures"] += 1
+            print(f"⚠️ CHAT SUMMARY FAILED. REASON: {repr(e)}")
+        finally:
+            _summary_tasks.pop(conversation_id, None)
+
+    _summary_tasks[conversation_id] = asyncio.create_task(run())
 
 
 @app.post("/assistant")
 async def assistant(payload: AssistantPayload):
     message = payload.message or ""
+    conversation_id = (payload.conversationId or "").strip()[:128] or None
 
     if not message.strip():
         return {"status": "error", "message": "Message is required."}
     try:
-        prompt = f'You are an AI coding assistant.\nUser asked:\n"{message}"'
+        history = ""
+        if conversation_id:
+            history = (await asyncio.to_thread(chat_memory.context, conversation_id)).render()
+        if history:
+            prompt = f'You are an AI coding assistant.\n\n{history}\n\nUser asked:\n"{message}"'
+        else:
+            prompt = f'You are an AI coding assistant.\nUser asked:\n"{message}"'
         
         # 🔹 USE ROTATION FUNCTION (require_json=False by default)
-        ai_text = generate_with_rotation(prompt)
+        ai_text = await generate_coalesced(prompt, deadline=request_deadline(payload.deadlineMs, ASSISTANT_DEADLINE))
 
-        cursor.execute("INSERT INTO ai_chat (user_message, ai_response) VALUES (?, ?)", (message, ai_text))
+        cursor.execute(
+            "INSERT INTO ai_chat (user_message, ai_response, conversation_id) VALUES (?, ?, ?)",
+            (message, ai_text, conversation_id),
+        )
         conn.commit()
+        if conversation_id:
+            refresh_chat_summary(conversation_id)
         return {"status": "success", "reply": ai_text}
+    except DeadlineExceeded as e:
+        return JSONResponse({"status": "error", "message": "AI assistant timed out.", "detail": str(e), "timeout": True}, status_code=504)
+    except PromptTooLarge as e:
+        return JSONResponse({"status": "error", "message": "Message is too long for any model.", "detail": str(e), "too_large": True}, status_code=413)
     except Exception as e:
         traceback.print_exc()
         return JSONResponse({"status": "error", "message": "AI assistant failed.", "detail": str(e)}, status_code=500)
@@ -145,7 +145,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 const res = await fetch("/assistant", {
                     method: "POST",
                     headers: { "Content-Type": "application/json" },
-                    body: JSON.stringify({ message })
+                    body: JSON.stringify({ message, conversationId: getConversationId() })
                 });
 
                 const data = await res.json();
@@ -239,73 +239,246 @@ async function explainCode() {
     loading.classList.remove('hidden');
 
     try {
-        // Post code to backend
-        const response = await fetch('/explain', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ code, language })
-        });
-
-        const data = await response.json();
+        // Stream findings row by row; falls back to plain /explain if streaming is unavailable
+        const data = await streamExplain(code, language, outputDiv, loading);
         loading.classList.add('hidden');
+        renderExplainResult(data, outputDiv, fullFixBtn);
 
+    } catch (err) {
+        loading.classList.add('hidden');
         fullFixBtn.disabled = true;
+        outputDiv.innerHTML = `<div class="error-msg">Connection Error</div>`;
+        console.error(err);
+    }
+}
 
-        // Backend says wrong language
-        if (data.status === 'language_mismatch') {
-            outputDiv.innerHTML = `
-                <div class="warning-msg">
-                    <h3>⚠ Language Mismatch</h3>
-                    <p>${data.message}</p>
-                </div>`;
-            return;
-        }
 
-        // Code has errors
-        if (data.status === 'error') {
+// ================================
+// Editor Session (diff-aware re-analysis)
+// ================================
+// One id per browser tab: the backend keeps the last analysis for it and
+// only re-sends the changed hunks when the code is edited and explained again.
+function getSessionId() {
+    let id = sessionStorage.getItem("analysis-session");
+    if (!id) {
+        id = (window.crypto && crypto.randomUUID)
+            ? crypto.randomUUID()
+            : Date.now().toString(36) + Math.random().toString(36).slice(2);
+        sessionStorage.setItem("analysis-session", id);
+    }
+    return id;
+}
+
+
+// One assistant conversation per browser (the saved chat is shown across tabs):
+// the backend answers with the recent turns and a summary of older ones as context.
+function getConversationId() {
+    let id = localStorage.getItem("assistant-conversation");
+    if (!id) {
+        id = (window.crypto && crypto.randomUUID)
+            ? crypto.randomUUID()
+            : Date.now().toString(36) + Math.random().toString(36).slice(2);
+        localStorage.setItem("assistant-conversation", id);
+    }
+    return id;
+}
 
-            fullFixBtn.disabled = false;
-            fullFixBtn.title = "Click to generate full corrected code";
 
-            let html = `
+// ================================
+// Streaming Analysis (SSE over fetch)
+// ================================
+async function streamExplain(code, language, outputDiv, loading) {
+    const sessionId = getSessionId();
+    const response = await fetch('/explain/stream', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ code, language, sessionId })
+    });
+
+    if (!response.ok || !response.body || !response.body.getReader) {
+        const fallback = await fetch('/explain', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ code, language, sessionId })
+        });
+        return await fallback.json();
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // SSE frames are separated by a blank line
+        let sep;
+        while ((sep = buffer.indexOf('\n\n')) !== -1) {
+            const frame = buffer.slice(0, sep);
+            buffer = buffer.slice(sep + 2);
+
+            let event = 'message';
+            let dataText = '';
+            frame.split('\n').forEach(line => {
+                if (line.startsWith('event:')) event = line.slice(6).trim();
+                else if (line.startsWith('data:')) dataText += line.slice(5).trim();
+            });
+            const payload = dataText ? JSON.parse(dataText) : {};
+
+            if (event === 'finding') {
+                loading.classList.add('hidden');
+                appendStreamingFinding(payload, outputDiv);
+            } else if (event === 'done' || event === 'mismatch') {
+                return payload;
+            } else if (event === 'error') {
+                throw new Error(payload.detail || payload.message);
+            }
+        }
+    }
+    throw new Error('Stream ended before the analysis was complete.');
+}
+
+// Adds one finding to the live results while the stream is still running
+function appendStreamingFinding(item, outputDiv) {
+    if (item.issue !== undefined) {
+        let tbody = outputDiv.querySelector('.error-table tbody');
+        if (!tbody) {
+            outputDiv.innerHTML = `
                 <h3 style="color: var(--danger);">⚠ Issues Found</h3>
                 <table class="error-table">
                     <thead>
                         <tr><th>Line</th><th>Issue</th><th>Details</th></tr>
                     </thead>
-                    <tbody>`;
-
-            // List each error returned by backend
-            data.analysis.forEach(item => {
-                html += `
-                    <tr>
-                        <td>${item.line}</td>
-                        <td>${escapeHtml(item.issue)}</td>
-                        <td>${escapeHtml(item.detail)}</td>
-                    </tr>`;
-            });
-
-            html += `</tbody></table>`;
-            outputDiv.innerHTML = html;
-            return;
+                    <tbody></tbody>
+                </table>`;
+            tbody = outputDiv.querySelector('.error-table tbody');
         }
+        tbody.insertAdjacentHTML('beforeend', `
+            <tr>
+                <td>${item.line}</td>
+                <td>${escapeHtml(item.issue)}</td>
+                <td>${escapeHtml(item.detail)}</td>
+            </tr>`);
+        return;
+    }
 
-        // Code is correct
-        if (data.status === 'success') {
-            fullFixBtn.disabled = true;
-            renderSuccess(data, outputDiv);
-            return;
-        }
+    let feed = outputDiv.querySelector('.explanation-feed');
+    if (!feed) {
+        outputDiv.innerHTML = `<div class="explanation-feed"></div>`;
+        feed = outputDiv.querySelector('.explanation-feed');
+    }
+    feed.insertAdjacentHTML('beforeend', `
+        <div class="explain-card">
+            <div class="card-header">
+                <span class="line-badge">Line ${item.line}</span>
+            </div>
+            <div class="code-snippet">${escapeHtml(item.code)}</div>
+            <div class="card-body">${item.description}</div>
+        </div>`);
+}
 
-        // Fallback for unexpected response
-        outputDiv.innerHTML =
-            `<pre class="code-box">${escapeHtml(JSON.stringify(data, null, 2))}</pre>`;
+// Final render once the complete analysis JSON is known
+function renderExplainResult(data, outputDiv, fullFixBtn) {
+    fullFixBtn.disabled = true;
+
+    // Backend says wrong language
+    if (data.status === 'language_mismatch') {
+        outputDiv.innerHTML = `
+            <div class="warning-msg">
+                <h3>⚠ Language Mismatch</h3>
+                <p>${data.message}</p>
+            </div>`;
+        return;
+    }
 
-    } catch (err) {
-        loading.classList.add('hidden');
-        fullFixBtn.disabled = true;
-        outputDiv.innerHTML = `<div class="error-msg">Connection Error</div>`;
-        console.error(err);
+    // AI unavailable and the local checks found nothing
+    if (data.status === 'degraded') {
+        outputDiv.innerHTML = `
+            <div class="warning-msg">
+                <h3>⚠ AI Analysis Unavailable</h3>
+                <p>${escapeHtml(data.message)} No syntax errors were found locally.</p>
+            </div>`;
+        return;
+    }
+
+    // Code has errors
+    if (data.status === 'error') {
+
+        // Degraded answers come from local checks only: a full fix needs the models
+        fullFixBtn.disabled = !!data.degraded;
+        fullFixBtn.title = data.degraded ? "AI models are unavailable right now" : "Click to generate full corrected code";
+
+        let html = data.degraded
+            ? `<div class="warning-msg" style="margin-bottom:12px;">${escapeHtml(data.message)}</div>`
+            : '';
+        html += `
+            <h3 style="color: var(--danger);">⚠ Issues Found</h3>
+            <table class="error-table">
+                <thead>
+                    <tr><th>Line</th><th>Issue</th><th>Details</th></tr>
+                </thead>
+                <tbody>`;
+
+        // List each error returned by backend
+        data.analysis.forEach(item => {
+            html += `
+                <tr>
+                    <td>${item.line}</td>
+                    <td>${escapeHtml(item.issue)}</td>
+                    <td>${escapeHtml(item.detail)}</td>
+                </tr>`;
+        });
+
+        html += `</tbody></table>`;
+        outputDiv.innerHTML = html;
+        return;
+    }
+
+    // Code is correct
+    if (data.status === 'success') {
+        renderSuccess(data, outputDiv);
+        return;
+    }
+
+    // Fallback for unexpected response
+    outputDiv.innerHTML =
+        `<pre class="code-box">${escapeHtml(JSON.stringify(data, null, 2))}</pre>`;
+}
+
+
+// ================================
+// Background Job (submit + poll)
+// ================================
+async function runFullFixJob(code, language) {
+    const submit = await fetch("/jobs", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ code, language, mode: "full_fix" })
+    });
+
+    if (!submit.ok) {
+        // Job queue unavailable: fall back to the direct request
+        const response = await fetch("/explain", {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({ code, language, mode: "full_fix" })
+        });
+        return await response.json();
+    }
+
+    const queued = await submit.json();
+    if (!queued.jobId) return queued; // e.g. language_mismatch
+
+    while (true) {
+        await new Promise(resolve => setTimeout(resolve, 1500));
+        const res = await fetch(`/jobs/${queued.jobId}`);
+        const { job } = await res.json();
+        if (job.status === "done") return job.result;
+        if (job.status === "failed") {
+            return { status: "error", message: "AI full fix failed.", detail: job.error };
+        }
     }
 }
 
@@ -329,13 +502,8 @@ async function fullFixHandler() {
     document.getElementById("results").innerHTML = "";
 
     try {
-        const response = await fetch("/explain", {
-            method: "POST",
-            headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({ code, language, mode: "full_fix" })
-        });
-
-        const data = await response.json();
+        // Runs as a background job so a slow fix can't hit a proxy timeout
+        const data = await runFullFixJob(code, language);
 
         if (data.status === "full_fix_not_allowed") {
             document.getElementById("correctCode").innerHTML = `
@@ -0,0 +1,278 @@
+# mock_gemini.py
+# --------------------------------------------------------------------
+# 🔹 OFFLINE STAND-IN FOR THE GEMINI GENERATIVE API
+# --------------------------------------------------------------------
+# Speaks the REST shape of v1beta generateContent / streamGenerateContent
+# (system instructions and cachedContents included), so the real SDK (REST
+# transport) can talk to it. Start it and point the
+# backend at it:
+#
+#   python mock_gemini.py --port 8765 --latency lognormal:800,0.5 --rate-429 0.05
+#   GEMINI_API_ENDPOINT=http://localhost:8765 GEMINI_API_KEY=mock uvicorn main:app
+#
+# Latency, error and malformed-JSON injection can also be changed at runtime
+# with POST /mock/config; counters are at GET /mock/stats.
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+config = {
+    "latency": os.getenv("MOCK_LATENCY", "lognormal:600,0.4"),
+    "rate_429": float(os.getenv("MOCK_429_RATE", "0")),
+    "rate_500": float(os.getenv("MOCK_500_RATE", "0")),
+    "rate_malformed": float(os.getenv("MOCK_MALFORMED_RATE", "0")),
+    "retry_after": float(os.getenv("MOCK_RETRY_AFTER", "5")),
+    "stream_chunks": int(os.getenv("MOCK_STREAM_CHUNKS", "6")),
+}
+stats = {"requests": 0, "streams": 0, "cached_contents": 0, "injected_429": 0, "injected_500": 0, "injected_malformed": 0}
+cached_contents = {}        # cachedContents/<id> -> system instruction text
+_lock = threading.Lock()
+_rng = random.Random(int(os.getenv("MOCK_SEED", "0")) or None)
+
+app = FastAPI(title="Mock Gemini")
+
+
+# --------------------------------------------------------------------
+# 🔹 LATENCY + FAULT INJECTION
+# --------------------------------------------------------------------
+def sample_latency(spec: str) -> float:
+    """
+    Seconds to wait, from a spec like:
+      fixed:300 | uniform:200,900 | normal:600,150 | lognormal:600,0.4 (median ms, sigma)
+    """
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v.strip()] or [0.0]
+    with _lock:
+        if kind == "uniform":
+            ms = _rng.uniform(values[0], values[1] if len(values) > 1 else values[0])
+        elif kind == "normal":
+            ms = _rng.gauss(values[0], values[1] if len(values) > 1 else 0.0)
+        elif kind == "lognormal":
+            ms = values[0] * _rng.lognormvariate(0.0, values[1] if len(values) > 1 else 0.0)
+        else:
+            ms = values[0]
+    return max(0.0, ms) / 1000
+
+
+def _roll(rate: float) -> bool:
+    with _lock:
+        return rate > 0 and _rng.random() < rate
+
+
+def _count(name: str):
+    with _lock:
+        stats[name] += 1
+
+
+def _injected_error():
+    if _roll(config["rate_429"]):
+        _count("injected_429")
+        return JSONResponse(
+            {"error": {"code": 429, "message": "Resource has been exhausted (e.g. check quota).", "status": "RESOURCE_EXHAUSTED"}},
+            status_code=429,
+            headers={"Retry-After": str(int(config["retry_after"]))},
+        )
+    if _roll(config["rate_500"]):
+        _count("injected_500")
+        return JSONResponse(
+            {"error": {"code": 500, "message": "An internal error has occurred.", "status": "INTERNAL"}},
+            status_code=500,
+        )
+    return None
+
+
+def _malform(text: str) -> str:
+    """Breaks JSON the way real models do: truncation, trailing commas, stray quotes, fences."""
+    with _lock:
+        how = _rng.choice(["truncate", "trailing_comma", "stray_quote", "fence"])
+    if how == "truncate":
+        return text[: max(1, int(len(text) * 0.7))]
+    if how == "trailing_comma":
+        return text.replace("}]", "},]", 1)
+    if how == "stray_quote":
+        return text.replace('"detail": "', '"detail": "the "value" ', 1)
+    return f"```json\n{text}\n```"
+
+
+# --------------------------------------------------------------------
+# 🔹 CANNED ANSWERS
+# --------------------------------------------------------------------
+_NUMBERED_LINE = re.compile(r"^(\d+) \| (.*)$", re.MULTILINE)
+
+
+def _parts_text(content) -> list:
+    return [part["text"] for part in (content or {}).get("parts") or [] if "text" in part]
+
+
+def _prompt_text(body: dict) -> str:
+    parts = _parts_text(body.get("systemInstruction"))
+    if body.get("cachedContent") in cached_contents:
+        parts.append(cached_contents[body["cachedContent"]])
+    for content in body.get("contents") or []:
+        parts.extend(_parts_text(content))
+    return "\n".join(parts)
+
+
+def _analysis_answer(prompt: str) -> str:
+    """Deterministic analysis JSON for the numbered code in the prompt."""
+    lines = [(int(n), code) for n, code in _NUMBERED_LINE.findall(prompt) if code.strip()]
+    seed = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8], 16)
+    picked = [line for line in lines if (seed + line[0]) % 4 == 0][:5]
+
+    if picked:
+        answer = {
+            "status": "error",
+            "analysis": [
+                {
+                    "line": n,
+                    "buggy_code": code.strip(),
+                    "severity": ["critical", "logic_error", "warning", "security_risk"][(seed + n) % 4],
+                    "issue": "MockIssue",
+                    "detail": f"Mock finding for line {n}.",
+                    "suggestion": code.strip(),
+                }
+                for n, code in picked
+            ],
+        }
+    else:
+        answer = {
+            "status": "success",
+            "intro": "Perfect code. 👏 Passed all strict checks.",
+            "analysis": [{"line": n, "code": code.strip(), "description": "Verified."} for n, code in lines[:5]],
+        }
+    if '"corrected_code"' in prompt and "<PROVIDE_CODE>" in prompt:
+        answer["corrected_code"] = "\n".join(code for _, code in _NUMBERED_LINE.findall(prompt))
+    return json.dumps(answer)
+
+
+def _answer_for(body: dict) -> str:
+    prompt = _prompt_text(body)
+    generation_config = body.get("generationConfig") or {}
+    wants_json = generation_config.get("responseMimeType") == "application/json" or "STRICT JSON" in prompt
+    if not wants_json:
+        return f"(mock) Here is a short answer to: {prompt[-120:].strip()}"
+
+    text = _analysis_answer(prompt)
+    if _roll(config["rate_malformed"]):
+        _count("injected_malformed")
+        text = _malform(text)
+    return text
+
+
+def _response(text: str, prompt_tokens: int, finish: bool = True) -> dict:
+    candidate = {"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}
+    if finish:
+        candidate["finishReason"] = "STOP"
+    return {
+        "candidates": [candidate],
+        "usageMetadata": {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": max(1, len(text) // 4),
+            "totalTokenCount": prompt_tokens + max(1, len(text) // 4),
+        },
+        "modelVersion": "mock",
+    }
+
+
+# --------------------------------------------------------------------
+# 🔹 v1beta ENDPOINTS
+# --------------------------------------------------------------------
+@app.post("/v1beta/models/{target:path}")
+async def generate(target: str, request: Request):
+    model, _, method = target.partition(":")
+    body = await request.json()
+    _count("requests")
+
+    error = _injected_error()
+    if error is not None:
+        return error
+    if body.get("cachedContent") and body["cachedContent"] not in cached_contents:
+        message = f"CachedContent not found: {body['cachedContent']}"
+        return JSONResponse({"error": {"code": 404, "message": message, "status": "NOT_FOUND"}}, status_code=404)
+
+    prompt_tokens = max(1, len(_prompt_text(body)) // 4)
+    latency = sample_latency(config["latency"])
+    text = _answer_for(body)
+
+    if method == "generateContent":
+        await asyncio.sleep(latency)
+        return _response(text, prompt_tokens)
+
+    if method == "streamGenerateContent":
+        _count("streams")
+        pieces = max(1, config["stream_chunks"])
+        size = max(1, -(-len(text) // pieces))
+        chunks = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+        async def stream():
+            # REST streaming = one JSON array, delivered element by element
+            yield "["
+            for i, piece in enumerate(chunks):
+                await asyncio.sleep(latency / len(chunks))
+                yield ("," if i else "") + json.dumps(_response(piece, prompt_tokens, finish=i == len(chunks) - 1))
+            yield "]"
+
+        return StreamingResponse(stream(), media_type="application/json")
+
+    return JSONResponse({"error": {"code": 404, "message": f"Unknown method {method}", "status": "NOT_FOUND"}}, status_code=404)
+
+
+@app.post("/v1beta/cachedContents")
+async def create_cached_content(request: Request):
+    body = await request.json()
+    _count("cached_contents")
+    name = f"cachedContents/mock-{hashlib.sha256(json.dumps(body, sort_keys=True).encode()).hexdigest()[:12]}"
+    cached_contents[name] = "\n".join(_parts_text(body.get("systemInstruction")))
+    return {"name": name, "model": body.get("model", ""), "displayName": body.get("displayName", "")}
+
+
+# --------------------------------------------------------------------
+# 🔹 MOCK CONTROL
+# --------------------------------------------------------------------
+@app.get("/mock/stats")
+async def mock_stats():
+    return {"config": config, "stats": stats}
+
+
+@app.post("/mock/config")
+async def mock_config(request: Request):
+    updates = await request.json()
+    for name, value in updates.items():
+        if name in config:
+            config[name] = type(config[name])(value)
+    print(f"🎛️ Mock config updated: {config}")
+    return {"config": config}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Offline mock of the Gemini generative API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default=config["latency"], help="fixed:MS | uniform:MIN,MAX | normal:MEAN,SD | lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--rate-429", type=float, default=config["rate_429"])
+    parser.add_argument("--rate-500", type=float, default=config["rate_500"])
+    parser.add_argument("--rate-malformed", type=float, default=config["rate_malformed"])
+    parser.add_argument("--retry-after", type=float, default=config["retry_after"])
+    parser.add_argument("--stream-chunks", type=int, default=config["stream_chunks"])
+    args = parser.parse_args()
+
+    config.update({
+        "latency": args.latency,
+        "rate_429": args.rate_429,
+        "rate_500": args.rate_500,
+        "rate_malformed": args.rate_malformed,
+        "retry_after": args.retry_after,
+        "stream_chunks": args.stream_chunks,
+    })
+    print(f"🧪 Mock Gemini on http://{args.host}:{args.port}  {config}")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,78 @@
+# tests/test_circuit_breaker.py
+import time
+
+from utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+def _opened(cooldown: float = 0.01) -> CircuitBreaker:
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=cooldown)
+    breaker.record_failure()
+    breaker.record_failure()
+    return breaker
+
+
+def test_opens_after_threshold_and_refuses():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=60)
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.ready() and breaker.acquire() is None
+    assert breaker.stats()["refused"] == 2
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+
+def test_ready_does_not_take_the_probe():
+    breaker = _opened()
+    time.sleep(0.02)
+    assert breaker.ready() and breaker.ready()
+    assert breaker.state == OPEN
+    assert breaker.acquire() is not None
+    assert breaker.state == HALF_OPEN
+
+
+def test_half_open_hands_out_a_single_probe():
+    breaker = _opened()
+    time.sleep(0.02)
+    probe = breaker.acquire()
+    breaker.cooldown = 60
+    assert probe is not None
+    assert breaker.acquire() is None and not breaker.ready()
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.acquire() is not None
+
+
+def test_failed_probe_reopens():
+    breaker = _opened()
+    time.sleep(0.02)
+    breaker.acquire()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.stats()["opened"] == 2
+
+
+def test_released_probe_without_verdict_goes_to_the_next_caller():
+    breaker = _opened()
+    time.sleep(0.02)
+    probe = breaker.acquire()
+    breaker.cooldown = 60
+    breaker.release(probe)
+    assert breaker.acquire() is not None
+
+
+def test_stale_ticket_does_not_free_a_newer_probe():
+    breaker = _opened()
+    time.sleep(0.02)
+    old = breaker.acquire()
+    breaker.cooldown = 60
+    breaker.release(old)
+    breaker.acquire()
+    breaker.release(old)
+    assert breaker.acquire() is None
@@ -0,0 +1,52 @@
+# tests/test_json_stream.py
+import json
+
+from utils.json_stream import AnalysisStreamParser
+
+RESPONSE = json.dumps({
+    "status": "error",
+    "analysis": [
+        {"line": 1, "issue": "SyntaxError", "detail": "brace } and \"quote\" inside a string"},
+        {"line": 3, "issue": "NameError", "detail": "[not] an {array}"},
+    ],
+    "corrected_code": "print('x')",
+})
+
+
+def _feed_in_pieces(size: int):
+    parser = AnalysisStreamParser()
+    findings = []
+    for start in range(0, len(RESPONSE), size):
+        findings += parser.feed(RESPONSE[start:start + size])
+    return parser, findings
+
+
+def test_every_chunk_size_yields_the_same_findings():
+    expected = json.loads(RESPONSE)["analysis"]
+    for size in range(1, len(RESPONSE) + 1):
+        parser, findings = _feed_in_pieces(size)
+        assert findings == expected, size
+        assert parser.status == "error"
+        assert parser.done
+        assert parser.text == RESPONSE
+
+
+def test_split_inside_a_string_does_not_end_the_item():
+    parser = AnalysisStreamParser()
+    assert parser.feed('{"analysis": [{"line": 1, "detail": "a } b') == []
+    assert parser.feed(' \\" c ] d"') == []
+    assert parser.feed("}") == [{"line": 1, "detail": 'a } b " c ] d'}]
+
+
+def test_split_across_an_escape():
+    parser = AnalysisStreamParser()
+    assert parser.feed('{"analysis": [{"detail": "x\\') == []
+    assert parser.feed('"}"}, {"line": 2}]}') == [{"detail": 'x"}'}, {"line": 2}]
+
+
+def test_findings_are_returned_once():
+    parser = AnalysisStreamParser()
+    assert parser.feed('{"analysis": [{"line": 1},') == [{"line": 1}]
+    assert parser.feed(' {"line": 2}') == [{"line": 2}]
+    assert parser.feed("]}") == []
+    assert parser.done
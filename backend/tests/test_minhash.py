@@ -0,0 +1,56 @@
+# tests/test_minhash.py
+from utils.minhash import NearDuplicateIndex, align_lines, identifier_mapping, normalized_lines
+
+OLD = "def total(items):\n    s = 0\n    for x in items:\n        s += x\n    return s\n"
+RENAMED = "def total(values):\n    acc = 0\n    for v in values:\n        acc += v\n    return acc\n"
+
+
+def _match(old: str, new: str):
+    return align_lines(normalized_lines(old, "python"), normalized_lines(new, "python"))
+
+
+def test_renaming_keeps_normalized_lines():
+    assert normalized_lines(OLD, "python") == normalized_lines(RENAMED, "python")
+
+
+def test_consistent_renaming_is_exact():
+    line_map, complete = _match(OLD, RENAMED)
+    assert complete
+    renames, exact = identifier_mapping(OLD, RENAMED, line_map, "python")
+    assert exact
+    assert renames == {"items": "values", "s": "acc", "x": "v"}
+
+
+def test_changed_literal_is_not_exact():
+    changed = OLD.replace("s = 0", "s = 1")
+    line_map, _ = _match(OLD, changed)
+    assert identifier_mapping(OLD, changed, line_map, "python")[1] is False
+
+
+def test_two_names_merged_into_one_is_not_exact():
+    merged = OLD.replace("x", "s")
+    line_map, _ = _match(OLD, merged)
+    assert identifier_mapping(OLD, merged, line_map, "python")[1] is False
+
+
+def test_index_reuses_only_provable_matches(tmp_path):
+    index = NearDuplicateIndex(tmp_path / "near.db", max_entries=10)
+    result = {"status": "success", "analysis": []}
+    index.add("v1:python", OLD, "python", result)
+
+    match = index.query("v1:python", RENAMED, "python", 0.8)
+    assert match is not None and match.result == result
+    assert match.reusable(RENAMED)
+
+    commented = RENAMED + "# TODO: overflow?\n"
+    match = index.query("v1:python", commented, "python", 0.8)
+    assert match is not None and not match.reusable(commented)
+
+    assert index.query("v2:python", RENAMED, "python", 0.8) is None
+
+
+def test_index_evicts_least_recently_used(tmp_path):
+    index = NearDuplicateIndex(tmp_path / "near.db", max_entries=2)
+    for n in range(3):
+        index.add("ns", f"x{n} = {n}\nprint(x{n} * {n})\n" * 3, "python", {"n": n})
+    assert index.stats()["entries"] == 2
@@ -0,0 +1,85 @@
+# tests/test_scheduler.py
+import asyncio
+
+from utils.scheduler import BULK, INTERACTIVE, PriorityScheduler, current_lane, normalize_lane
+
+
+def test_normalize_lane():
+    assert normalize_lane(" Bulk ") == BULK
+    assert normalize_lane(None) == INTERACTIVE
+    assert normalize_lane("anything") == INTERACTIVE
+
+
+async def _grant_order(spike_depth: int, bulk: int = 3, interactive: int = 8):
+    """Order in which queued jobs get the single slot once it is freed."""
+    scheduler = PriorityScheduler(slots=1, bulk_max_running=1, spike_depth=spike_depth)
+    await scheduler.acquire(INTERACTIVE)
+    order = []
+
+    async def job(lane, name):
+        await scheduler.acquire(lane)
+        order.append(name)
+        await asyncio.sleep(0)
+        scheduler.release(lane)
+
+    tasks = [asyncio.create_task(job(BULK, f"b{n}")) for n in range(bulk)]
+    tasks += [asyncio.create_task(job(INTERACTIVE, f"i{n}")) for n in range(interactive)]
+    await asyncio.sleep(0)
+    scheduler.release(INTERACTIVE)
+    await asyncio.gather(*tasks)
+    return order, scheduler.stats()
+
+
+def test_slots_are_shared_by_weight():
+    order, _ = asyncio.run(_grant_order(spike_depth=100))
+    assert order == ["b0", "i0", "i1", "i2", "i3", "b1", "i4", "i5", "i6", "i7", "b2"]
+
+
+def test_bulk_never_exceeds_its_cap():
+    async def scenario():
+        scheduler = PriorityScheduler(slots=4, bulk_max_running=2)
+        await scheduler.acquire(BULK)
+        await scheduler.acquire(BULK)
+        third = asyncio.create_task(scheduler.acquire(BULK))
+        await asyncio.sleep(0)
+        blocked = not third.done()
+        await scheduler.acquire(INTERACTIVE)     # a free slot is still there for interactive work
+        scheduler.release(BULK)
+        await asyncio.wait_for(third, 1)
+        return blocked, scheduler.stats()["lanes"]
+
+    blocked, lanes = asyncio.run(scenario())
+    assert blocked
+    assert lanes[BULK]["running"] == 2 and lanes[INTERACTIVE]["running"] == 1
+
+
+def test_interactive_spike_holds_bulk_back():
+    order, stats = asyncio.run(_grant_order(spike_depth=2))
+    # Bulk only runs again once fewer than two interactive calls are waiting
+    assert order == ["i0", "i1", "i2", "i3", "i4", "i5", "i6", "b0", "b1", "i7", "b2"]
+    assert stats["bulk_preemptions"] >= 1
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        scheduler = PriorityScheduler(slots=1)
+        await scheduler.acquire(INTERACTIVE)
+        waiter = asyncio.create_task(scheduler.acquire(INTERACTIVE))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        scheduler.release(INTERACTIVE)
+        return scheduler.stats()["lanes"][INTERACTIVE]
+
+    lane = asyncio.run(scenario())
+    assert lane["queued"] == 0 and lane["running"] == 0
+
+
+def test_slot_uses_the_current_lane():
+    async def scenario():
+        scheduler = PriorityScheduler(slots=2)
+        current_lane.set(BULK)
+        async with scheduler.slot():
+            return scheduler.stats()["lanes"][BULK]["running"]
+
+    assert asyncio.run(scenario()) == 1
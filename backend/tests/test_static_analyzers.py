@@ -0,0 +1,49 @@
+# tests/test_static_analyzers.py
+from utils.static_analyzers import analyze_css, analyze_html
+
+
+def test_html_quoted_attribute_may_hold_angle_brackets():
+    assert analyze_html('<input value="<x>">') == []
+    assert analyze_html("<a title='a > b' href=\"/x\">link</a>") == []
+
+
+def test_html_unterminated_tag_is_conclusive():
+    findings = analyze_html('<div class="a"\n<p>x</p></div>')
+    assert [(f["line"], f["conclusive"]) for f in findings] == [(1, True)]
+
+
+def test_html_balanced_document_is_clean():
+    assert analyze_html("<!doctype html>\n<ul><li>a<li>b</ul>\n<br><img src='x'>") == []
+
+
+def test_html_unclosed_element_is_a_warning():
+    findings = analyze_html("<div>\n<span>x</div>")
+    assert [(f["line"], f["issue"], f["conclusive"]) for f in findings] == [(2, "UnclosedTag", False)]
+
+
+def test_html_script_body_is_not_markup():
+    assert analyze_html("<script>if (a < b && c > d) {}</script>") == []
+
+
+def test_html_unclosed_comment():
+    findings = analyze_html("<p>x</p>\n<!-- never closed")
+    assert [(f["line"], f["conclusive"]) for f in findings] == [(2, True)]
+
+
+def test_css_balanced_rules_are_clean():
+    assert analyze_css("a { color: red; }\n/* } */\nb::after { content: '}'; }") == []
+
+
+def test_css_stray_closing_brace():
+    findings = analyze_css("a { color: red; }\n}")
+    assert [(f["line"], f["conclusive"]) for f in findings] == [(2, True)]
+
+
+def test_css_unclosed_block_points_at_its_opening():
+    findings = analyze_css("a {\n  color: red;\nb { color: blue; }")
+    assert [(f["line"], f["conclusive"]) for f in findings] == [(1, True)]
+
+
+def test_css_unclosed_comment():
+    findings = analyze_css("a { }\n/* open")
+    assert [(f["line"], f["detail"]) for f in findings] == [(2, "Unclosed comment '/*'.")]
@@ -0,0 +1,43 @@
+# utils/batch.py
+import io
+import os
+import zipfile
+
+# File extension -> language key used by /explain
+EXTENSION_LANGUAGES = {
+    ".c": "c", ".h": "c", ".cpp": "cpp", ".cc": "cpp", ".cxx": "cpp", ".hpp": "cpp",
+    ".java": "java", ".js": "javascript", ".mjs": "javascript", ".jsx": "javascript",
+    ".ts": "typescript", ".tsx": "typescript", ".py": "python", ".go": "go", ".rs": "rust",
+    ".r": "r", ".php": "php", ".pl": "perl", ".pm": "perl", ".rb": "ruby", ".swift": "swift",
+    ".kt": "kotlin", ".kts": "kotlin", ".dart": "dart", ".m": "matlab", ".sql": "sql",
+    ".html": "html", ".htm": "html", ".css": "css", ".ex": "elixir", ".exs": "elixir", ".cs": "csharp",
+}
+
+
+def language_for_path(path: str):
+    return EXTENSION_LANGUAGES.get(os.path.splitext(path or "")[1].lower())
+
+
+def files_from_zip(data: bytes, max_files: int, max_file_bytes: int):
+    """
+    Source files inside a zip archive as (path, code) pairs.
+    Skips directories, hidden / __MACOSX entries, unknown extensions,
+    oversized and non-UTF-8 files.
+    """
+    files = []
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        for info in archive.infolist():
+            path = info.filename
+            parts = path.split("/")
+            if info.is_dir() or "__MACOSX" in parts or any(p.startswith(".") for p in parts if p):
+                continue
+            if language_for_path(path) is None or info.file_size > max_file_bytes:
+                continue
+            try:
+                code = archive.read(info).decode("utf-8")
+            except UnicodeDecodeError:
+                continue
+            files.append((path, code))
+            if len(files) >= max_files:
+                break
+    return files
@@ -0,0 +1,151 @@
+# utils/chunker.py
+import re
+
+# Languages whose blocks are delimited by braces; the rest are indentation/keyword based.
+_BRACE_LANGUAGES = {
+    "c", "cpp", "java", "javascript", "typescript", "go", "rust", "php", "swift",
+    "kotlin", "dart", "csharp", "css", "r", "perl",
+}
+# Top-level lines that CONTINUE the previous block instead of starting a new one.
+_CONTINUATIONS = re.compile(r"^(?:else|elif|elsif|except|finally|catch|end|rescue|ensure|when|case)\b|^[)\]}]")
+_DEFINITION = {
+    "python": re.compile(r"^(?:@|def\s|async\s+def\s|class\s)"),
+    "ruby": re.compile(r"^(?:def\s|class\s|module\s)"),
+    "elixir": re.compile(r"^\s*(?:defmodule\s|def\s|defp\s)"),
+    "matlab": re.compile(r"^function\b"),
+    "sql": re.compile(r"^(?:CREATE|ALTER|INSERT|UPDATE|DELETE|SELECT|WITH|DROP)\b", re.IGNORECASE),
+    "html": re.compile(r"^\s*<(?:head|body|section|article|main|header|footer|nav|div|script|style)\b", re.IGNORECASE),
+}
+_STRINGS_AND_COMMENTS = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|//.*$')
+
+
+class Chunk:
+    def __init__(self, start: int, own_start: int, lines):
+        self.start = start            # first line (1-based) including the leading overlap
+        self.own_start = own_start    # first line this chunk is responsible for
+        self.lines = lines
+
+    @property
+    def end(self) -> int:
+        return self.start + len(self.lines) - 1
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.lines)
+
+    def in_overlap(self, line: int) -> bool:
+        return self.start <= line < self.own_start
+
+
+def _boundaries(lines, language: str):
+    """0-based indexes of lines where a new top-level function/class/statement begins."""
+    marks = [0]
+    if language in _BRACE_LANGUAGES:
+        depth = 0
+        for i, line in enumerate(lines):
+            stripped = line.strip()
+            if depth == 0 and i and stripped and not line[0].isspace() and not _CONTINUATIONS.match(stripped):
+                marks.append(i)
+            code = _STRINGS_AND_COMMENTS.sub("", line)
+            depth = max(0, depth + code.count("{") - code.count("}"))
+        return marks
+
+    definition = _DEFINITION.get(language)
+    for i, line in enumerate(lines[1:], start=1):
+        if not line.strip() or line[0].isspace() or _CONTINUATIONS.match(line):
+            continue
+        if definition is None or definition.match(line):
+            # Keep decorators glued to the definition below them
+            if i and lines[i - 1].startswith("@"):
+                continue
+            marks.append(i)
+    return marks
+
+
+def split_into_chunks(code: str, language: str, max_lines: int = 150, overlap: int = 5):
+    """
+    Splits source into chunks of at most ~max_lines at function/class-level
+    boundaries. Each chunk also carries `overlap` lines of the previous one as
+    context; findings in that overlap belong to the previous chunk.
+    """
+    lines = code.splitlines()
+    if len(lines) <= max_lines:
+        return [Chunk(1, 1, lines)]
+
+    marks = _boundaries(lines, (language or "").lower()) + [len(lines)]
+    spans = []
+    begin = 0
+    for prev, mark in zip(marks, marks[1:]):
+        if mark - begin > max_lines and prev > begin:
+            spans.append((begin, prev))
+            begin = prev
+        # A single block bigger than a chunk is cut hard
+        while mark - begin > max_lines:
+            spans.append((begin, begin + max_lines))
+            begin += max_lines
+    spans.append((begin, len(lines)))
+
+    chunks = []
+    for begin, end in spans:
+        if begin >= end:
+            continue
+        context = max(0, begin - overlap)
+        chunks.append(Chunk(context + 1, begin + 1, lines[context:end]))
+    return chunks
+
+
+def remap_line(line, chunk: Chunk) -> int:
+    """Models sometimes number from 1 instead of the prefix; map those back to file lines."""
+    if not isinstance(line, int):
+        return line
+    if chunk.start <= line <= chunk.end:
+        return line
+    if 1 <= line <= len(chunk.lines):
+        return line + chunk.start - 1
+    return line
+
+
+def _finding_key(item: dict):
+    text = item.get("issue") or item.get("description") or item.get("detail") or ""
+    return (item.get("line"), re.sub(r"\W+", " ", str(text)).strip().lower())
+
+
+def merge_chunk_results(chunks, results):
+    """
+    Merges per-chunk analysis JSON into one response: remaps line numbers,
+    drops findings in the overlap (the previous chunk reports those) and
+    duplicates, then orders everything by line. When any chunk found errors
+    only issue-shaped findings are kept, as in merge_incremental.
+    """
+    findings = []
+    seen = set()
+    intros = []
+    statuses = []
+    for chunk, result in zip(chunks, results):
+        if not isinstance(result, dict):
+            continue
+        statuses.append(result.get("status"))
+        if result.get("intro"):
+            intros.append((result.get("status"), result["intro"]))
+        for item in result.get("analysis") or []:
+            if not isinstance(item, dict):
+                continue
+            item = dict(item, line=remap_line(item.get("line"), chunk))
+            if isinstance(item["line"], int) and chunk.in_overlap(item["line"]):
+                continue
+            key = _finding_key(item)
+            if key in seen:
+                continue
+            seen.add(key)
+            findings.append(item)
+
+    findings.sort(key=lambda item: item["line"] if isinstance(item.get("line"), int) else 0)
+    status = "error" if "error" in statuses else "success"
+    if status == "error":
+        # Success-shaped items (code/description) have nothing for the error view to show
+        findings = [item for item in findings if item.get("issue")]
+    merged = {"status": status, "analysis": findings}
+    intro = next((text for chunk_status, text in intros if chunk_status == status), None)
+    if intro:
+        merged["intro"] = intro
+    return merged
@@ -0,0 +1,102 @@
+# utils/circuit_breaker.py
+import threading
+import time
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitBreaker:
+    """
+    Tracks whether the remote models are worth calling at all.
+      closed    -> every call goes through; `failure_threshold` failed chains
+                   in a row open the breaker
+      open      -> calls are refused until `cooldown` seconds have passed
+      half_open -> ONE probe goes through; its success closes the breaker,
+                   its failure opens it again (a probe that never reports
+                   back is replaced after another cooldown)
+    `ready()` only looks; `acquire()` is taken right before the upstream call
+    and its ticket goes back through `release()` however the call ends, so a
+    probe that ended without a verdict is handed to the next caller at once.
+    """
+
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 30.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_at = 0.0
+        self._probe = 0         # number of the latest probe handed out
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.refused = 0
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def _admits(self, now: float) -> bool:
+        if self._state == CLOSED:
+            return True
+        if self._state == OPEN:
+            return now - self._opened_at >= self.cooldown
+        return now - self._probe_at >= self.cooldown
+
+    def ready(self) -> bool:
+        """Would a call be let through right now? Takes nothing."""
+        with self._lock:
+            if self._admits(time.monotonic()):
+                return True
+            self.refused += 1
+            return False
+
+    def acquire(self):
+        """
+        Admission for a call about to go upstream: None when refused, else a
+        ticket for `release()`. In half-open state this is the single probe.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not self._admits(now):
+                self.refused += 1
+                return None
+            if self._state == CLOSED:
+                return CLOSED
+            self._state = HALF_OPEN
+            self._probe += 1
+            self._probe_at = now
+            return self._probe
+
+    def allow(self) -> bool:
+        return self.acquire() is not None
+
+    def release(self, ticket):
+        """The call behind `ticket` is over; an unanswered probe frees its slot."""
+        with self._lock:
+            if self._state == HALF_OPEN and ticket == self._probe:
+                self._probe_at = float("-inf")
+
+    def record_success(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self.opened += 1
+                    print(f"🔌 CIRCUIT OPEN after {self._failures} failed chains; remote calls paused for {self.cooldown}s")
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "state": self._state,
+            "consecutive_failures": self._failures,
+            "opened": self.opened,
+            "refused": self.refused,
+            "failure_threshold": self.failure_threshold,
+            "cooldown_seconds": self.cooldown,
+        }
@@ -0,0 +1,142 @@
+# utils/client_registry.py
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+# Keep the per-key gRPC channel (one HTTP/2 connection that multiplexes every
+# concurrent call) warm between requests instead of letting it go idle.
+CHANNEL_OPTIONS = [
+    ("grpc.max_send_message_length", -1),
+    ("grpc.max_receive_message_length", -1),
+    ("grpc.keepalive_time_ms", 30_000),
+    ("grpc.keepalive_timeout_ms", 10_000),
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.max_pings_without_data", 0),
+]
+
+
+def _build_client(api_key: str, client_class, grpc_transport, rest_transport):
+    from google.auth import api_key as ga_api_key
+
+    endpoint = os.getenv("GEMINI_API_ENDPOINT", "").strip().rstrip("/")
+    if endpoint:
+        scheme, _, host = endpoint.rpartition("://")
+        transport = rest_transport(
+            host=host,
+            credentials=ga_api_key.Credentials(api_key),
+            url_scheme=scheme or "https",
+        )
+        return client_class(transport=transport)
+
+    channel = grpc_transport.create_channel(
+        credentials=ga_api_key.Credentials(api_key),
+        options=CHANNEL_OPTIONS,
+    )
+    return client_class(transport=grpc_transport(channel=channel))
+
+
+def build_service_client(api_key: str):
+    """
+    A GenerativeService client bound to ONE key over a long-lived keepalive channel.
+    When GEMINI_API_ENDPOINT is set (e.g. http://localhost:8765 for mock_gemini.py)
+    the REST transport is pointed at that endpoint instead.
+    """
+    from google.ai import generativelanguage as glm
+    from google.ai.generativelanguage_v1beta.services.generative_service.transports import (
+        GenerativeServiceGrpcTransport,
+        GenerativeServiceRestTransport,
+    )
+
+    return _build_client(api_key, glm.GenerativeServiceClient, GenerativeServiceGrpcTransport, GenerativeServiceRestTransport)
+
+
+def build_cache_client(api_key: str):
+    """A CacheService client for ONE key (context caches belong to the key that created them)."""
+    from google.ai import generativelanguage as glm
+    from google.ai.generativelanguage_v1beta.services.cache_service.transports import (
+        CacheServiceGrpcTransport,
+        CacheServiceRestTransport,
+    )
+
+    return _build_client(api_key, glm.CacheServiceClient, CacheServiceGrpcTransport, CacheServiceRestTransport)
+
+
+class BoundModel:
+    """
+    One model on ONE key's service client. Requests are built and sent through
+    the public GAPIC surface (protos + GenerativeServiceClient) and wrapped in
+    the SDK's public response type, so no GenerativeModel internals are touched.
+    """
+
+    def __init__(self, client, model_name: str, system_instruction: str = None, cached_content: str = None):
+        self.client = client
+        self.model_name = model_name if model_name.startswith(("models/", "tunedModels/")) else f"models/{model_name}"
+        self.system_instruction = system_instruction
+        self.cached_content = cached_content
+
+    def generate_content(self, prompt: str, stream: bool = False, generation_config: dict = None, request_options: dict = None):
+        from google.generativeai import protos
+        from google.generativeai.types import generation_types
+
+        request = protos.GenerateContentRequest(
+            model=self.model_name,
+            contents=[protos.Content(role="user", parts=[protos.Part(text=prompt)])],
+            generation_config=generation_types.to_generation_config_dict(generation_config),
+            # The API takes a cached context OR a system instruction, never both
+            system_instruction=protos.Content(parts=[protos.Part(text=self.system_instruction)])
+            if self.system_instruction and not self.cached_content else None,
+            cached_content=self.cached_content,
+        )
+        options = request_options or {}
+        if stream:
+            with generation_types.rewrite_stream_error():
+                iterator = self.client.stream_generate_content(request, **options)
+            return generation_types.GenerateContentResponse.from_iterator(iterator)
+        return generation_types.GenerateContentResponse.from_response(self.client.generate_content(request, **options))
+
+
+class ModelClientRegistry:
+    """
+    Process-wide LRU of bound models, one per (api key, model, cached context
+    or system instruction), so no per-attempt setup or TLS handshake happens:
+    they all share their key's service client. At most `max_entries` are kept
+    and the entries of a retired cached context are dropped with it.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, model_name: str, system_instruction: str = None, cached_content: str = None):
+        """A model for `key`; a cached context replaces the system instruction (the API allows only one)."""
+        if cached_content:
+            context = ("cache", cached_content)
+        elif system_instruction:
+            context = ("system", hashlib.sha256(system_instruction.encode("utf-8")).hexdigest())
+        else:
+            context = None
+        slot = (key.id, model_name, context)
+        with self._lock:
+            model = self._models.get(slot)
+            if model is None:
+                model = self._models[slot] = BoundModel(
+                    key.client, model_name,
+                    system_instruction=None if cached_content else system_instruction,
+                    cached_content=cached_content,
+                )
+                while len(self._models) > self.max_entries:
+                    self._models.popitem(last=False)
+            else:
+                self._models.move_to_end(slot)
+        return model
+
+    def drop_cached_content(self, cached_content: str):
+        """Forgets the models bound to a cached context that is no longer handed out."""
+        with self._lock:
+            for slot in [s for s in self._models if s[2] == ("cache", cached_content)]:
+                del self._models[slot]
+
+    def __len__(self):
+        return len(self._models)
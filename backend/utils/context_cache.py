@@ -0,0 +1,183 @@
+# utils/context_cache.py
+import hashlib
+import re
+import threading
+import time
+
+from utils.token_estimator import estimate_tokens
+
+# --------------------------------------------------------------------
+# 🔹 SYSTEM INSTRUCTION SUPPORT
+# --------------------------------------------------------------------
+# Gemma rejects system instructions ("Developer instruction is not enabled");
+# other models that do are learned from their first 400.
+_NO_SYSTEM_PREFIXES = ("gemma-", "models/gemma-")
+_learned_no_system = set()
+
+
+def supports_system_instruction(model_name: str) -> bool:
+    return model_name not in _learned_no_system and not model_name.startswith(_NO_SYSTEM_PREFIXES)
+
+
+def mark_no_system_instruction(model_name: str):
+    _learned_no_system.add(model_name)
+
+
+def is_system_instruction_error(exc: Exception) -> bool:
+    text = str(exc).lower()
+    return "instruction" in text and ("not enabled" in text or "not supported" in text or "invalid_argument" in text or text.startswith("400"))
+
+
+def is_cache_error(exc: Exception) -> bool:
+    """
+    A call that failed because its cached context is gone (expired, deleted,
+    other key). Only errors that name the cached content count: a plain
+    403/404 is a real auth/permission/model failure and must surface.
+    """
+    text = str(exc).lower()
+    return "cachedcontent" in text or "cached content" in text or "cached_content" in text
+
+
+# --------------------------------------------------------------------
+# 🔹 EXPLICIT CONTEXT CACHE (the static preamble, per key and model)
+# --------------------------------------------------------------------
+# Smallest context each model family will cache; first matching pattern wins,
+# models that match nothing (Gemma, TTS, ...) are never cached.
+CACHE_MIN_TOKENS = [
+    (r"gemini-(2\.5|3|3\.1)-flash", 1_024),
+    (r"gemini-(flash|flash-lite)-latest", 1_024),
+    (r"gemini-(2\.5|3|3\.1)-pro", 4_096),
+    (r"gemini-pro-latest", 4_096),
+    (r"gemini-2\.0-flash", 4_096),
+    (r"gemini-1\.5-(pro|flash)-\d{3}$", 32_768),
+]
+_COMPILED_MIN = [(re.compile(pattern), tokens) for pattern, tokens in CACHE_MIN_TOKENS]
+
+
+def cache_min_tokens(model_name: str):
+    name = model_name.split("/", 1)[-1]
+    for pattern, tokens in _COMPILED_MIN:
+        if pattern.match(name):
+            return tokens
+    return None
+
+
+class ContextCache:
+    """
+    Registers a system instruction as a provider-side cached context once per
+    (key, model, text) and hands out its name until shortly before it expires.
+    Creation and refresh are network calls, so they never run on the request
+    path: a miss starts a background creator (one per slot) and that call
+    keeps the plain system instruction; a cache close to expiry is still used
+    while its successor is created. A key/model pair that refuses caching is
+    left alone for `retry_after` seconds. `on_retire(name)` is called when a
+    cache name stops being handed out (replaced or invalidated). All state is
+    read and written under `_lock`: creators run on their own threads.
+    """
+
+    def __init__(self, ttl_seconds: float = 3600, retry_after: float = 3600, create_timeout: float = 10.0,
+                 on_retire=None):
+        self.on_retire = on_retire
+        self.ttl_seconds = ttl_seconds
+        self.retry_after = retry_after
+        self.create_timeout = create_timeout
+        self._entries = {}          # (key id, model, digest) -> (cache name, refresh at, expires at)
+        self._refused = {}          # (key id, model) -> retry at
+        self._creating = set()      # slots with a creator running
+        self._lock = threading.Lock()
+        self._stats = {"created": 0, "hits": 0, "misses": 0, "failures": 0, "invalidated": 0}
+
+    def _slot(self, key, model_name: str, system_text: str):
+        return (key.id, model_name, hashlib.sha256(system_text.encode("utf-8")).hexdigest())
+
+    def _cacheable(self, model_name: str, system_text: str) -> bool:
+        minimum = cache_min_tokens(model_name)
+        return minimum is not None and estimate_tokens(system_text) >= minimum
+
+    def lookup(self, key, model_name: str, system_text: str):
+        """The live cached-content name for this preamble, or None to send it inline (never blocks)."""
+        if not system_text or not self._cacheable(model_name, system_text):
+            return None
+        slot = self._slot(key, model_name, system_text)
+        now = time.time()
+        with self._lock:
+            if self._refused.get((key.id, model_name), 0) > now:
+                return None
+            entry = self._entries.get(slot)
+            start = (entry is None or entry[1] <= now) and slot not in self._creating
+            if start:
+                self._creating.add(slot)
+            if entry is not None and entry[2] > now:
+                self._stats["hits"] += 1
+                name = entry[0]
+            else:
+                self._stats["misses"] += 1
+                name = None
+        if start:
+            self._start_creator(slot, key, model_name, system_text)
+        return name
+
+    def _start_creator(self, slot, key, model_name: str, system_text: str):
+        threading.Thread(
+            target=self._create_in_background, args=(slot, key, model_name, system_text),
+            name="context-cache", daemon=True,
+        ).start()
+
+    def _create_in_background(self, slot, key, model_name: str, system_text: str):
+        try:
+            name = self._create(key, model_name, system_text)
+        except Exception as e:
+            with self._lock:
+                self._creating.discard(slot)
+                self._refused[(key.id, model_name)] = time.time() + self.retry_after
+                self._stats["failures"] += 1
+            print(f"🗃️ Context cache unavailable for {model_name} on {key.id}: {repr(e)}")
+            return
+        created = time.time()
+        with self._lock:
+            self._creating.discard(slot)
+            previous = self._entries.get(slot)
+            # Replace it a few minutes early; calls stop using it a minute before it expires
+            self._entries[slot] = (name, created + max(1.0, self.ttl_seconds - 300), created + max(1.0, self.ttl_seconds - 60))
+            self._stats["created"] += 1
+        print(f"🗃️ Context cache created for {model_name} on {key.id}: {name}")
+        if previous is not None:
+            self._retire(previous[0])
+
+    def _retire(self, name: str):
+        if self.on_retire is not None:
+            self.on_retire(name)
+
+    def _create(self, key, model_name: str, system_text: str) -> str:
+        from google.ai import generativelanguage as glm
+
+        name = model_name if model_name.startswith("models/") else f"models/{model_name}"
+        cached = key.cache_client.create_cached_content(
+            cached_content=glm.CachedContent(
+                model=name,
+                system_instruction=glm.Content(parts=[glm.Part(text=system_text)]),
+                ttl={"seconds": int(self.ttl_seconds)},
+                display_name="codepercept-preamble",
+            ),
+            timeout=self.create_timeout,
+        )
+        return cached.name
+
+    def invalidate(self, key, model_name: str, system_text: str):
+        """Drops a cache the provider no longer accepts and stops using caches for the pair for a while."""
+        with self._lock:
+            entry = self._entries.pop(self._slot(key, model_name, system_text), None)
+            self._refused[(key.id, model_name)] = time.time() + self.retry_after
+            self._stats["invalidated"] += 1
+        if entry is not None:
+            self._retire(entry[0])
+
+    def stats(self) -> dict:
+        now = time.time()
+        with self._lock:
+            return {
+                "entries": sum(1 for _, _, expires_at in self._entries.values() if expires_at > now),
+                "creating": len(self._creating),
+                "refused_pairs": sum(1 for until in self._refused.values() if until > now),
+                **self._stats,
+            }
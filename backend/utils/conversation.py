@@ -0,0 +1,169 @@
+# utils/conversation.py
+import sqlite3
+import threading
+import time
+
+from utils.token_estimator import estimate_tokens
+
+SUMMARY_INSTRUCTIONS = (
+    "Summarize this conversation between a user and an AI coding assistant so it can replace the "
+    "original turns as context for later questions. Keep names, code identifiers, languages, decisions "
+    "and open questions; drop pleasantries. Plain text, at most {words} words."
+)
+_KEEP_SUMMARIES = 3
+
+
+def clip(text: str, max_tokens: int) -> str:
+    """`text` shortened to roughly `max_tokens` (the cut is marked)."""
+    text = text or ""
+    tokens = estimate_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    return text[:max(1, int(len(text) * max_tokens / tokens) - 2)] + " …"
+
+
+class ChatContext:
+    def __init__(self, summary: str, turns):
+        self.summary = summary
+        self.turns = turns          # [(user, assistant)], oldest first
+
+    def render(self) -> str:
+        parts = []
+        if self.summary:
+            parts.append(f"Summary of the earlier conversation:\n{self.summary}")
+        if self.turns:
+            lines = "\n".join(f"User: {user}\nAssistant: {ai}" for user, ai in self.turns)
+            parts.append(f"Recent conversation:\n{lines}")
+        return "\n\n".join(parts)
+
+
+class FoldPlan:
+    """Turns (ids up to `upto_id`) to merge into the previous summary."""
+
+    def __init__(self, upto_id: int, previous: str, turns, words: int):
+        self.upto_id = upto_id
+        self.previous = previous
+        self.turns = turns
+        self.words = words
+
+    def prompt(self) -> str:
+        sections = [SUMMARY_INSTRUCTIONS.format(words=self.words)]
+        if self.previous:
+            sections.append(f"Summary so far:\n{self.previous}")
+        sections.append("New turns:\n" + "\n".join(f"User: {user}\nAssistant: {ai}" for user, ai in self.turns))
+        return "\n\n".join(sections)
+
+
+class ConversationMemory:
+    """
+    Token-budgeted history for /assistant, read from the `ai_chat` turns of one
+    conversation. The newest turns are kept verbatim within `turn_budget`
+    tokens (each clipped to `max_turn_tokens`); everything older is covered by
+    a rolling summary cached in `chat_summaries`, so the history part of a
+    prompt stays under turn_budget + summary_budget however long the chat runs.
+    Summaries are folded forward in steps: once the unsummarized turns overflow
+    the budget, all but the newest half-budget are merged into the summary.
+    """
+
+    def __init__(self, db_path, turn_budget: int = 3000, summary_budget: int = 600,
+                 max_turn_tokens: int = 1000, fetch_limit: int = 200):
+        self.turn_budget = turn_budget
+        self.summary_budget = summary_budget
+        self.max_turn_tokens = min(max_turn_tokens, turn_budget)
+        self.fetch_limit = fetch_limit
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.executescript("""
+        CREATE TABLE IF NOT EXISTS chat_summaries (
+            conversation_id TEXT,
+            upto_id INTEGER,
+            summary TEXT,
+            created_at REAL,
+            PRIMARY KEY (conversation_id, upto_id)
+        );
+        """)
+        self._conn.commit()
+
+    def _summary(self, conversation_id: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT upto_id, summary FROM chat_summaries WHERE conversation_id = ? ORDER BY upto_id DESC LIMIT 1",
+                (conversation_id,),
+            ).fetchone()
+        return row if row is not None else (0, "")
+
+    def _turns_after(self, conversation_id: str, after_id: int):
+        """Unsummarized turns, newest first, each clipped: [(id, user, assistant, tokens)]."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, user_message, ai_response FROM ai_chat "
+                "WHERE conversation_id = ? AND id > ? ORDER BY id DESC LIMIT ?",
+                (conversation_id, after_id, self.fetch_limit),
+            ).fetchall()
+        half = self.max_turn_tokens // 2
+        turns = []
+        for turn_id, user, ai in rows:
+            user, ai = clip(user, half), clip(ai, half)
+            turns.append((turn_id, user, ai, estimate_tokens(user) + estimate_tokens(ai)))
+        return turns
+
+    def _newest_within(self, turns, budget: int) -> int:
+        """How many of the newest-first `turns` fit in `budget` tokens."""
+        used = 0
+        for count, turn in enumerate(turns):
+            used += turn[3]
+            if used > budget:
+                return count
+        return len(turns)
+
+    def context(self, conversation_id: str) -> ChatContext:
+        upto_id, summary = self._summary(conversation_id)
+        turns = self._turns_after(conversation_id, upto_id)
+        kept = turns[:self._newest_within(turns, self.turn_budget)]
+        return ChatContext(summary, [(user, ai) for _, user, ai, _ in reversed(kept)])
+
+    def fold_plan(self, conversation_id: str):
+        """The next summary step, or None while the unsummarized turns still fit the budget."""
+        upto_id, summary = self._summary(conversation_id)
+        turns = self._turns_after(conversation_id, upto_id)
+        if self._newest_within(turns, self.turn_budget) == len(turns):
+            return None
+        keep = max(1, self._newest_within(turns, self.turn_budget // 2))
+        fold = list(reversed(turns[keep:]))     # oldest first
+        if not fold:
+            return None
+        # Bound one summary call; a long backlog is folded over several steps
+        folded, used = [], 0
+        for turn in fold:
+            if folded and used + turn[3] > 4 * self.turn_budget:
+                break
+            folded.append(turn)
+            used += turn[3]
+        words = max(50, int(self.summary_budget * 0.6))
+        return FoldPlan(folded[-1][0], summary, [(user, ai) for _, user, ai, _ in folded], words)
+
+    def store_summary(self, conversation_id: str, upto_id: int, summary: str):
+        summary = clip((summary or "").strip(), self.summary_budget)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO chat_summaries (conversation_id, upto_id, summary, created_at) VALUES (?, ?, ?, ?)",
+                (conversation_id, upto_id, summary, time.time()),
+            )
+            self._conn.execute(
+                "DELETE FROM chat_summaries WHERE conversation_id = ? AND upto_id NOT IN "
+                "(SELECT upto_id FROM chat_summaries WHERE conversation_id = ? ORDER BY upto_id DESC LIMIT ?)",
+                (conversation_id, conversation_id, _KEEP_SUMMARIES),
+            )
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            conversations, summaries = self._conn.execute(
+                "SELECT COUNT(DISTINCT conversation_id), COUNT(*) FROM chat_summaries"
+            ).fetchone()
+        return {
+            "summarized_conversations": conversations,
+            "summaries": summaries,
+            "turn_budget": self.turn_budget,
+            "summary_budget": self.summary_budget,
+        }
@@ -0,0 +1,35 @@
+# utils/deadline.py
+import time
+
+# Never hand a model less than this, and never give one attempt the whole budget:
+# the first call gets 1/ATTEMPT_SPREAD of what is left so failover still has room.
+MIN_ATTEMPT_TIMEOUT = 3.0
+ATTEMPT_SPREAD = 3
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request budget ran out. `partial` holds the best result salvaged so far (or None)."""
+
+    def __init__(self, message: str, partial=None):
+        super().__init__(message)
+        self.partial = partial
+
+
+class Deadline:
+    """An absolute, monotonic end time for one request, shared by every model attempt."""
+
+    def __init__(self, seconds: float):
+        self.budget = float(seconds)
+        self.expires_at = time.monotonic() + self.budget
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0.0
+
+    def attempt_timeout(self, attempts_left: int) -> float:
+        """Per-call timeout: a share of the remaining budget across the attempts still possible."""
+        remaining = self.remaining()
+        share = remaining / max(1, min(attempts_left, ATTEMPT_SPREAD))
+        return min(remaining, max(MIN_ATTEMPT_TIMEOUT, share))
@@ -0,0 +1,121 @@
+# utils/incremental.py
+import difflib
+import json
+import sqlite3
+import threading
+import time
+
+from utils.chunker import Chunk
+
+
+class ReanalysisPlan:
+    """
+    Line diff between the last analysed code and the new code.
+    `regions` are the (start, end) line ranges of the NEW code, 1-based and
+    inclusive, that must go back to the model (changes plus context).
+    """
+
+    def __init__(self, old_code: str, new_code: str, context: int = 3):
+        self.old_lines = old_code.splitlines()
+        self.new_lines = new_code.splitlines()
+        matcher = difflib.SequenceMatcher(None, self.old_lines, self.new_lines, autojunk=False)
+        self.opcodes = matcher.get_opcodes()
+
+        regions = []
+        for tag, _, _, j1, j2 in self.opcodes:
+            if tag == "equal":
+                continue
+            # A pure deletion still dirties the lines around where it happened
+            start = max(1, j1 + 1 - context)
+            end = min(len(self.new_lines), max(j2, j1 + 1) + context)
+            if start > end:
+                continue
+            if regions and start <= regions[-1][1] + 1:
+                regions[-1] = (regions[-1][0], max(regions[-1][1], end))
+            else:
+                regions.append((start, end))
+        self.regions = regions
+
+    @property
+    def changed_lines(self) -> int:
+        return sum(end - start + 1 for start, end in self.regions)
+
+    def chunks(self):
+        return [Chunk(start, start, self.new_lines[start - 1:end]) for start, end in self.regions]
+
+    def is_dirty(self, line: int) -> bool:
+        return any(start <= line <= end for start, end in self.regions)
+
+    def new_line_for(self, old_line: int):
+        """Where an unchanged old line now lives, or None when it was edited or removed."""
+        for tag, i1, i2, j1, _ in self.opcodes:
+            if tag == "equal" and i1 < old_line <= i2:
+                return old_line - i1 + j1
+        return None
+
+    def carry_over(self, findings):
+        """Previous findings for untouched regions, with their line numbers shifted."""
+        carried = []
+        for item in findings or []:
+            if not isinstance(item, dict) or not isinstance(item.get("line"), int):
+                continue
+            line = self.new_line_for(item["line"])
+            if line is None or self.is_dirty(line):
+                continue
+            carried.append(dict(item, line=line))
+        return carried
+
+
+def merge_incremental(carried, fresh: dict, previous: dict = None):
+    """Carried-over findings + fresh hunk findings, in the normal response shape."""
+    items = sorted(carried + list(fresh.get("analysis") or []), key=lambda item: item.get("line") or 0)
+    issues = [item for item in items if item.get("issue")]
+    if issues:
+        return {"status": "error", "analysis": issues}
+    merged = {"status": "success", "analysis": items}
+    intro = fresh.get("intro") or (previous or {}).get("intro")
+    if intro:
+        merged["intro"] = intro
+    return merged
+
+
+class AnalysisSnapshots:
+    """
+    Last analysed code + result per editor session, stored in SQLite so an
+    edit loop can be re-analysed hunk by hunk. Old sessions expire after `ttl_seconds`.
+    """
+
+    def __init__(self, db_path, ttl_seconds: float = 86400):
+        self.ttl = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.executescript("""
+        CREATE TABLE IF NOT EXISTS analysis_snapshots (
+            session_id TEXT PRIMARY KEY,
+            language TEXT,
+            code TEXT,
+            result TEXT,
+            updated_at REAL
+        );
+        """)
+        self._conn.commit()
+
+    def get(self, session_id: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT language, code, result, updated_at FROM analysis_snapshots WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+        if row is None or time.time() - row[3] > self.ttl:
+            return None
+        return {"language": row[0], "code": row[1], "result": json.loads(row[2])}
+
+    def put(self, session_id: str, language: str, code: str, result: dict):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO analysis_snapshots (session_id, language, code, result, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (session_id, language, code, json.dumps(result), now),
+            )
+            self._conn.execute("DELETE FROM analysis_snapshots WHERE updated_at < ?", (now - self.ttl,))
+            self._conn.commit()
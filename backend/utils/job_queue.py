@@ -0,0 +1,268 @@
+# utils/job_queue.py
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+JOB_STATES = ("queued", "running", "done", "failed")
+
+
+class JobQueue:
+    """
+    Persistent job queue in SQLite, safe to share between worker processes.
+    A claimed job carries its owner and a lease that the owner's heartbeat
+    keeps extending; only a job whose lease ran out (its process died) is
+    taken over by someone else, so a restart never re-runs live work.
+    """
+
+    def __init__(self, db_path, lease_seconds: float = 60.0):
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.executescript("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT,
+            payload TEXT,
+            status TEXT,
+            attempts INTEGER DEFAULT 0,
+            max_attempts INTEGER,
+            result TEXT,
+            error TEXT,
+            run_after REAL,
+            created_at REAL,
+            updated_at REAL
+        );
+        CREATE INDEX IF NOT EXISTS idx_jobs_status_run_after ON jobs (status, run_after);
+        """)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "owner" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+        if "lease_until" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN lease_until REAL")
+        self._conn.commit()
+
+    def submit(self, kind: str, payload: dict, max_attempts: int = 3) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, payload, status, max_attempts, run_after, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), max_attempts, now, now, now),
+            )
+            self._conn.commit()
+        return job_id
+
+    def claim(self):
+        """
+        Atomically takes the oldest runnable job (queued, or running under an
+        expired lease) for this owner and returns it (or None). The claim is a
+        conditional UPDATE, so two processes never get the same job.
+        """
+        with self._lock:
+            for _ in range(5):
+                now = time.time()
+                row = self._conn.execute(
+                    "SELECT id, kind, payload, attempts FROM jobs "
+                    "WHERE (status = 'queued' AND run_after <= ?) OR (status = 'running' AND COALESCE(lease_until, 0) < ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (now, now),
+                ).fetchone()
+                if row is None:
+                    return None
+                claimed = self._conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, owner = ?, lease_until = ?, updated_at = ? "
+                    "WHERE id = ? AND attempts = ? AND "
+                    "((status = 'queued' AND run_after <= ?) OR (status = 'running' AND COALESCE(lease_until, 0) < ?))",
+                    (self.owner, now + self.lease_seconds, now, row[0], row[3], now, now),
+                ).rowcount
+                self._conn.commit()
+                if claimed:
+                    return {"id": row[0], "kind": row[1], "payload": json.loads(row[2]), "attempts": row[3] + 1}
+        return None
+
+    def heartbeat(self) -> int:
+        """Extends the lease of every job this owner is running."""
+        with self._lock:
+            count = self._conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE status = 'running' AND owner = ?",
+                (time.time() + self.lease_seconds, self.owner),
+            ).rowcount
+            self._conn.commit()
+        return count
+
+    def complete(self, job_id: str, result):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'done', result = ?, error = NULL, lease_until = NULL, updated_at = ? "
+                "WHERE id = ? AND owner = ?",
+                (json.dumps(result), time.time(), job_id, self.owner),
+            )
+            self._conn.commit()
+
+    def fail(self, job_id: str, error: str, retry_in: float = None):
+        """Re-queues the job after `retry_in` seconds, or marks it failed for good."""
+        now = time.time()
+        with self._lock:
+            if retry_in is None:
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, lease_until = NULL, updated_at = ? WHERE id = ? AND owner = ?",
+                    (error, now, job_id, self.owner),
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'queued', error = ?, run_after = ?, lease_until = NULL, updated_at = ? "
+                    "WHERE id = ? AND owner = ?",
+                    (error, now + retry_in, now, job_id, self.owner),
+                )
+            self._conn.commit()
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, kind, status, attempts, max_attempts, result, error, created_at, updated_at FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": row[0],
+            "kind": row[1],
+            "status": row[2],
+            "attempts": row[3],
+            "max_attempts": row[4],
+            "result": json.loads(row[5]) if row[5] else None,
+            "error": row[6],
+            "created_at": row[7],
+            "updated_at": row[8],
+        }
+
+    def reset_running(self) -> int:
+        """
+        Jobs left `running` under an expired lease (their process is gone) go
+        back to the queue; jobs another live process holds are left alone.
+        """
+        now = time.time()
+        with self._lock:
+            count = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', run_after = ?, owner = NULL, lease_until = NULL "
+                "WHERE status = 'running' AND COALESCE(lease_until, 0) < ?",
+                (now, now),
+            ).rowcount
+            self._conn.commit()
+        return count
+
+    def release_owned(self) -> int:
+        """On shutdown: this owner's running jobs go straight back to the queue."""
+        with self._lock:
+            count = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', run_after = ?, owner = NULL, lease_until = NULL "
+                "WHERE status = 'running' AND owner = ?",
+                (time.time(), self.owner),
+            ).rowcount
+            self._conn.commit()
+        return count
+
+    def purge(self, retention_seconds: float) -> int:
+        """Drops finished jobs (done / failed) older than the retention window."""
+        with self._lock:
+            count = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                (time.time() - retention_seconds,),
+            ).rowcount
+            self._conn.commit()
+        return count
+
+    def stats(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {state: 0 for state in JOB_STATES}
+        counts.update(dict(rows))
+        return counts
+
+
+class JobWorkers:
+    """
+    Fixed-size pool of asyncio workers draining a JobQueue.
+    `handler(kind, payload)` is awaited for every job; an exception is retried
+    with exponential backoff until the job's max_attempts is reached.
+    """
+
+    def __init__(self, queue: JobQueue, handler, size: int = 2, backoff_seconds: float = 5.0,
+                 retention_seconds: float = 86400, poll_interval: float = 1.0):
+        self.queue = queue
+        self.handler = handler
+        self.size = size
+        self.backoff = backoff_seconds
+        self.retention = retention_seconds
+        self.poll_interval = poll_interval
+        self._tasks = []
+        self._wakeup = None
+        self._last_purge = 0.0
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run(i)) for i in range(self.size)]
+        self._tasks.append(asyncio.create_task(self._heartbeat()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        released = await asyncio.to_thread(self.queue.release_owned)
+        if released:
+            print(f"🧵 Released {released} unfinished jobs back to the queue.")
+
+    async def _heartbeat(self):
+        """Keeps this process's leases alive while its jobs run."""
+        while True:
+            await asyncio.sleep(max(1.0, self.queue.lease_seconds / 3))
+            await asyncio.to_thread(self.queue.heartbeat)
+
+    def notify(self):
+        """Wakes idle workers right away instead of at the next poll."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _idle(self):
+        if time.time() - self._last_purge > 60:
+            self._last_purge = time.time()
+            await asyncio.to_thread(self.queue.purge, self.retention)
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self, worker_id: int):
+        while True:
+            job = await asyncio.to_thread(self.queue.claim)
+            if job is None:
+                await self._idle()
+                continue
+
+            print(f"🧵 JOB {job['id'][:8]} ({job['kind']}) attempt {job['attempts']} on worker {worker_id}")
+            try:
+                result = await self.handler(job["kind"], job["payload"])
+            except asyncio.CancelledError:
+                # Shutting down mid-job: stop() releases it back to the queue
+                raise
+            except Exception as e:
+                current = await asyncio.to_thread(self.queue.get, job["id"])
+                if current and job["attempts"] < current["max_attempts"]:
+                    delay = self.backoff * 2 ** (job["attempts"] - 1)
+                    print(f"⚠️ JOB {job['id'][:8]} FAILED. Retrying in {delay:g}s. REASON: {repr(e)}")
+                    await asyncio.to_thread(self.queue.fail, job["id"], str(e), delay)
+                else:
+                    print(f"❌ JOB {job['id'][:8]} FAILED for good. REASON: {repr(e)}")
+                    await asyncio.to_thread(self.queue.fail, job["id"], str(e))
+                continue
+
+            await asyncio.to_thread(self.queue.complete, job["id"], result)
+            print(f"✅ JOB {job['id'][:8]} DONE")
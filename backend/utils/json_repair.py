@@ -0,0 +1,267 @@
+# utils/json_repair.py
+import json
+import re
+
+_VALID_ESCAPES = set('"\\/bfnrtu')
+_PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_SEVERITIES = {"critical", "logic_error", "warning", "security_risk"}
+
+# Lookaheads that decide whether a quote inside a string is really its end
+_STRING = r""""(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*'"""
+_KEY_AHEAD = re.compile(r"\s*(?:" + _STRING + r"|[A-Za-z_]\w*)\s*:")
+_VALUE_AHEAD = re.compile(r"""\s*(?:["'{\[]|-?\d|(?:true|false|null|True|False|None)\b)""")
+_STRING_AHEAD = re.compile(r"\s*(?:" + _STRING + r")\s*[,}\]]")
+
+class _Container:
+    def __init__(self, kind: str):
+        self.kind = kind            # "{" or "["
+        self.expect = "key" if kind == "{" else "value"   # key / colon / value / comma
+        self.key = None             # last key read in an object
+
+
+def _next_significant(text: str, i: int):
+    while i < len(text) and text[i] in " \t\r\n":
+        i += 1
+    return text[i] if i < len(text) else ""
+
+
+def _string_closes_here(text: str, i: int, is_key: bool, in_object: bool) -> bool:
+    """
+    Decides whether the quote at text[i] ends the string or is an unescaped
+    inner quote: it closes when what follows is structure that fits here, and
+    a complete string right after it is a value that lost its comma.
+    """
+    nxt = _next_significant(text, i + 1)
+    if nxt == "":
+        return True
+    if is_key:
+        return nxt == ":"
+    if nxt in "}]":
+        return True
+    if nxt == ",":
+        j = text.index(",", i + 1)
+        if _next_significant(text, j + 1) in ("", "}", "]"):
+            return True
+        ahead = _KEY_AHEAD if in_object else _VALUE_AHEAD
+        return ahead.match(text, j + 1) is not None
+    if nxt == '"':
+        # `"error" "analysis": ...` -> a closed value followed by a missing comma
+        ahead = _KEY_AHEAD if in_object else _STRING_AHEAD
+        return ahead.match(text, i + 1) is not None
+    return False
+
+
+def _repair_text(text: str, allow_truncated: bool) -> str:
+    """
+    Single tolerant pass over the text, rebuilding valid JSON:
+    escapes raw control chars and stray quotes inside strings, fixes invalid
+    escapes, drops trailing commas, inserts missing commas, maps Python
+    literals, and (optionally) closes whatever a truncated response left open.
+    """
+    start = min([p for p in (text.find("{"), text.find("[")) if p != -1], default=-1)
+    if start == -1:
+        raise ValueError("No JSON brackets found in the AI response.")
+
+    out = []
+    stack = []
+    in_string = False
+    string_quote = '"'
+    string_is_key = False
+    string_start = 0
+    i = start
+
+    def value_done():
+        if stack:
+            stack[-1].expect = "comma"
+
+    def strip_trailing_comma():
+        while out and out[-1] in " \t\r\n":
+            out.pop()
+        if out and out[-1] == ",":
+            out.pop()
+
+    while i < len(text):
+        ch = text[i]
+
+        if in_string:
+            if ch == "\\":
+                nxt = text[i + 1] if i + 1 < len(text) else ""
+                if nxt == "'":
+                    out.append("'")
+                    i += 2
+                    continue
+                if nxt in _VALID_ESCAPES and nxt:
+                    out.append(ch + nxt)
+                    i += 2
+                    continue
+                out.append("\\\\")
+            elif ch == string_quote:
+                in_object = bool(stack) and stack[-1].kind == "{"
+                if _string_closes_here(text, i, string_is_key, in_object):
+                    in_string = False
+                    out.append('"')
+                    if string_is_key:
+                        stack[-1].expect = "colon"
+                        stack[-1].key = "".join(out[string_start:-1])
+                    else:
+                        value_done()
+                else:
+                    out.append('\\"' if ch == '"' else ch)
+            elif ch == '"':
+                out.append('\\"')
+            elif ch == "\n":
+                out.append("\\n")
+            elif ch == "\t":
+                out.append("\\t")
+            elif ch == "\r":
+                pass
+            else:
+                out.append(ch)
+            i += 1
+            continue
+
+        top = stack[-1] if stack else None
+
+        if ch in " \t\r\n":
+            out.append(ch)
+        elif ch in "{[\"'" or ch.isalnum() or ch == "-":
+            # A new value/key is starting: repair a missing comma first
+            if top is not None and top.expect == "comma":
+                out.append(",")
+                top.expect = "key" if top.kind == "{" else "value"
+            if top is not None and top.expect == "colon":
+                out.append(":")
+                top.expect = "value"
+
+            if ch in "\"'":
+                in_string = True
+                string_quote = ch
+                string_is_key = top is not None and top.kind == "{" and top.expect == "key"
+                out.append('"')
+                string_start = len(out)
+            elif ch in "{[":
+                stack.append(_Container(ch))
+                out.append(ch)
+            else:
+                match = re.match(r"-?[0-9][0-9.eE+\-]*|[A-Za-z_]+", text[i:])
+                token = match.group(0) if match else ch
+                if top is not None and top.kind == "{" and top.expect == "key":
+                    out.append(json.dumps(token))
+                    top.expect = "colon"
+                else:
+                    out.append(_PY_LITERALS.get(token, token))
+                    value_done()
+                i += len(token)
+                continue
+        elif ch in "}]":
+            strip_trailing_comma()
+            if top is not None and top.kind == "{" and top.expect == "value":
+                out.append("null")
+            if stack:
+                stack.pop()
+            out.append("}" if top is None or top.kind == "{" else "]")
+            value_done()
+            if not stack:
+                break
+        elif ch == ",":
+            if top is not None and top.expect == "comma":
+                out.append(",")
+                top.expect = "key" if top.kind == "{" else "value"
+        elif ch == ":":
+            if top is not None and top.expect == "colon":
+                out.append(":")
+                top.expect = "value"
+        i += 1
+
+    truncated = bool(stack or in_string)
+    if truncated:
+        if not allow_truncated:
+            raise ValueError("AI response is truncated.")
+        if any(c.kind == "{" and c.key == "corrected_code" and c.expect != "comma" for c in stack):
+            # Half a program is worse than none: never hand it out as the fix
+            raise ValueError("AI response is truncated inside corrected_code.")
+        if in_string:
+            out.append('"')
+            if string_is_key:
+                stack[-1].expect = "colon"
+            else:
+                value_done()
+        while stack:
+            top = stack.pop()
+            strip_trailing_comma()
+            if top.kind == "{" and top.expect in ("colon", "value"):
+                out.append(":" if top.expect == "colon" else "")
+                out.append("null")
+            out.append("}" if top.kind == "{" else "]")
+            value_done()
+
+    return "".join(out), truncated
+
+
+def coerce_analysis(obj):
+    """
+    Schema-guided cleanup for the analysis response shape
+    ({"status", "analysis": [...], "corrected_code"?}).
+    """
+    if isinstance(obj, list):
+        obj = {"analysis": obj}
+    if not isinstance(obj, dict):
+        raise ValueError("Repaired JSON is not an object.")
+
+    items = obj.get("analysis")
+    if isinstance(items, dict):
+        items = [items]
+    if not isinstance(items, list):
+        items = []
+
+    cleaned = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        line = item.get("line")
+        if not isinstance(line, int):
+            digits = re.search(r"\d+", str(line or ""))
+            item["line"] = int(digits.group(0)) if digits else 0
+        for field in ("buggy_code", "issue", "detail", "suggestion", "code", "description"):
+            if field in item and item[field] is not None and not isinstance(item[field], str):
+                item[field] = str(item[field])
+        if "severity" in item and item["severity"] not in _SEVERITIES:
+            item["severity"] = "warning"
+        # A truncated tail item without any text is useless to the UI
+        if not any(item.get(f) for f in ("issue", "detail", "code", "description")):
+            continue
+        cleaned.append(item)
+    obj["analysis"] = cleaned
+
+    status = str(obj.get("status") or "").strip().lower()
+    if status not in ("error", "success"):
+        # Issues imply "error"; a missing verdict is never read as "no errors"
+        if not any("issue" in item for item in cleaned):
+            raise ValueError("Repaired JSON has no usable status.")
+        status = "error"
+    obj["status"] = status
+
+    if "corrected_code" in obj and not isinstance(obj["corrected_code"], str):
+        obj["corrected_code"] = "" if obj["corrected_code"] is None else str(obj["corrected_code"])
+    return obj
+
+
+def repair_json(raw_text: str, allow_truncated: bool = True):
+    """
+    Local repair pipeline for malformed model JSON:
+    fence strip -> tolerant re-tokenization -> parse -> schema coercion.
+    Raises ValueError when the text cannot be salvaged; a result rebuilt
+    from a truncated response is marked "partial" (shown, never cached).
+    """
+    if not raw_text or not isinstance(raw_text, str):
+        raise ValueError("Empty AI response.")
+    cleaned = re.sub(r"```(?:json)?", "", raw_text, flags=re.IGNORECASE)
+    repaired, truncated = _repair_text(cleaned, allow_truncated)
+    try:
+        parsed = json.loads(repaired)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Local JSON repair failed: {e}")
+    result = coerce_analysis(parsed)
+    if truncated:
+        result["partial"] = True
+    return result
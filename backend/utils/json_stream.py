@@ -0,0 +1,72 @@
+# utils/json_stream.py
+import json
+import re
+
+_ANALYSIS_START = re.compile(r'"analysis"\s*:\s*\[')
+_STATUS = re.compile(r'"status"\s*:\s*"(\w+)"')
+
+
+class AnalysisStreamParser:
+    """
+    Incremental parser for the `analysis` array of a streamed model response.
+    Feed it text chunks as they arrive; every call returns the findings whose
+    closing brace has been seen since the previous call.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.status = None
+        self.done = False
+        self._pos = None          # scan position inside the analysis array
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._item_start = None
+
+    def feed(self, chunk: str):
+        self.text += chunk
+        if self.status is None:
+            match = _STATUS.search(self.text)
+            if match:
+                self.status = match.group(1)
+
+        if self._pos is None:
+            match = _ANALYSIS_START.search(self.text)
+            if not match:
+                return []
+            self._pos = match.end()
+
+        findings = []
+        text = self.text
+        i = self._pos
+        while i < len(text) and not self.done:
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                if self._depth == 0 and ch == "{":
+                    self._item_start = i
+                self._depth += 1
+            elif ch in "}]":
+                if self._depth == 0 and ch == "]":
+                    self.done = True
+                else:
+                    self._depth -= 1
+                    if self._depth == 0 and self._item_start is not None:
+                        try:
+                            item = json.loads(text[self._item_start:i + 1])
+                            if isinstance(item, dict):
+                                findings.append(item)
+                        except ValueError:
+                            pass
+                        self._item_start = None
+            i += 1
+        self._pos = i
+        return findings
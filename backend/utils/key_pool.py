@@ -0,0 +1,80 @@
+# utils/key_pool.py
+import hashlib
+import itertools
+import os
+import threading
+
+from utils.client_registry import build_cache_client, build_service_client
+
+
+def key_id(api_key: str) -> str:
+    """Short, non-secret identifier for an API key (used in logs and bucket labels)."""
+    return "key-" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:8]
+
+
+class ApiKey:
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        self.id = key_id(api_key)
+        self._client = None
+        self._cache_client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = build_service_client(self.api_key)
+        return self._client
+
+    @property
+    def cache_client(self):
+        if self._cache_client is None:
+            with self._lock:
+                if self._cache_client is None:
+                    self._cache_client = build_cache_client(self.api_key)
+        return self._cache_client
+
+
+class KeyPool:
+    """
+    Pool of Gemini API keys. Every key has its own quota buckets in the
+    RateLimiter and its own SDK client, so requests on different keys never
+    touch shared SDK configuration.
+    """
+
+    def __init__(self, api_keys, limiter):
+        seen = []
+        for k in api_keys:
+            k = (k or "").strip()
+            if k and k not in seen:
+                seen.append(k)
+        self.keys = [ApiKey(k) for k in seen]
+        self.limiter = limiter
+        self._tiebreak = itertools.count()
+
+    @classmethod
+    def from_env(cls, limiter):
+        """Reads GEMINI_API_KEYS (comma separated) plus GEMINI_API_KEY / GOOGLE_API_KEY."""
+        keys = os.getenv("GEMINI_API_KEYS", "").split(",")
+        keys += [os.getenv("GEMINI_API_KEY", ""), os.getenv("GOOGLE_API_KEY", "")]
+        return cls(keys, limiter)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def ranked(self, model_name: str, tokens: int):
+        """
+        Keys ordered by remaining budget for this model: shortest wait first,
+        then most requests left. Ties rotate so equal keys share the load.
+        """
+        start = next(self._tiebreak)
+        n = len(self.keys)
+
+        def score(item):
+            i, key = item
+            wait, requests_left = self.limiter.headroom(key.id, model_name, tokens)
+            return (wait, -requests_left, (i - start) % n)
+
+        return [key for _, key in sorted(enumerate(self.keys), key=score)]
@@ -0,0 +1,339 @@
+# utils/minhash.py
+import difflib
+import hashlib
+import json
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from utils.normalize import strip_comments
+
+# --------------------------------------------------------------------
+# 🔹 NORMALIZED TOKENS
+# --------------------------------------------------------------------
+# Identifiers become "v", literals "s"/"n", comments and layout disappear, so
+# copies that differ only in names, whitespace and comments look the same.
+_TOKEN = re.compile(
+    r"\"(?:\\.|[^\"\\\n])*\"|'(?:\\.|[^'\\\n])*'|`[^`]*`"     # strings
+    r"|\d+(?:\.\d+)?"                                        # numbers
+    r"|[A-Za-z_$][\w$]*"                                     # words
+    r"|\S"                                                   # punctuation
+)
+_KEYWORDS = set("""
+if else elif elsif unless for foreach while do loop return def fn func function fun sub class struct enum
+interface trait impl module package import from using include require try except catch finally rescue ensure
+raise throw throws new delete public private protected static final const let var val mut void int long
+short float double char bool boolean string str byte true false none null nil undefined and or not in is
+print println printf echo puts self this super switch case default break continue pass lambda yield async
+await end then with
+""".split())
+_SQL_KEYWORDS = _KEYWORDS | set("""
+select from where insert update delete create drop alter table values into join left right inner outer on
+group order by having limit offset as distinct set begin commit union all exists between like primary key
+foreign references index
+""".split())
+
+
+def normalized_lines(code: str, language: str = ""):
+    """One normalized token string per source line (empty for blank/comment-only lines)."""
+    keywords = _SQL_KEYWORDS if language == "sql" else _KEYWORDS
+    text = strip_comments((code or "").replace("\r\n", "\n").replace("\r", "\n"), language)
+    lines = []
+    for line in text.split("\n"):
+        tokens = []
+        for token in _TOKEN.findall(line):
+            if token[0] in "\"'`":
+                tokens.append("s")
+            elif token[0].isdigit():
+                tokens.append("n")
+            elif token[0].isalpha() or token[0] in "_$":
+                lowered = token.lower()
+                tokens.append(lowered if lowered in keywords else "v")
+            else:
+                tokens.append(token)
+        lines.append(" ".join(tokens))
+    return lines
+
+
+def shingles(lines, k: int = 4):
+    tokens = " ".join(line for line in lines if line).split()
+    if len(tokens) <= k:
+        return {" ".join(tokens)} if tokens else set()
+    return {" ".join(tokens[i:i + k]) for i in range(len(tokens) - k + 1)}
+
+
+# --------------------------------------------------------------------
+# 🔹 MINHASH SIGNATURES
+# --------------------------------------------------------------------
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._perms = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+
+    def signature(self, shingle_set):
+        hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "big") for s in shingle_set]
+        if not hashes:
+            return [_MAX_HASH] * self.num_perm
+        return [min((a * h + b) % _PRIME & _MAX_HASH for h in hashes) for a, b in self._perms]
+
+
+def similarity(sig_a, sig_b) -> float:
+    """Estimated Jaccard similarity of the two shingle sets."""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a) if sig_a else 0.0
+
+
+# --------------------------------------------------------------------
+# 🔹 LINE ALIGNMENT
+# --------------------------------------------------------------------
+def align_lines(old_lines, new_lines):
+    """
+    {old line -> new line} (1-based) for lines whose normalized tokens match,
+    and whether every non-empty new line found its counterpart.
+    """
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    line_map = {}
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            for offset in range(i2 - i1):
+                line_map[i1 + offset + 1] = j1 + offset + 1
+    aligned = set(line_map.values())
+    complete = all(not line or number in aligned for number, line in enumerate(new_lines, start=1))
+    return line_map, complete
+
+
+def _is_identifier(token: str, keywords) -> bool:
+    return (token[0].isalpha() or token[0] in "_$") and token.lower() not in keywords
+
+
+def identifier_mapping(old_code: str, code: str, line_map: dict, language: str = ""):
+    """
+    ({old identifier -> new identifier}, exact), read off the RAW aligned lines
+    token by token. `exact` holds only when those lines differ in nothing but
+    a consistent one-to-one renaming: same keywords, literals and punctuation,
+    and no identifier mapped to two names (or two identifiers to one).
+    """
+    keywords = _SQL_KEYWORDS if language == "sql" else _KEYWORDS
+    old_source, source = (old_code or "").splitlines(), (code or "").splitlines()
+    forward, backward, conflicts = {}, {}, set()
+    exact = True
+    for old_line, new_line in line_map.items():
+        old_text = old_source[old_line - 1] if old_line <= len(old_source) else ""
+        new_text = source[new_line - 1] if new_line <= len(source) else ""
+        old_tokens, new_tokens = _TOKEN.findall(old_text), _TOKEN.findall(new_text)
+        if len(old_tokens) != len(new_tokens):
+            exact = False
+            continue
+        for old, new in zip(old_tokens, new_tokens):
+            if not (_is_identifier(old, keywords) and _is_identifier(new, keywords)):
+                exact = exact and old == new
+                continue
+            if forward.setdefault(old, new) != new or backward.setdefault(new, old) != old:
+                exact = False
+                conflicts.add(old)
+    renames = {old: new for old, new in forward.items() if old != new and old not in conflicts}
+    return renames, exact
+
+
+def remap_result(result: dict, line_map: dict, code: str, old_code: str = None, language: str = ""):
+    """
+    The previous analysis re-pointed at the new code: line numbers shifted,
+    code excerpts taken from the new text and renamed identifiers carried
+    into the explanations. Findings on lines that no longer exist are dropped.
+    """
+    source = (code or "").splitlines()
+    renames = identifier_mapping(old_code, code, line_map, language)[0] if old_code else {}
+    pattern = re.compile(r"(?<![\w$])(" + "|".join(map(re.escape, sorted(renames, key=len, reverse=True))) + r")(?![\w$])") if renames else None
+    items = []
+    for item in result.get("analysis") or []:
+        try:
+            new_line = line_map.get(int(item.get("line")))
+        except (TypeError, ValueError):
+            new_line = None
+        if new_line is None or new_line > len(source):
+            continue
+        moved = dict(item, line=new_line)
+        if pattern is not None:
+            for field in ("issue", "detail", "suggestion", "description"):
+                if isinstance(moved.get(field), str):
+                    moved[field] = pattern.sub(lambda m: renames[m.group(1)], moved[field])
+        for field in ("buggy_code", "code"):
+            if field in moved:
+                moved[field] = source[new_line - 1].strip()
+        items.append(moved)
+    remapped = {k: v for k, v in result.items() if k not in ("analysis", "corrected_code")}
+    remapped["analysis"] = items
+    return remapped
+
+
+class NearMatch:
+    def __init__(self, similarity: float, result: dict, old_code: str, line_map: dict, complete: bool, language: str):
+        self.similarity = similarity
+        self.result = result
+        self.old_code = old_code
+        self.line_map = line_map
+        self.complete = complete
+        self.language = language
+
+    def remapped(self, code: str):
+        return remap_result(self.result, self.line_map, code, self.old_code, self.language)
+
+    def reusable(self, code: str) -> bool:
+        """
+        True when the old verdict provably carries over: every non-blank line
+        on BOTH sides is aligned (comments included, so a changed comment or
+        an added line falls back to the model) and the aligned lines differ
+        only by a consistent renaming with identical literals.
+        """
+        if not self.complete:
+            return False
+        old_source, source = (self.old_code or "").splitlines(), (code or "").splitlines()
+        aligned_old, aligned_new = set(self.line_map), set(self.line_map.values())
+        if any(line.strip() and number not in aligned_old for number, line in enumerate(old_source, start=1)):
+            return False
+        if any(line.strip() and number not in aligned_new for number, line in enumerate(source, start=1)):
+            return False
+        return identifier_mapping(self.old_code, code, self.line_map, self.language)[1]
+
+    def prompt_hints(self, code: str) -> str:
+        remapped = self.remapped(code)
+        if self.result.get("status") == "success":
+            summary = "it had no errors."
+        elif remapped["analysis"]:
+            summary = "its findings, mapped to this code's lines:\n" + "\n".join(
+                f"- line {f['line']}: {f.get('issue', '')}: {f.get('detail', '')}" for f in remapped["analysis"]
+            )
+        else:
+            return ""
+        return (
+            f"\n\nA NEAR-IDENTICAL SUBMISSION (similarity {self.similarity:.2f}) was analysed before; {summary}\n"
+            "Check that against THIS code and report anything it missed."
+        )
+
+
+# --------------------------------------------------------------------
+# 🔹 PERSISTENT LSH INDEX
+# --------------------------------------------------------------------
+class NearDuplicateIndex:
+    """
+    MinHash/LSH index over past analyses, stored in SQLite; only signatures
+    and LSH buckets live in memory. At most `max_entries` submissions are kept
+    (least recently used go first), so memory stays bounded. Entries are namespaced (e.g. by prompt
+    version + language) so results never cross languages or template versions.
+    """
+
+    def __init__(self, db_path, max_entries: int = 2000, num_perm: int = 64, bands: int = 16):
+        self.max_entries = max_entries
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm)
+        self.lookups = 0
+        self.matches = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()       # id -> (namespace, signature)
+        self._buckets = {}                  # (namespace, band, band hash) -> set(ids)
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.executescript("""
+        CREATE TABLE IF NOT EXISTS near_duplicates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            namespace TEXT,
+            fingerprint TEXT UNIQUE,
+            signature TEXT,
+            code TEXT,
+            norm_lines TEXT,
+            result TEXT,
+            last_access REAL
+        );
+        """)
+        self._conn.commit()
+        self._load()
+
+    def _band_keys(self, namespace: str, signature):
+        for band in range(self.bands):
+            chunk = signature[band * self.rows:(band + 1) * self.rows]
+            yield namespace, band, hash(tuple(chunk))
+
+    def _index(self, entry_id: int, namespace: str, signature):
+        self._entries[entry_id] = (namespace, signature)
+        for key in self._band_keys(namespace, signature):
+            self._buckets.setdefault(key, set()).add(entry_id)
+
+    def _unindex(self, entry_id: int):
+        namespace, signature = self._entries.pop(entry_id)
+        for key in self._band_keys(namespace, signature):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def _load(self):
+        rows = self._conn.execute(
+            "SELECT id, namespace, signature FROM near_duplicates ORDER BY last_access DESC LIMIT ?",
+            (self.max_entries,),
+        ).fetchall()
+        for entry_id, namespace, signature in reversed(rows):
+            self._index(entry_id, namespace, json.loads(signature))
+
+    def add(self, namespace: str, code: str, language: str, result: dict):
+        lines = normalized_lines(code, language)
+        signature = self.hasher.signature(shingles(lines))
+        fingerprint = hashlib.sha256(f"{namespace}\x1f{code}".encode("utf-8")).hexdigest()
+        with self._lock:
+            old = self._conn.execute("SELECT id FROM near_duplicates WHERE fingerprint = ?", (fingerprint,)).fetchone()
+            if old is not None:
+                self._conn.execute("DELETE FROM near_duplicates WHERE id = ?", (old[0],))
+                if old[0] in self._entries:
+                    self._unindex(old[0])
+            entry_id = self._conn.execute(
+                "INSERT INTO near_duplicates (namespace, fingerprint, signature, code, norm_lines, result, last_access) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (namespace, fingerprint, json.dumps(signature), code, json.dumps(lines), json.dumps(result), time.time()),
+            ).lastrowid
+            self._index(entry_id, namespace, signature)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._unindex(oldest)
+                self._conn.execute("DELETE FROM near_duplicates WHERE id = ?", (oldest,))
+            self._conn.commit()
+
+    def query(self, namespace: str, code: str, language: str, min_similarity: float):
+        """Best indexed submission at or above `min_similarity`, as a NearMatch (or None)."""
+        lines = normalized_lines(code, language)
+        signature = self.hasher.signature(shingles(lines))
+        with self._lock:
+            self.lookups += 1
+            candidates = set()
+            for key in self._band_keys(namespace, signature):
+                candidates |= self._buckets.get(key, set())
+            scored = [(similarity(signature, self._entries[c][1]), c) for c in candidates]
+            scored = [(score, c) for score, c in scored if score >= min_similarity]
+            if not scored:
+                return None
+            score, best = max(scored)
+            self._entries.move_to_end(best)
+            row = self._conn.execute("SELECT result, code, norm_lines FROM near_duplicates WHERE id = ?", (best,)).fetchone()
+            self._conn.execute("UPDATE near_duplicates SET last_access = ? WHERE id = ?", (time.time(), best))
+            self._conn.commit()
+            self.matches += 1
+        if row is None:
+            return None
+        line_map, complete = align_lines(json.loads(row[2]), lines)
+        return NearMatch(score, json.loads(row[0]), row[1], line_map, complete, language)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "lookups": self.lookups,
+                "matches": self.matches,
+                "bands": self.bands,
+                "rows_per_band": self.rows,
+            }
@@ -0,0 +1,146 @@
+# utils/normalize.py
+import bisect
+import math
+import re
+
+# --------------------------------------------------------------------
+# 🔹 COMMENTS (string-aware: a '#' or '//' inside a literal is kept)
+# --------------------------------------------------------------------
+_DQ = r"\"(?:\\.|[^\"\\\n])*\""
+_SQ = r"'(?:\\.|[^'\\\n])*'"
+_BT = r"`(?:\\.|[^`\\])*`"
+_TRIPLE = r"\"\"\"[\s\S]*?\"\"\"|'''[\s\S]*?'''"
+
+_HASH = (rf"{_TRIPLE}|{_DQ}|{_SQ}", r"#[^\n]*")
+_C_LIKE = (rf"{_DQ}|{_SQ}", r"//[^\n]*|/\*[\s\S]*?\*/")
+_COMMENT_RULES = {
+    "python": _HASH, "ruby": _HASH, "perl": _HASH, "r": _HASH, "elixir": _HASH, "bash": _HASH,
+    "javascript": (rf"{_BT}|{_DQ}|{_SQ}", _C_LIKE[1]),
+    "typescript": (rf"{_BT}|{_DQ}|{_SQ}", _C_LIKE[1]),
+    "go": (rf"{_BT}|{_DQ}|{_SQ}", _C_LIKE[1]),
+    "php": (rf"{_DQ}|{_SQ}", r"#[^\n]*|//[^\n]*|/\*[\s\S]*?\*/"),
+    "sql": (rf"{_DQ}|{_SQ}", r"--[^\n]*|/\*[\s\S]*?\*/"),
+    "matlab": (_DQ, r"%[^\n]*"),
+    "css": (rf"{_DQ}|{_SQ}", r"/\*[\s\S]*?\*/"),
+    "html": (r"(?!)", r"<!--[\s\S]*?-->"),
+}
+_COMPILED = {
+    language: re.compile(rf"(?P<keep>{strings})|(?P<drop>{comments})")
+    for language, (strings, comments) in _COMMENT_RULES.items()
+}
+_DEFAULT = re.compile(rf"(?P<keep>{_C_LIKE[0]})|(?P<drop>{_C_LIKE[1]})")
+
+
+def strip_comments(code: str, language: str = None) -> str:
+    """Comments blanked out (newlines kept, so line numbers don't move)."""
+    pattern = _COMPILED.get(language, _DEFAULT)
+    return pattern.sub(
+        lambda m: re.sub(r"[^\n]", " ", m.group(0)) if m.group("drop") is not None else m.group(0),
+        code or "",
+    )
+
+
+# --------------------------------------------------------------------
+# 🔹 CANONICAL FORM
+# --------------------------------------------------------------------
+# Leading whitespace means nothing outside string literals in these languages
+_FREE_INDENT = {
+    "c", "cpp", "csharp", "java", "javascript", "typescript", "go", "rust", "kotlin", "swift",
+    "dart", "php", "css", "sql", "r", "matlab",
+}
+# Indentation is syntax here: widths may be rescaled, never dropped
+_INDENT_SENSITIVE = {"python"}
+# Literals that can span lines: leave their whitespace (and blank lines) alone
+_MULTILINE_LITERAL = re.compile(r"`|\"\"\"|'''|\bR\"\(|@\"|\br#*\"|<<<|<<[~-]?['\"]?[A-Z]")
+
+
+class Canonical:
+    """
+    Canonical text of a submission plus a line map back to the original:
+    `line_map[i]` is the original line number of canonical line i + 1.
+    """
+
+    def __init__(self, text: str, line_map):
+        self.text = text
+        self.line_map = line_map
+
+    def original_line(self, line: int) -> int:
+        if not self.line_map:
+            return line
+        return self.line_map[min(max(1, line), len(self.line_map)) - 1]
+
+    def canonical_line(self, line: int) -> int:
+        """Canonical line of an original line (a dropped line maps to the kept line before it)."""
+        return max(1, bisect.bisect_right(self.line_map, line))
+
+    def _remap(self, result, convert):
+        if not isinstance(result, dict) or not isinstance(result.get("analysis"), list):
+            return result
+        items = []
+        for item in result["analysis"]:
+            if isinstance(item, dict) and isinstance(item.get("line"), int):
+                item = dict(item, line=convert(item["line"]))
+            items.append(item)
+        return dict(result, analysis=items)
+
+    def to_canonical(self, result):
+        """A result for the original code, re-numbered for storage under the canonical key."""
+        return self._remap(result, self.canonical_line)
+
+    def to_original(self, result):
+        """A stored (canonical) result, re-numbered for this submission."""
+        return self._remap(result, self.original_line)
+
+
+def _indent_unit(lines) -> int:
+    """GCD of the space indentation widths; -1 for tab-only indentation, 0 when mixed or absent."""
+    widths = set()
+    tabs = False
+    for line in lines:
+        indent = line[:len(line) - len(line.lstrip())]
+        if not indent:
+            continue
+        if set(indent) == {"\t"}:
+            tabs = True
+        elif set(indent) == {" "}:
+            widths.add(len(indent))
+        else:
+            return 0
+    if tabs:
+        return 0 if widths else -1
+    return math.gcd(*widths) if widths else 0
+
+
+def canonicalize(code: str, language: str = None, strip_comment_text: bool = False, first_line: int = 1) -> Canonical:
+    """
+    Formatting-insensitive form of `code` for cache keys:
+      - line endings normalized, trailing whitespace and blank lines dropped
+      - indentation dropped where it means nothing, rescaled to 4 spaces in Python
+      - comments removed (optional, string-aware)
+    With no language only the first, always-safe step is applied. Code with
+    literals that can span lines keeps its inner whitespace.
+    """
+    text = (code or "").replace("\r\n", "\n").replace("\r", "\n")
+    if strip_comment_text and language:
+        text = strip_comments(text, language)
+    lines = [line.rstrip() for line in text.split("\n")]
+
+    multiline = bool(language) and bool(_MULTILINE_LITERAL.search(text))
+    if language in _FREE_INDENT and not multiline:
+        lines = [line.lstrip() for line in lines]
+    elif language in _INDENT_SENSITIVE and not multiline:
+        unit = _indent_unit(lines)
+        if unit == -1:              # tabs only
+            lines = [line.replace("\t", "    ", len(line) - len(line.lstrip("\t"))) for line in lines]
+        elif unit > 1 and unit != 4:
+            lines = [" " * (4 * ((len(line) - len(line.lstrip(" "))) // unit)) + line.lstrip(" ") for line in lines]
+
+    kept, line_map = [], []
+    for number, line in enumerate(lines, start=first_line):
+        if line or (multiline and line_map):
+            kept.append(line)
+            line_map.append(number)
+    while kept and not kept[-1]:
+        kept.pop()
+        line_map.pop()
+    return Canonical("\n".join(kept), line_map)
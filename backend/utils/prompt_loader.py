@@ -1,17 +1,215 @@
 # utils/prompt_loader.py
+import hashlib
+import re
+import threading
 from pathlib import Path
+from typing import NamedTuple
+
+PROMPT_FILES = {"analysis": "analysisPrompt.txt", "fullfix": "fullFixPrompt.txt"}
+CORRECTED_FIELD = ', "corrected_code": "<PROVIDE_CODE>"'
+_PLACEHOLDER = re.compile(r"\{\{([A-Z_]+)\}\}")
+_MAX_VARIANTS = 512
+# The labelled, fenced code block around the NUMBERED_CODE slot
+_CODE_HEADER = re.compile(r'(?:[^\n]*\n)?(?:\"\"\"|```)[^\n]*\n$')
+_CODE_FOOTER = re.compile(r'^\n(?:\"\"\"|```)[^\n]*')
+CODE_REFERENCE = "(The numbered code to analyze is given in the user message.)"
+
+
+class StagePrompt(NamedTuple):
+    """
+    A rendered prompt split for the provider: `system` holds the static
+    instructions (identical for every call in the same language and mode) and
+    `user` only the numbered code plus per-call hints. `system` is empty when
+    the template can't be split; `user` is then the whole prompt.
+    """
+    system: str
+    user: str
+
+    def inline(self) -> str:
+        """Both parts as one prompt, for models without system instructions."""
+        return f"{self.system}\n\n{self.user}" if self.system else self.user
+
+
+class CompiledPrompt:
+    """
+    A template split once into literal segments and placeholders.
+    Per (language, mode) the literals are pre-joined, leaving only the code
+    slot, so rendering a request is a single join.
+    """
+
+    def __init__(self, template: str, languages=()):
+        self.template = template
+        self._parts = []        # literal str, or placeholder name
+        position = 0
+        for match in _PLACEHOLDER.finditer(template):
+            self._parts.append(template[position:match.start()])
+            self._parts.append((match.group(1),))
+            position = match.end()
+        self._parts.append(template[position:])
+        self._variants = {}
+        self._splits = {}
+        for language in languages:
+            for include_corrected in (False, True):
+                self.variant(language, include_corrected)
+
+    def variant(self, language: str, include_corrected: bool):
+        """Literal segments around the NUMBERED_CODE slots (None) for one language and mode."""
+        key = (language, include_corrected)
+        segments = self._variants.get(key)
+        if segments is not None:
+            return segments
+
+        values = {"LANGUAGE": language, "INCLUDE_CORRECTED": CORRECTED_FIELD if include_corrected else ""}
+        segments = []
+        literal = []
+        for part in self._parts:
+            if isinstance(part, str):
+                literal.append(part)
+            elif part[0] == "NUMBERED_CODE":
+                segments.append("".join(literal))
+                segments.append(None)
+                literal = []
+            else:
+                literal.append(values.get(part[0], "{{" + part[0] + "}}"))
+        segments.append("".join(literal))
+
+        if len(self._variants) < _MAX_VARIANTS:
+            self._variants[key] = segments
+        return segments
+
+    def render(self, language: str, numbered_code: str, include_corrected: bool, suffix: str = "") -> str:
+        segments = self.variant(language, include_corrected)
+        return "".join([numbered_code if s is None else s for s in segments] + [suffix])
+
+    def split_variant(self, language: str, include_corrected: bool):
+        """
+        (system text, user head, user tail) for one language and mode, or None
+        when the template has no single code slot. The code block (its label
+        line and fences included) moves to the user message; the system text
+        points at it instead.
+        """
+        key = (language, include_corrected)
+        if key in self._splits:
+            return self._splits[key]
+
+        segments = self.variant(language, include_corrected)
+        split = None
+        if segments.count(None) == 1:
+            before, after = segments[0], segments[2]
+            header = _CODE_HEADER.search(before)
+            footer = _CODE_FOOTER.match(after)
+            if header and footer:
+                head, tail = before[header.start():], after[:footer.end()]
+                system = before[:header.start()] + CODE_REFERENCE + after[footer.end():]
+            else:
+                head, tail = "", ""
+                system = before + CODE_REFERENCE + after
+            split = (system.strip(), head, tail)
+
+        if len(self._splits) < _MAX_VARIANTS:
+            self._splits[key] = split
+        return split
+
+    def render_split(self, language: str, numbered_code: str, include_corrected: bool, suffix: str = "") -> StagePrompt:
+        split = self.split_variant(language, include_corrected)
+        if split is None:
+            return StagePrompt("", self.render(language, numbered_code, include_corrected, suffix))
+        system, head, tail = split
+        return StagePrompt(system, head + numbered_code + tail + suffix)
+
+
+class _PromptSet:
+    def __init__(self, texts: dict, mtimes: dict, languages):
+        self.texts = texts
+        self.mtimes = mtimes
+        self.compiled = {name: CompiledPrompt(text, languages) for name, text in texts.items()}
+        # Changes whenever a template is edited, so cached answers from old prompts are never served
+        digest = hashlib.sha256((texts["analysis"] + "\x00" + texts["fullfix"]).encode("utf-8"))
+        self.version = digest.hexdigest()[:12]
+
 
 class PromptLoader:
-    def __init__(self, prompts_dir: Path):
+    """
+    Loads and compiles the prompt templates. `watch()` starts a daemon thread
+    that polls the files' mtimes and swaps in a freshly compiled set when one
+    changes; requests keep using the old set until the swap, so they never wait.
+    """
+
+    def __init__(self, prompts_dir: Path, languages=()):
         self.prompts_dir = prompts_dir
-        self.analysis_prompt = ""
-        self.fullfix_prompt = ""
+        self.languages = tuple(languages)
+        self._set = None
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
         self.reload()
 
+    @property
+    def analysis_prompt(self) -> str:
+        return self._set.texts["analysis"]
+
+    @property
+    def fullfix_prompt(self) -> str:
+        return self._set.texts["fullfix"]
+
+    @property
+    def version(self) -> str:
+        return self._set.version
+
+    def _paths(self):
+        return {name: self.prompts_dir / filename for name, filename in PROMPT_FILES.items()}
+
+    def _mtimes(self):
+        return {name: path.stat().st_mtime_ns for name, path in self._paths().items()}
+
     def reload(self):
-        analysis_file = self.prompts_dir / "analysisPrompt.txt"
-        fullfix_file = self.prompts_dir / "fullFixPrompt.txt"
-        if not analysis_file.exists() or not fullfix_file.exists():
-            raise FileNotFoundError("Prompts not found in prompts/ directory.")
-        self.analysis_prompt = analysis_file.read_text(encoding="utf-8")
-        self.fullfix_prompt = fullfix_file.read_text(encoding="utf-8")
+        with self._reload_lock:
+            paths = self._paths()
+            if not all(path.exists() for path in paths.values()):
+                raise FileNotFoundError("Prompts not found in prompts/ directory.")
+            mtimes = self._mtimes()
+            texts = {name: path.read_text(encoding="utf-8") for name, path in paths.items()}
+            self._set = _PromptSet(texts, mtimes, self.languages)
+
+    def render(self, name: str, language: str, numbered_code: str, include_corrected: bool, suffix: str = "") -> str:
+        return self._set.compiled[name].render(language, numbered_code, include_corrected, suffix)
+
+    def render_split(self, name: str, language: str, numbered_code: str, include_corrected: bool,
+                     suffix: str = "") -> StagePrompt:
+        return self._set.compiled[name].render_split(language, numbered_code, include_corrected, suffix)
+
+    # --------------------------------------------------------------------
+    # 🔹 HOT RELOAD
+    # --------------------------------------------------------------------
+    def changed(self) -> bool:
+        try:
+            return self._mtimes() != self._set.mtimes
+        except OSError:
+            return False        # a file is mid-save; look again next time
+
+    def watch(self, interval: float = 2.0):
+        if self._watcher is not None or interval <= 0:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                if not self.changed():
+                    continue
+                old_version = self.version
+                try:
+                    self.reload()
+                except Exception as e:
+                    print(f"⚠️ Prompt reload failed, keeping version {old_version}: {repr(e)}")
+                    continue
+                if self.version != old_version:
+                    print(f"📄 Prompts reloaded: {old_version} -> {self.version}")
+
+        self._watcher = threading.Thread(target=run, name="prompt-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5)
+            self._watcher = None
@@ -0,0 +1,199 @@
+# utils/rate_limiter.py
+import re
+import threading
+import time
+
+# Published per-model quotas as (requests per minute, input tokens per minute).
+# Matched by prefix, so the more specific entries must come first.
+MODEL_QUOTAS = [
+    ("models/gemini-2.5-flash-lite", 15, 250_000),
+    ("models/gemini-2.5-flash", 10, 250_000),
+    ("models/gemini-2.5-pro", 5, 250_000),
+    ("models/gemini-2.0-flash-lite", 30, 1_000_000),
+    ("models/gemini-2.0-flash", 15, 1_000_000),
+    ("models/gemini-1.5-flash-8b", 15, 1_000_000),
+    ("models/gemini-1.5-flash", 15, 1_000_000),
+    ("models/gemini-1.5-pro", 2, 32_000),
+    ("models/gemma-", 30, 15_000),
+]
+DEFAULT_QUOTA = (10, 250_000)
+
+# Cooldown used when a 429 arrives without any retry hint.
+DEFAULT_RETRY_AFTER = 30.0
+
+
+def quota_for(model_name: str):
+    """Returns (rpm, tpm) for a model from the published quota table."""
+    for prefix, rpm, tpm in MODEL_QUOTAS:
+        if model_name.startswith(prefix):
+            return rpm, tpm
+    return DEFAULT_QUOTA
+
+
+class TokenBucket:
+    """
+    Classic token bucket that refills continuously.
+    The level may go negative: a reservation is taken immediately and the
+    caller waits out the debt, so concurrent callers queue up fairly.
+    """
+
+    def __init__(self, capacity: float, per_seconds: float = 60.0):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / per_seconds
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost: float, now: float, keep: float = 0.0) -> float:
+        """Seconds until `cost` can be taken while leaving a `keep` share of capacity untouched."""
+        self._refill(now)
+        if cost > self.capacity:
+            return float("inf")
+        floor = min(keep * self.capacity, self.capacity - cost)
+        if self.level - cost >= floor:
+            return 0.0
+        return (cost + floor - self.level) / self.rate
+
+    def take(self, cost: float):
+        self.level -= cost
+
+    def give_back(self, amount: float):
+        self.level = min(self.capacity, self.level + amount)
+
+    def remaining(self, now: float) -> float:
+        self._refill(now)
+        return max(0.0, self.level)
+
+
+class RateLimiter:
+    """
+    Request + token buckets per (api key, model) pair, sized from MODEL_QUOTAS.
+    A model that answered 429 is blocked until its Retry-After has passed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._blocked_until = {}
+
+    def _get(self, key_id: str, model_name: str):
+        slot = (key_id, model_name)
+        if slot not in self._buckets:
+            rpm, tpm = quota_for(model_name)
+            self._buckets[slot] = (TokenBucket(rpm), TokenBucket(tpm))
+        return self._buckets[slot]
+
+    def reserve(self, key_id: str, model_name: str, tokens: int, max_wait: float, keep: float = 0.0):
+        """
+        Reserves one request and `tokens` input tokens.
+        Returns the seconds the caller must sleep before sending, or None when
+        the wait would exceed `max_wait` (the caller should reroute instead).
+        `keep` is the share of each bucket the caller may NOT dip into
+        (bulk traffic leaves it for interactive requests).
+        """
+        with self._lock:
+            now = time.monotonic()
+            req_bucket, tok_bucket = self._get(key_id, model_name)
+            blocked = max(0.0, self._blocked_until.get((key_id, model_name), 0.0) - now)
+            wait = max(blocked, req_bucket.wait_time(1, now, keep), tok_bucket.wait_time(tokens, now, keep))
+            if wait > max_wait:
+                return None
+            req_bucket.take(1)
+            tok_bucket.take(tokens)
+            return wait
+
+    def release(self, key_id: str, model_name: str, tokens: int):
+        """Returns a reservation whose request is about to be re-sent in another form."""
+        with self._lock:
+            req_bucket, tok_bucket = self._get(key_id, model_name)
+            req_bucket.give_back(1)
+            tok_bucket.give_back(tokens)
+
+    def headroom(self, key_id: str, model_name: str, tokens: int):
+        """(seconds until `tokens` could be sent, requests left) without reserving anything."""
+        with self._lock:
+            now = time.monotonic()
+            req_bucket, tok_bucket = self._get(key_id, model_name)
+            blocked = max(0.0, self._blocked_until.get((key_id, model_name), 0.0) - now)
+            wait = max(blocked, req_bucket.wait_time(1, now), tok_bucket.wait_time(tokens, now))
+            return wait, req_bucket.remaining(now)
+
+    def record_usage(self, key_id: str, model_name: str, estimated: int, actual: int):
+        """Corrects the token bucket once the real prompt token count is known."""
+        if not actual or actual == estimated:
+            return
+        with self._lock:
+            _, tok_bucket = self._get(key_id, model_name)
+            if actual > estimated:
+                tok_bucket.take(actual - estimated)
+            else:
+                tok_bucket.give_back(estimated - actual)
+
+    def penalize(self, key_id: str, model_name: str, retry_after: float = None):
+        """Blocks a (key, model) pair after a 429 until Retry-After has elapsed."""
+        delay = retry_after if retry_after is not None else DEFAULT_RETRY_AFTER
+        with self._lock:
+            slot = (key_id, model_name)
+            until = time.monotonic() + delay
+            self._blocked_until[slot] = max(self._blocked_until.get(slot, 0.0), until)
+
+    def snapshot(self):
+        """Current remaining budget per (key, model) for diagnostics."""
+        with self._lock:
+            now = time.monotonic()
+            return [
+                {
+                    "key": key_id,
+                    "model": model_name,
+                    "requests_left": round(req.remaining(now), 2),
+                    "tokens_left": int(tok.remaining(now)),
+                    "blocked_for": round(max(0.0, self._blocked_until.get((key_id, model_name), 0.0) - now), 2),
+                }
+                for (key_id, model_name), (req, tok) in self._buckets.items()
+            ]
+
+
+def is_quota_error(exc: Exception) -> bool:
+    """
+    True for 429 / RESOURCE_EXHAUSTED errors from the Gemini SDK, judged by
+    exception type, status code or status name only: a "4290 ms" timeout or
+    a "quota project not set" 400 is not a quota error.
+    """
+    try:
+        from google.api_core import exceptions as core_exceptions
+        if isinstance(exc, (core_exceptions.ResourceExhausted, core_exceptions.TooManyRequests)):
+            return True
+    except ImportError:
+        pass
+    code = getattr(exc, "code", None)
+    if code == 429 or getattr(code, "value", None) == 429:
+        return True
+    return "RESOURCE_EXHAUSTED" in str(exc)
+
+
+def retry_after_from_error(exc: Exception):
+    """
+    Extracts the server's retry hint from a quota error.
+    Checks the HTTP Retry-After header (REST transport), then the RetryInfo
+    detail / "retry in Ns" text that the gRPC transport puts in the message.
+    """
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    header = headers.get("Retry-After") if hasattr(headers, "get") else None
+    if header:
+        try:
+            return float(header)
+        except ValueError:
+            pass
+
+    text = str(exc)
+    match = re.search(r"retry_delay\s*\{\s*seconds:\s*(\d+)", text)
+    if match:
+        return float(match.group(1))
+    match = re.search(r"retry in\s+([\d.]+)\s*s", text, re.IGNORECASE)
+    if match:
+        return float(match.group(1))
+    return None
@@ -0,0 +1,96 @@
+# utils/response_cache.py
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+def code_fingerprint(code: str) -> str:
+    """Hash of the code after normalizing line endings and trailing whitespace."""
+    lines = (code or "").replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    normalized = "\n".join(line.rstrip() for line in lines).strip("\n")
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def make_cache_key(template_version: str, language: str, code: str, mode: str) -> str:
+    """Cache key = (prompt template version, language, normalized code hash, mode)."""
+    parts = [template_version, (language or "").strip().lower(), code_fingerprint(code), mode]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Parsed LLM responses stored in SQLite with a TTL and a size bound.
+    When the table grows past `max_entries`, the least recently used rows go.
+    """
+
+    def __init__(self, db_path, ttl_seconds: float = 86400, max_entries: int = 2000):
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.executescript("""
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            cache_key TEXT PRIMARY KEY,
+            response TEXT,
+            created_at REAL,
+            last_access REAL
+        );
+        CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache (last_access);
+        """)
+        self._conn.commit()
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM llm_cache WHERE cache_key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._conn.execute("DELETE FROM llm_cache WHERE cache_key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE cache_key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return json.loads(row[0])
+
+    def contains(self, key: str) -> bool:
+        """Fresh entry present? (does not count as a hit/miss or touch LRU order)"""
+        with self._lock:
+            row = self._conn.execute("SELECT created_at FROM llm_cache WHERE cache_key = ?", (key,)).fetchone()
+        return row is not None and time.time() - row[0] <= self.ttl
+
+    def put(self, key: str, value):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (cache_key, response, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,))
+            self._conn.execute(
+                """DELETE FROM llm_cache WHERE cache_key IN (
+                       SELECT cache_key FROM llm_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                   )""",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+        }
@@ -0,0 +1,140 @@
+# utils/response_schema.py
+import re
+import time
+
+# The `status` / `analysis` / `corrected_code` shape described in prompts/*.txt,
+# written in the OpenAPI subset that Gemini accepts as `response_schema`.
+_FINDING = {
+    "type": "object",
+    "properties": {
+        "line": {"type": "integer"},
+        "buggy_code": {"type": "string"},
+        "severity": {"type": "string", "enum": ["critical", "logic_error", "warning", "security_risk"]},
+        "issue": {"type": "string"},
+        "detail": {"type": "string"},
+        "suggestion": {"type": "string"},
+        "code": {"type": "string"},
+        "description": {"type": "string"},
+    },
+    "required": ["line"],
+}
+
+ANALYSIS_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "status": {"type": "string", "enum": ["error", "success"]},
+        "intro": {"type": "string"},
+        "analysis": {"type": "array", "items": _FINDING},
+        "corrected_code": {"type": "string"},
+    },
+    "required": ["status", "analysis"],
+}
+
+# Full fix: the answer is only useful with the corrected program in it
+FULL_FIX_RESPONSE_SCHEMA = dict(ANALYSIS_RESPONSE_SCHEMA, required=["status", "analysis", "corrected_code"])
+
+# Model families known to reject JSON mode / response_schema.
+_UNSUPPORTED_PREFIXES = (
+    "models/gemma-",
+    "models/gemini-1.0-",
+    "models/gemini-pro",
+    "models/aqa",
+    "models/nano-banana",
+)
+# Models that rejected JSON mode at runtime -> when to try it again. Not
+# permanent: a misread error must not switch structured output off for good.
+_learned_unsupported = {}
+UNSUPPORTED_RETRY_SECONDS = 3600
+# Only errors about the structured-output fields themselves; a 400 for a bad
+# key or an oversized prompt says nothing about JSON mode.
+_SCHEMA_ERROR_MARKERS = (
+    "response_schema", "responseschema", "response_mime_type", "responsemimetype",
+    "json mode", "mime type", "response schema",
+)
+
+_JSON_DIRECTIVES = [
+    re.compile(r"^\s*\d+\.\s*(?:Always output |Return )?STRICT JSON ONLY\.?\s*$\n?", re.MULTILINE | re.IGNORECASE),
+    re.compile(r"^\s*\d+\.\s*No markdown\.?\s*$\n?", re.MULTILINE | re.IGNORECASE),
+    re.compile(r"\s*\(STRICT JSON ONLY\)", re.IGNORECASE),
+]
+
+
+def compile_validator(schema: dict):
+    """
+    Compiles a schema into a validator function ONCE.
+    The returned function takes a value and returns a list of error strings.
+    """
+    kind = schema.get("type")
+    enum = tuple(schema["enum"]) if "enum" in schema else None
+
+    if kind == "object":
+        props = {name: compile_validator(sub) for name, sub in schema.get("properties", {}).items()}
+        required = tuple(schema.get("required", ()))
+
+        def check(value, path):
+            if not isinstance(value, dict):
+                return [f"{path}: expected object"]
+            errors = [f"{path}.{name}: missing" for name in required if name not in value]
+            for name, sub in props.items():
+                if name in value:
+                    errors.extend(sub(value[name], f"{path}.{name}"))
+            return errors
+
+    elif kind == "array":
+        item_check = compile_validator(schema.get("items", {}))
+
+        def check(value, path):
+            if not isinstance(value, list):
+                return [f"{path}: expected array"]
+            errors = []
+            for i, item in enumerate(value):
+                errors.extend(item_check(item, f"{path}[{i}]"))
+            return errors
+
+    else:
+        py_types = {"string": str, "integer": int, "number": (int, float), "boolean": bool}.get(kind)
+
+        def check(value, path):
+            if py_types is not None and (not isinstance(value, py_types) or isinstance(value, bool) and kind != "boolean"):
+                return [f"{path}: expected {kind}"]
+            if enum is not None and value not in enum:
+                return [f"{path}: must be one of {list(enum)}"]
+            return []
+
+    return check
+
+
+_validators = {}
+
+
+def validate(value, schema: dict):
+    """Validates against a schema using its compiled (and cached) validator."""
+    validator = _validators.get(id(schema))
+    if validator is None:
+        validator = _validators[id(schema)] = compile_validator(schema)
+    return validator(value, "$")
+
+
+def supports_structured_output(model_name: str) -> bool:
+    if model_name.startswith(_UNSUPPORTED_PREFIXES):
+        return False
+    return _learned_unsupported.get(model_name, 0) <= time.time()
+
+
+def mark_unsupported(model_name: str, retry_after: float = UNSUPPORTED_RETRY_SECONDS):
+    _learned_unsupported[model_name] = time.time() + retry_after
+
+
+def is_unsupported_error(exc: Exception) -> bool:
+    """A 400 / INVALID_ARGUMENT that names the JSON-mode fields: the model can't do structured output."""
+    code = getattr(exc, "code", None)
+    text = str(exc)
+    bad_request = code == 400 or getattr(code, "value", None) == 400 or "INVALID_ARGUMENT" in text or text.startswith("400")
+    return bad_request and any(marker in text.lower() for marker in _SCHEMA_ERROR_MARKERS)
+
+
+def strip_json_directives(prompt: str) -> str:
+    """Drops the "STRICT JSON ONLY" / "No markdown" pleading that JSON mode makes redundant."""
+    for pattern in _JSON_DIRECTIVES:
+        prompt = pattern.sub("", prompt)
+    return prompt
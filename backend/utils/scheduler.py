@@ -0,0 +1,140 @@
+# utils/scheduler.py
+import asyncio
+import contextvars
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+LANES = (INTERACTIVE, BULK)
+
+# Lane of the current request / task. asyncio.to_thread copies context, so the
+# model-calling thread sees the lane of the request that started it.
+current_lane = contextvars.ContextVar("llm_lane", default=INTERACTIVE)
+
+
+def normalize_lane(lane: str) -> str:
+    return BULK if (lane or "").strip().lower() == BULK else INTERACTIVE
+
+
+class _Waiter:
+    def __init__(self, lane: str, future):
+        self.lane = lane
+        self.future = future
+        self.enqueued = time.monotonic()
+
+
+class PriorityScheduler:
+    """
+    Gate in front of the LLM gateway with an interactive and a bulk lane.
+
+    - `slots` upstream calls may run at once; free slots are handed out by
+      weighted fair queueing (`weights`, e.g. 4:1 interactive:bulk).
+    - Bulk never holds more than `bulk_max_running` slots, so interactive
+      traffic always finds room.
+    - While `spike_depth` or more interactive calls are waiting, queued bulk
+      work is held back entirely (preempted) until the spike drains.
+    """
+
+    def __init__(self, slots: int = 8, weights=None, bulk_max_running: int = 4, spike_depth: int = 2):
+        self.slots = max(1, slots)
+        self.weights = weights or {INTERACTIVE: 4, BULK: 1}
+        self.bulk_max_running = max(1, bulk_max_running)
+        self.spike_depth = max(1, spike_depth)
+        self._queues = {lane: deque() for lane in LANES}
+        self._running = {lane: 0 for lane in LANES}
+        self._served = {lane: 0.0 for lane in LANES}     # weighted virtual time per lane
+        self._granted = {lane: 0 for lane in LANES}
+        self._preempted = 0
+        self._waits = {lane: deque(maxlen=500) for lane in LANES}
+
+    def _free(self) -> int:
+        return self.slots - sum(self._running.values())
+
+    def _eligible(self, lane: str) -> bool:
+        if lane == BULK:
+            return self._running[BULK] < self.bulk_max_running and len(self._queues[INTERACTIVE]) < self.spike_depth
+        return True
+
+    def _grant(self, lane: str, waited: float):
+        self._running[lane] += 1
+        self._granted[lane] += 1
+        self._served[lane] += 1.0 / self.weights[lane]
+        self._waits[lane].append(waited)
+
+    def _dispatch(self):
+        while self._free() > 0:
+            spike = bool(self._queues[BULK]) and len(self._queues[INTERACTIVE]) >= self.spike_depth
+            candidates = [lane for lane in LANES if self._queues[lane] and self._eligible(lane)]
+            if not candidates:
+                return
+            lane = min(candidates, key=lambda name: self._served[name])
+            waiter = self._queues[lane].popleft()
+            if waiter.future.done():
+                continue
+            self._grant(lane, time.monotonic() - waiter.enqueued)
+            if spike:
+                self._preempted += 1
+            waiter.future.set_result(None)
+
+    async def acquire(self, lane: str):
+        lane = normalize_lane(lane)
+        if self._free() > 0 and not self._queues[lane] and self._eligible(lane) \
+                and not (lane == BULK and self._queues[INTERACTIVE]):
+            self._grant(lane, 0.0)
+            return
+
+        if not self._queues[lane]:
+            # A lane that was idle doesn't get to cash in on old credit
+            others = [self._served[name] for name in LANES if name != lane and self._queues[name]]
+            if others:
+                self._served[lane] = max(self._served[lane], min(others))
+
+        waiter = _Waiter(lane, asyncio.get_running_loop().create_future())
+        self._queues[lane].append(waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.release(lane)          # granted and cancelled in the same tick
+            else:
+                try:
+                    self._queues[lane].remove(waiter)
+                except ValueError:
+                    pass
+            raise
+
+    def release(self, lane: str):
+        lane = normalize_lane(lane)
+        self._running[lane] = max(0, self._running[lane] - 1)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, lane: str = None):
+        lane = normalize_lane(lane or current_lane.get())
+        await self.acquire(lane)
+        try:
+            yield
+        finally:
+            self.release(lane)
+
+    def stats(self):
+        lanes = {}
+        for lane in LANES:
+            waits = sorted(self._waits[lane])
+            lanes[lane] = {
+                "queued": len(self._queues[lane]),
+                "running": self._running[lane],
+                "granted": self._granted[lane],
+                "weight": self.weights[lane],
+                "wait_avg_ms": round(1000 * sum(waits) / len(waits), 1) if waits else 0.0,
+                "wait_p95_ms": round(1000 * waits[int(0.95 * (len(waits) - 1))], 1) if waits else 0.0,
+            }
+        return {
+            "slots": self.slots,
+            "bulk_max_running": self.bulk_max_running,
+            "spike_depth": self.spike_depth,
+            "bulk_preemptions": self._preempted,
+            "lanes": lanes,
+        }
@@ -0,0 +1,53 @@
+# utils/single_flight.py
+import asyncio
+
+
+class _Call:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+        self.abandoned = False
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller starts the
+    work, later callers with the same key await the same task.
+
+    - Results and exceptions fan out to every waiter.
+    - A cancelled waiter only stops waiting; the shared call keeps running
+      for the others. Once every waiter is gone the shared task is cancelled.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.started = 0
+        self.shared = 0
+
+    async def do(self, key: str, factory):
+        call = self._calls.get(key)
+        if call is None or call.abandoned or call.task.done():
+            call = _Call(asyncio.ensure_future(factory()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _t, k=key, c=call: self._forget(k, c))
+            self.started += 1
+        else:
+            self.shared += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if not call.task.done() and call.waiters == 1:
+                call.abandoned = True
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def _forget(self, key: str, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self):
+        return {"in_flight": len(self._calls), "started": self.started, "shared": self.shared}
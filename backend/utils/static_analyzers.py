@@ -0,0 +1,232 @@
+# utils/static_analyzers.py
+import re
+import sqlite3
+
+# language key -> analyzer(code) returning a list of findings in the
+# `analysis` item shape, each with an extra "conclusive" flag: True means
+# the error is certain (a compiler said so), False means it is only a hint.
+ANALYZERS = {}
+
+
+def register(*languages):
+    def wrap(fn):
+        for language in languages:
+            ANALYZERS[language] = fn
+        return fn
+    return wrap
+
+
+def _finding(code_lines, line: int, issue: str, detail: str, conclusive: bool, severity: str = "critical"):
+    line = max(1, min(line or 1, max(1, len(code_lines))))
+    buggy = code_lines[line - 1].strip() if code_lines else ""
+    return {
+        "line": line,
+        "buggy_code": buggy,
+        "severity": severity,
+        "issue": issue,
+        "detail": detail,
+        "suggestion": buggy,
+        "conclusive": conclusive,
+    }
+
+
+class StaticResult:
+    def __init__(self, findings):
+        self.findings = findings
+
+    @property
+    def conclusive(self) -> bool:
+        """At least one certain error: the model is not needed to say the code is broken."""
+        return any(f["conclusive"] for f in self.findings)
+
+    def analysis(self):
+        """Findings in the public response shape (without the internal flag)."""
+        return [{k: v for k, v in f.items() if k != "conclusive"} for f in self.findings]
+
+    def prompt_hints(self) -> str:
+        if not self.findings:
+            return ""
+        rows = "\n".join(f"- line {f['line']}: {f['issue']}: {f['detail']}" for f in self.findings)
+        return (
+            "\n\nLOCAL STATIC ANALYSIS (already detected by a compiler/parser; include these in your answer, "
+            "then look for everything else):\n" + rows
+        )
+
+
+def run_static_analysis(language: str, code: str) -> StaticResult:
+    analyzer = ANALYZERS.get(language)
+    if analyzer is None or not (code or "").strip():
+        return StaticResult([])
+    try:
+        return StaticResult(analyzer(code))
+    except Exception as e:
+        # A broken analyzer must never break /explain
+        print(f"⚠️ Static analyzer for {language} crashed: {repr(e)}")
+        return StaticResult([])
+
+
+# --------------------------------------------------------------------
+# 🔹 PYTHON: the real compiler
+# --------------------------------------------------------------------
+@register("python")
+def analyze_python(code: str):
+    lines = code.splitlines()
+    try:
+        compile(code, "<submission>", "exec", dont_inherit=True)
+    except SyntaxError as e:
+        kind = type(e).__name__         # SyntaxError / IndentationError / TabError
+        return [_finding(lines, e.lineno, kind, e.msg or str(e), conclusive=True)]
+    except ValueError as e:             # e.g. null bytes in the source
+        return [_finding(lines, 1, "SyntaxError", str(e), conclusive=True)]
+    return []
+
+
+# --------------------------------------------------------------------
+# 🔹 SQL: SQLite's parser (EXPLAIN compiles a statement without running it)
+# --------------------------------------------------------------------
+# Other dialects use syntax SQLite rejects, even at the tokenizer level
+# (PostgreSQL `'1'::int`, MySQL `# comment`), so only input SQLite finds
+# unfinished (e.g. an unterminated string) is conclusive; every other
+# diagnostic is passed to the model as a hint.
+_SQL_CONCLUSIVE = ("incomplete input",)
+_SQL_HINTS = ("syntax error", "unrecognized token")
+
+
+def _sql_statements(code: str):
+    """(first line, statement) pairs, split where SQLite sees a complete statement."""
+    statements = []
+    buffer = []
+    start = 1
+    for number, line in enumerate(code.splitlines(), start=1):
+        if not buffer:
+            if not line.strip():
+                continue
+            start = number
+        buffer.append(line)
+        text = "\n".join(buffer)
+        if sqlite3.complete_statement(text):
+            statements.append((start, text))
+            buffer = []
+    if buffer and "\n".join(buffer).strip():
+        statements.append((start, "\n".join(buffer)))
+    return statements
+
+
+@register("sql")
+def analyze_sql(code: str):
+    lines = code.splitlines()
+    findings = []
+    conn = sqlite3.connect(":memory:")
+    try:
+        for start, statement in _sql_statements(code):
+            body = statement.strip()
+            if not body or body.startswith("--"):
+                continue
+            try:
+                conn.execute("EXPLAIN " + body)
+            except sqlite3.Error as e:
+                message = str(e)
+                if not any(hint in message for hint in _SQL_HINTS) and not message.startswith(_SQL_CONCLUSIVE):
+                    continue        # missing tables etc. are not syntax problems
+                offset = 0
+                near = re.search(r'near "([^"]+)"', message)
+                if near:
+                    for i, line in enumerate(statement.splitlines()):
+                        if near.group(1) in line:
+                            offset = i
+                            break
+                conclusive = message.startswith(_SQL_CONCLUSIVE)
+                findings.append(_finding(lines, start + offset, "SyntaxError", message, conclusive))
+    finally:
+        conn.close()
+    return findings
+
+
+# --------------------------------------------------------------------
+# 🔹 CSS / HTML: bracket and tag balancing
+# --------------------------------------------------------------------
+_CSS_NOISE = re.compile(r"/\*.*?\*/|\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*'", re.DOTALL)
+
+
+def _blank_out(code: str, pattern) -> str:
+    """Replaces comments/strings with spaces, keeping newlines so line numbers stay put."""
+    return pattern.sub(lambda m: re.sub(r"[^\n]", " ", m.group(0)), code)
+
+
+@register("css")
+def analyze_css(code: str):
+    lines = code.splitlines()
+    text = _blank_out(code, _CSS_NOISE)
+    if "/*" in text:
+        line = text[:text.index("/*")].count("\n") + 1
+        return [_finding(lines, line, "SyntaxError", "Unclosed comment '/*'.", conclusive=True)]
+
+    findings = []
+    stack = []
+    pairs = {"}": "{", ")": "(", "]": "["}
+    line = 1
+    for ch in text:
+        if ch == "\n":
+            line += 1
+        elif ch in "{([":
+            stack.append((ch, line))
+        elif ch in pairs:
+            if not stack or stack[-1][0] != pairs[ch]:
+                findings.append(_finding(lines, line, "SyntaxError", f"Unexpected '{ch}' without a matching '{pairs[ch]}'.", True))
+                return findings
+            stack.pop()
+    for ch, opened in stack[:1]:
+        findings.append(_finding(lines, opened, "SyntaxError", f"'{ch}' opened here is never closed.", True))
+    return findings
+
+
+_VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta",
+    "param", "source", "track", "wbr", "!doctype",
+}
+# Elements whose end tag may legally be left out
+_OPTIONAL_END = {"li", "p", "td", "th", "tr", "thead", "tbody", "tfoot", "option", "dt", "dd", "html", "head", "body", "colgroup"}
+_TAG = re.compile(r"<(/?)([A-Za-z!][\w:-]*)([^<>]*?)(/?)>")
+_RAW_TEXT = re.compile(r"(<(script|style)\b[^>]*>).*?(</\2\s*>)", re.DOTALL | re.IGNORECASE)
+# Quoted attribute values may hold '<' and '>' (`value="<x>"`)
+_ATTR_VALUE = re.compile(r"(?<==)\s*(\"[^\"]*\"|'[^']*')")
+
+
+@register("html")
+def analyze_html(code: str):
+    lines = code.splitlines()
+    if "<!--" in code and "-->" not in code[code.index("<!--"):]:
+        line = code[:code.index("<!--")].count("\n") + 1
+        return [_finding(lines, line, "SyntaxError", "Unclosed comment '<!--'.", conclusive=True)]
+
+    text = re.sub(r"<!--.*?-->", lambda m: re.sub(r"[^\n]", " ", m.group(0)), code, flags=re.DOTALL)
+    text = _RAW_TEXT.sub(lambda m: m.group(1) + re.sub(r"[^\n]", " ", m.group(0)[len(m.group(1)):-len(m.group(3))]) + m.group(3), text)
+    text = _blank_out(text, _ATTR_VALUE)
+
+    # A '<' that starts a tag but never reaches '>' before the next '<'
+    for match in re.finditer(r"<[A-Za-z/!][^<>]*(?=<|$)", text):
+        line = text[:match.start()].count("\n") + 1
+        return [_finding(lines, line, "SyntaxError", "Tag is missing its closing '>'.", conclusive=True)]
+
+    findings = []
+    stack = []
+    for match in _TAG.finditer(text):
+        closing, name, _, self_closing = match.group(1), match.group(2).lower(), match.group(3), match.group(4)
+        line = text[:match.start()].count("\n") + 1
+        if name in _VOID_TAGS or self_closing:
+            continue
+        if not closing:
+            stack.append((name, line))
+            continue
+        if any(open_name == name for open_name, _ in stack):
+            while stack and stack[-1][0] != name:
+                open_name, open_line = stack.pop()
+                if open_name not in _OPTIONAL_END:
+                    findings.append(_finding(lines, open_line, "UnclosedTag", f"<{open_name}> is never closed.", False, "warning"))
+            stack.pop()
+        else:
+            findings.append(_finding(lines, line, "UnexpectedClosingTag", f"</{name}> has no matching opening tag.", False, "warning"))
+    for open_name, open_line in stack:
+        if open_name not in _OPTIONAL_END:
+            findings.append(_finding(lines, open_line, "UnclosedTag", f"<{open_name}> is never closed.", False, "warning"))
+    return findings
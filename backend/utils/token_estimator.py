@@ -0,0 +1,91 @@
+# utils/token_estimator.py
+import re
+
+# --------------------------------------------------------------------
+# 🔹 LOCAL TOKEN ESTIMATE
+# --------------------------------------------------------------------
+# Subword tokenizers split code finer than prose: long identifiers break into
+# several pieces, most punctuation is a token of its own and non-ASCII text
+# is roughly one token per character. The estimate errs on the high side.
+_WORD = re.compile(r"[A-Za-z0-9_]+")
+_SYMBOL = re.compile(r"[^\w\s]+")
+_NON_ASCII = re.compile(r"[^\x00-\x7f]")
+SAFETY_MARGIN = 1.1
+
+
+def estimate_tokens(text: str) -> int:
+    if not text:
+        return 1
+    words = sum((len(w) + 3) // 4 for w in _WORD.findall(text))
+    symbols = sum((len(s) + 1) // 2 for s in _SYMBOL.findall(text))
+    non_ascii = len(_NON_ASCII.findall(text))
+    lines = text.count("\n")
+    return max(1, int((words + symbols + non_ascii + lines // 2) * SAFETY_MARGIN))
+
+
+# --------------------------------------------------------------------
+# 🔹 PER-MODEL LIMITS  (input context tokens, max output tokens)
+# --------------------------------------------------------------------
+# First matching pattern wins; names are matched without the "models/" prefix.
+MODEL_LIMITS = [
+    (r"gemma-3n-", 8_192, 2_048),
+    (r"gemma-3-1b", 32_768, 8_192),
+    (r"gemma-3-", 131_072, 8_192),
+    (r"gemma-2-", 8_192, 8_192),
+    (r"gemini-pro-vision", 12_288, 4_096),
+    (r"gemini-(1\.0-pro|pro$)", 30_720, 2_048),
+    (r"gemini-1\.5-pro", 2_097_152, 8_192),
+    (r"gemini-1\.5-flash", 1_048_576, 8_192),
+    (r"gemini-2\.0-", 1_048_576, 8_192),
+    (r"gemini-exp-", 2_097_152, 8_192),
+    (r".*-tts", 8_192, 16_384),
+    (r".*native-audio", 131_072, 8_192),
+    (r"gemini-(2\.5|3|3\.1)-", 1_048_576, 65_536),
+    (r"gemini-(pro|flash|flash-lite)-latest", 1_048_576, 65_536),
+    (r"(gemini-robotics|deep-research)", 1_048_576, 65_536),
+]
+DEFAULT_LIMITS = (32_768, 8_192)
+_COMPILED_LIMITS = [(re.compile(pattern), context, output) for pattern, context, output in MODEL_LIMITS]
+
+
+def model_limits(model_name: str):
+    """(context window, max output tokens) for a model name."""
+    name = model_name.split("/", 1)[-1]
+    for pattern, context, output in _COMPILED_LIMITS:
+        if pattern.match(name):
+            return context, output
+    return DEFAULT_LIMITS
+
+
+def fits(model_name: str, prompt_tokens: int, output_tokens: int) -> bool:
+    context, max_output = model_limits(model_name)
+    return output_tokens <= max_output and prompt_tokens + output_tokens <= context
+
+
+# Analysis JSON is small; a full fix also repeats the (corrected) code
+ANALYSIS_OUTPUT_TOKENS = 2_048
+
+
+def expected_output_tokens(code: str = "", include_corrected: bool = False) -> int:
+    if not include_corrected:
+        return ANALYSIS_OUTPUT_TOKENS
+    return ANALYSIS_OUTPUT_TOKENS + int(estimate_tokens(code) * 1.25)
+
+
+class PromptTooLarge(ValueError):
+    """No configured model can take this prompt (plus its expected answer)."""
+
+    def __init__(self, prompt_tokens: int, output_tokens: int):
+        self.prompt_tokens = prompt_tokens
+        self.output_tokens = output_tokens
+        super().__init__(
+            f"Prompt of ~{prompt_tokens} tokens (+{output_tokens} expected output) fits no model's context window."
+        )
+
+
+def route(models, prompt_tokens: int, output_tokens: int):
+    """The models (in pool order) that can fit the prompt; PromptTooLarge when none can."""
+    eligible = [name for name in models if fits(name, prompt_tokens, output_tokens)]
+    if not eligible:
+        raise PromptTooLarge(prompt_tokens, output_tokens)
+    return eligible